@@ -1,255 +1,240 @@
-import base64
-import streamlit as st
-from modules.loader import load_excel
-from modules.conciliacion import conciliar
-from modules.exporter import to_excel_download
+from datetime import date
 
+import streamlit as st
+from modules.cache import cache_lecturas
+from modules.bodegas import BODEGA
+from modules.deteccion import OBLIGATORIOS
+from modules.exporter import FORMATOS, en_cache, exportar_cacheado
+from modules.historial import historial, validar_periodo
+from modules.ingesta import ORDEN_ARCHIVOS
+from modules.metricas import registrar
+from modules.periodos import almacen_periodos
+from modules.trabajos import (
+    CANCELADO,
+    EN_COLA,
+    ColaLlena,
+    conciliar_archivos,
+    corregir_periodo,
+    pool_trabajos
+)
+from modules.ui import carga_masiva, mostrar_encabezado, upload_section
+from modules.visor import ORDENES, paginas
 
-def img_to_base64(path):
-    with open(path, "rb") as f:
-        return base64.b64encode(f.read()).decode()
-    
 st.set_page_config(page_title="Conciliación de Inventarios", layout="wide")
-st.markdown("""
-    <style>
-    .column-title {
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        text-align: center;
-        font-weight: 600;
-        font-size: 1.6rem;
-        margin-bottom: 1rem;
-        width: 100%;
-    }
+# Estilos, ícono y encabezado se arman una vez por proceso (modules/ui.py)
+mostrar_encabezado()
 
-    .column-subtitle {
-        text-align: center;
-        color: #6c757d;
-        font-size: 0.9rem;
-        margin-bottom: 0.75rem;
-    }
-
-    /* Tarjetas normales */
-    .card {
-        background-color: #ffffff;
-        border-radius: 14px;
-        padding: 1.2rem 1.4rem;
-        box-shadow: 0 4px 14px rgba(0,0,0,0.06);
-        border-left: 6px solid #c1121f;
-    }
-
-    .card h4 {
-        margin: 0;
-        font-size: 0.95rem;
-        text-align: center;
-        color: #343a40;
-    }
-
-    .card .count {
-        font-size: 1.8rem;
-        text-align: center;
-        font-weight: 700;
-        margin-top: 0.3rem;
-    }
-
-    /* Tarjeta TOTAL (roja) */
-    .total-card {
-        background-color: #c1121f;
-        border-radius: 14px;
-        padding: 1.2rem 1.4rem;
-        box-shadow: 0 6px 16px rgba(0,0,0,0.12);
-    }
-
-    .total-card h4 {
-        margin: 0;
-        font-size: 0.95rem;
-        text-align: center;
-        color: #ffffff;
-        opacity: 0.9;
+# ======================
+# EJECUCIÓN
+# ======================
+# Un archivo por tipo, o todos juntos (varios o un ZIP) reconocidos por su
+# encabezado (modules/deteccion.py)
+if st.toggle("Cargar todos los archivos juntos (varios Excel o un ZIP)", key="modo_masivo"):
+    archivos = carga_masiva()
+else:
+    inicial_file, traslados_file, recepciones_file, salidas_file, final_file = upload_section()
+    archivos = {
+        "inicial": inicial_file,
+        "traslados": traslados_file,
+        "recepciones": recepciones_file,
+        "salidas": salidas_file,
+        "final": final_file
     }
 
-    .total-card .count {
-        font-size: 2.2rem;
-        text-align: center;
-        font-weight: 800;
-        margin-top: 0.3rem;
-        color: #ffffff;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-
-
-icono = img_to_base64("assets/inventario.png")
-
-st.markdown(
-    f"""
-    <style>
-    .header-box {{
-        background-color: #f8f9fa;
-        border-left: 6px solid #c1121f;
-        padding: 1.5rem 2rem;
-        border-radius: 12px;
-        margin-bottom: 1.5rem;
-        display: flex;
-        align-items: center;
-        justify-content: space-between;
-    }}
-
-    .header-text h1 {{
-        margin: 0;
-    }}
-
-    .header-text p {{
-        margin: 0.2rem 0 0;
-        color: #6c757d;
-    }}
-
-    .header-icon img {{
-        width: 120px;
-        opacity: 0.9;
-        margin-right: 20px; 
-    }}
-    </style>
-
-    <div class="header-box">
-        <div class="header-text">
-            <h1>Conciliación de Inventario Farmacéutico</h1>
-            <p>Control de traslados, salidas y recepciones</p>
-        </div>
-        <div class="header-icon">
-            <img src="data:image/png;base64,{icono}">
-        </div>
-    </div>
-    """,
-    unsafe_allow_html=True
+todas_bodegas = st.checkbox(
+    "Conciliar todas las bodegas (no solo Servicio Farmacéutico Sótano)",
+    key="todas_bodegas",
+    help="Solo se concilian las bodegas que aparecen en el inventario inicial o "
+         "final. Si los inventarios no traen columna BODEGA, son de Servicio "
+         "Farmacéutico Sótano y las demás bodegas quedan fuera. En este modo no "
+         "hay detalle de movimientos por lote."
+)
+lotes_similares = st.checkbox(
+    "Marcar lotes posiblemente mal digitados (parejas de diferencias opuestas)",
+    key="lotes_similares"
+)
+memoria_acotada = st.checkbox(
+    "Archivos muy grandes: leer por bloques con memoria acotada (sin detalle de movimientos)",
+    key="memoria_acotada",
+    disabled=todas_bodegas
+)
+guardar_historial = st.checkbox("Guardar el resultado en el historial", key="guardar_historial")
+guardar_estado = st.checkbox(
+    "Guardar el estado del período (el siguiente toma de aquí su inventario inicial)",
+    key="guardar_estado",
+    disabled=todas_bodegas or memoria_acotada,
+    help="Con el período anterior guardado, el inventario inicial es opcional. "
+         "Los archivos de un período guardado se pueden corregir sin volver a "
+         "subir los demás."
+) and not (todas_bodegas or memoria_acotada)
+periodo = st.text_input(
+    "Período (AAAA-MM)",
+    value=date.today().strftime("%Y-%m"),
+    key="periodo",
+    disabled=not (guardar_historial or guardar_estado)
 )
 
-st.markdown("---")
+# AAAA-MM antes de conciliar: el período no se corrige después
+periodo_ok = True
+if guardar_historial or guardar_estado:
+    try:
+        periodo = validar_periodo(periodo)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        periodo_ok = False
+
+# Con el estado del período anterior, el inicial sale de su inventario final
+anterior = almacen_periodos.anterior(periodo) if guardar_estado and periodo_ok else None
+archivos_ok = all(archivos.get(tipo) for tipo in OBLIGATORIOS if not (anterior and tipo == "inicial"))
+if anterior and not archivos.get("inicial"):
+    st.info(f"ℹ️ Sin inventario inicial: se toma el inventario final guardado de {anterior}")
 
 # ======================
-# UI – SECCIÓN DE CARGA
+# CONCILIAR (EN SEGUNDO PLANO)
 # ======================
-def uploader_con_estado(label, icon, key, obligatorio=True):
-    f_col, s_col = st.columns([4, 1], vertical_alignment="center")
-
-    with f_col:
-        archivo = st.file_uploader(
-            f"{icon} {label}",
-            type=["xlsx", "xls"],
-            key=key
-        )
-
-    with s_col:
-        if archivo:
-            st.markdown("✅")
+# La conciliación corre en el pool compartido del servidor: la página sigue
+# respondiendo y la sesión solo consulta el estado de su trabajo
+INTERVALO_PROGRESO = 1  # segundos
+
+
+def terminar_trabajo(trabajo):
+    del st.session_state["trabajo"]
+    if trabajo.estado == CANCELADO:
+        st.warning("⏹️ Conciliación cancelada")
+        return
+
+    salida = trabajo.resultado or {"errores": {"conciliación": trabajo.error}}
+    for tipo, mensaje in salida["errores"].items():
+        st.error(f"❌ {tipo.capitalize()}: {mensaje}")
+    for aviso in salida.get("avisos", []):
+        st.warning(f"⚠️ {aviso}")
+    if not salida["errores"]:
+        st.session_state["instantanea"] = salida["instantanea"]
+        st.session_state["memoria"] = salida["memoria"]
+        if salida["resumen_bodegas"] is None:
+            st.session_state.pop("resumen_bodegas", None)
         else:
-            if obligatorio:
-                st.markdown("❌")
-            else:
-                st.markdown("➖")
-
-    return archivo
+            st.session_state["resumen_bodegas"] = salida["resumen_bodegas"]
 
+    st.session_state["metricas"] = trabajo.registro
+    st.session_state["tipo_filtro"] = "Todas"
 
-def upload_section():
-
-    col1, col2 = st.columns(2)
+    stats = cache_lecturas.resumen()
+    st.caption(
+        f"Caché de lecturas: {stats['aciertos']} aciertos "
+        f"({stats['memoria']} memoria, {stats['disco']} disco), "
+        f"{stats['fallos']} fallos"
+    )
 
-    # ======================
-    # COLUMNA IZQUIERDA
-    # ======================
-    with col1:
-        st.markdown(
-            "<div class='column-title'>📦 Inventario inicial y final</div>",
-            unsafe_allow_html=True
-        )
 
-        inicial = uploader_con_estado(
-            "Inventario Inicial", "📘", "inicial"
-        )
-        final = uploader_con_estado(
-            "Inventario Final", "📕", "final"
-        )
+@st.fragment(run_every=INTERVALO_PROGRESO)
+def progreso_trabajo():
+    # Solo se vuelve a dibujar este bloque; al terminar, toda la página
+    trabajo = st.session_state.get("trabajo")
+    if trabajo is None or trabajo.terminado:
+        st.rerun()
 
-    # ======================
-    # COLUMNA DERECHA
-    # ======================
-    with col2:
-        st.markdown(
-            "<div class='column-title'>🔄 Recepciones y traslados</div>",
-            unsafe_allow_html=True
+    terminadas, en_curso, segundos = trabajo.progreso()
+    if trabajo.estado == EN_COLA:
+        st.info(f"⏳ En espera de un lugar para conciliar ({segundos:.0f} s)")
+    else:
+        actual = ", ".join(
+            e["etapa"] + (f" ({e['archivo']})" if e["archivo"] else "") for e in en_curso
         )
-
-        recepciones = uploader_con_estado(
-            "Recepciones (Entradas)", "📥", "recepciones"
+        st.info(f"⚙️ Conciliando: {actual or '...'}")
+        st.caption(f"{len(terminadas)} etapas terminadas · {segundos:.1f} s")
+
+    if trabajo.registro.cancelado:
+        st.caption("Cancelando...")
+    elif st.button("⏹️ Cancelar", key="cancelar_trabajo"):
+        trabajo.cancelar()
+
+
+if archivos_ok and periodo_ok and st.button(
+    "🔍 Reconstruir y Conciliar Inventario", disabled="trabajo" in st.session_state
+):
+    # Los uploads no son thread-safe: el trabajo recibe los bytes
+    contenidos = {
+        tipo: archivos[tipo].getvalue() if archivos.get(tipo) is not None else None
+        for tipo in ORDEN_ARCHIVOS
+    }
+    try:
+        st.session_state["trabajo"] = pool_trabajos.enviar(
+            conciliar_archivos,
+            contenidos,
+            todas_bodegas=todas_bodegas,
+            lotes_similares=lotes_similares,
+            memoria_acotada=memoria_acotada,
+            periodo=periodo,
+            guardar_historial=guardar_historial,
+            guardar_estado=guardar_estado
         )
-        traslados = uploader_con_estado(
-            "Traslados (Salidas internas)", "📤", "traslados"
+    except ColaLlena as e:
+        st.error(f"❌ {e}")
+
+# Corrección de un archivo de un período guardado: solo se lee ese archivo
+periodos_guardados = almacen_periodos.periodos()
+if periodos_guardados:
+    with st.expander("✏️ Corregir un archivo de un período guardado"):
+        periodo_corregir = st.selectbox("Período", periodos_guardados[::-1], key="periodo_corregir")
+        tipo_corregir = st.selectbox("Archivo", ORDEN_ARCHIVOS, key="tipo_corregir")
+        corregido = st.file_uploader(
+            "Archivo corregido", type=["xlsx", "xls"], key="archivo_corregido"
         )
-
-    st.markdown("---")
-
-    # ======================
-    # SALIDAS DE BODEGA
-    # ======================
-    st.markdown("### 🚚 Salidas de bodega")
-    hubo_salidas = st.checkbox("¿Hubo salidas de la bodega?", key="hubo_salidas")
-
-    salidas = None
-    if hubo_salidas:
-        salidas = uploader_con_estado(
-            "Salidas de bodega", "🚚", "salidas", obligatorio=False
+        st.caption(
+            "Solo cambian los lotes del archivo anterior y del corregido. Si se "
+            "corrige el inventario final, el período siguiente que tomó de aquí "
+            "su inventario inicial también se actualiza."
         )
-
-    return inicial, traslados, recepciones, salidas, final
-
-
-# ======================
-# EJECUCIÓN
-# ======================
-inicial_file, traslados_file, recepciones_file, salidas_file, final_file = upload_section()
-
-archivos_ok = all([
-    inicial_file,
-    traslados_file,
-    recepciones_file,
-    final_file
-])
-
-# ======================
-# CONCILIAR (UNA VEZ)
-# ======================
-if archivos_ok and st.button("🔍 Reconstruir y Conciliar Inventario"):
-    salidas_df = load_excel(salidas_file, "salidas") if salidas_file else None
-
-    st.session_state["df_conciliado"] = conciliar(
-        load_excel(inicial_file, "inicial"),
-        load_excel(traslados_file, "traslados"),
-        load_excel(recepciones_file, "recepciones"),
-        salidas_df,
-        load_excel(final_file, "final")
-    )
-
-    st.session_state["tipo_filtro"] = "Todas"
+        if corregido and st.button(
+            "✏️ Corregir y Conciliar", disabled="trabajo" in st.session_state
+        ):
+            try:
+                st.session_state["trabajo"] = pool_trabajos.enviar(
+                    corregir_periodo,
+                    periodo_corregir,
+                    tipo_corregir,
+                    corregido.getvalue(),
+                    lotes_similares=lotes_similares,
+                    guardar_historial=guardar_historial
+                )
+            except ColaLlena as e:
+                st.error(f"❌ {e}")
+
+trabajo = st.session_state.get("trabajo")
+if trabajo is not None and trabajo.terminado:
+    terminar_trabajo(trabajo)
+elif trabajo is not None:
+    progreso_trabajo()
 
 # ======================
 # RESULTADOS
 # ======================
-if "df_conciliado" in st.session_state:
-
-    df = st.session_state["df_conciliado"]
-    inconsistencias_base = df[df["Diferencia"] != 0].copy()
+# Tarjetas, filtros, tabla y descarga son un fragmento: cambiar un filtro
+# vuelve a correr solo este panel, no la carga de archivos ni el historial
+@st.fragment
+def panel_resultados(instantanea):
+    # Resultado, resumen, índices por tipo y visores son los del proceso,
+    # compartidos con otras sesiones que conciliaron lo mismo
+    resultado = instantanea.resultado
+    bodega = "Todas"
+
+    if BODEGA in resultado.df.columns:
+        st.subheader("🏥 Resumen por bodega")
+        st.dataframe(
+            st.session_state["resumen_bodegas"],
+            use_container_width=True,
+            hide_index=True
+        )
 
-    resumen = (
-        inconsistencias_base
-        .groupby("Tipo_Inconsistencia")
-        .size()
-        .reset_index(name="Cantidad")
-    )
+        bodega = st.selectbox(
+            "Bodega",
+            ["Todas"] + st.session_state["resumen_bodegas"][BODEGA].tolist()
+        )
+        resultado = resultado.de_bodega(bodega)
 
-    total_inc = len(inconsistencias_base)
-    resumen["Porcentaje"] = (resumen["Cantidad"] / total_inc * 100).round(1)
+    resumen = resultado.resumen
+    total_inc = resultado.total_inconsistencias
 
     st.subheader("🚨 Distribución de inconsistencias")
 
@@ -280,22 +265,182 @@ if "df_conciliado" in st.session_state:
 
     st.markdown("---")
 
-    tipos = ["Todas"] + resumen["Tipo_Inconsistencia"].tolist()
+    if resultado.similares is not None and not resultado.similares.empty:
+        st.subheader("🔤 Posibles lotes mal digitados")
+        st.caption(
+            "Lotes del mismo código con diferencias de signo contrario y "
+            "casi el mismo texto; aparecen como una sola categoría."
+        )
+        st.dataframe(resultado.similares, use_container_width=True, hide_index=True)
+        st.markdown("---")
+
+    tipos = ["Todas"] + resultado.tipos()
     filtro = st.selectbox("Filtrar inconsistencias", tipos)
 
-    data = (
-        inconsistencias_base
-        if filtro == "Todas"
-        else inconsistencias_base[inconsistencias_base["Tipo_Inconsistencia"] == filtro]
+    # ======================
+    # TABLA (paginada en el servidor)
+    # ======================
+    # Órdenes e índice de búsqueda se arman una vez por resultado y bodega
+    clave_visor = (instantanea.clave, bodega)
+    visor = instantanea.visor(bodega)
+
+    col_busqueda, col_orden, col_tamano = st.columns([3, 2, 1])
+    with col_busqueda:
+        busqueda = st.text_input("🔎 Buscar código, nombre o lote", key="busqueda")
+    with col_orden:
+        orden = st.selectbox("Ordenar por", list(ORDENES))
+    with col_tamano:
+        tamano = st.selectbox("Filas por página", [50, 100, 500], index=1)
+
+    total_filas = len(visor.posiciones(orden, busqueda, filtro))
+    numero = st.number_input(
+        "Página", min_value=1, max_value=paginas(total_filas, tamano), value=1
     )
+    pagina, _ = visor.pagina(numero - 1, tamano, orden, busqueda, filtro)
 
-    st.dataframe(data, use_container_width=True)
-
-    st.download_button(
-        "⬇️ Descargar inconsistencias",
-        data=to_excel_download(data),
-        file_name="inconsistencias.xlsx"
+    desde = (numero - 1) * tamano
+    st.caption(
+        f"Mostrando {min(desde + 1, total_filas):,}–{desde + len(pagina):,} "
+        f"de {total_filas:,} inconsistencias"
+    )
+    # La selección se reinicia al cambiar de página, filtro u orden
+    evento = st.dataframe(
+        pagina,
+        use_container_width=True,
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"tabla-{hash((clave_visor, filtro, busqueda, orden, tamano, numero))}"
     )
 
+    # ======================
+    # PROCEDENCIA DEL LOTE
+    # ======================
+    seleccion = evento["selection"]["rows"]
+    if seleccion:
+        posicion = seleccion[0]
+        lote = pagina.iloc[posicion]
+        st.markdown(
+            f"#### 🔍 Movimientos del lote {lote['Lote']} "
+            f"({lote['Codigo_Articulo']} · {lote['Tipo_Inconsistencia']})"
+        )
+        origen = resultado.movimientos(pagina.index[posicion])
+        if origen is None:
+            st.info(
+                "El detalle de movimientos no está disponible en la conciliación "
+                "por bodegas ni en la lectura por bloques"
+            )
+        else:
+            st.dataframe(origen, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Seleccione una fila para ver los movimientos que la originan")
+
+    # ======================
+    # DESCARGA (bajo demanda)
+    # ======================
+    formatos = {
+        "Excel (.xlsx)": "xlsx",
+        "Excel, una hoja por tipo": "xlsx_por_tipo",
+        "CSV": "csv",
+        "Parquet": "parquet",
+    }
+    etiqueta = st.radio("Formato de descarga", list(formatos), horizontal=True)
+    formato = formatos[etiqueta]
+
+    # El archivo se genera solo al pedirlo y se reutiliza por resultado y filtro
+    clave_descarga = (instantanea.clave, bodega, filtro, busqueda.strip().upper(), orden)
+
+    if en_cache(clave_descarga, formato) or st.button("📦 Preparar descarga"):
+        # La exportación se suma al registro de la última ejecución
+        with registrar(st.session_state.get("metricas")):
+            contenido = exportar_cacheado(
+                clave_descarga, lambda: visor.filtrar(orden, busqueda, filtro), formato
+            )
+        extension, mime = FORMATOS[formato]
+        st.download_button(
+            "⬇️ Descargar inconsistencias",
+            data=contenido,
+            file_name=f"inconsistencias.{extension}",
+            mime=mime
+        )
+
+
+if "instantanea" in st.session_state:
+    panel_resultados(st.session_state["instantanea"])
+
+    # ======================
+    # RENDIMIENTO
+    # ======================
+    registro = st.session_state.get("metricas")
+    if registro is not None:
+        with st.expander("⏱️ Rendimiento de la última ejecución"):
+            etapas = registro.a_dataframe()
+            st.caption(f"Tiempo total: {registro.total():.2f} s")
+            st.dataframe(
+                etapas.groupby("etapa", sort=False)
+                .agg(veces=("segundos", "size"), segundos=("segundos", "sum"), filas=("filas", "sum"))
+                .reset_index(),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.dataframe(etapas, use_container_width=True, hide_index=True)
+
+            memoria = st.session_state.get("memoria")
+            if memoria is not None:
+                total = memoria.iloc[-1]
+                st.caption(
+                    f"Memoria de la sesión: {total['MB']:.1f} MB "
+                    f"(sin tipos compactos: {total['MB sin compactar']:.1f} MB)"
+                )
+                st.dataframe(memoria, use_container_width=True, hide_index=True)
+            st.download_button(
+                "⬇️ Descargar métricas (JSON)",
+                data=registro.a_json(),
+                file_name="metricas.json",
+                mime="application/json"
+            )
+
 else:
     st.info("📂 Cargue los archivos y ejecute la conciliación")
+
+# ======================
+# HISTORIAL
+# ======================
+# Consultas sobre la base local: no se vuelve a leer ningún Excel
+with st.expander("📚 Historial de conciliaciones"):
+    cargas = historial.cargas()
+    if cargas.empty:
+        st.caption("Aún no hay conciliaciones guardadas")
+    else:
+        sedes = sorted(cargas["Sede"].unique())
+        sede = None
+        if len(sedes) > 1:
+            sede = st.selectbox("Sede", sedes, key="sede_historial")
+        bodegas = ["Todas"] + sorted(cargas["Bodega"].unique())
+        bodega_historial = st.selectbox("Bodega", bodegas, key="bodega_historial")
+        filtro_bodega = None if bodega_historial == "Todas" else bodega_historial
+
+        st.markdown("#### Inconsistencias por período")
+        tendencia = historial.tendencia(sede=sede, bodega=filtro_bodega)
+        st.line_chart(tendencia.drop(columns="Total"))
+        st.dataframe(tendencia, use_container_width=True)
+
+        st.markdown("#### Lotes recurrentes")
+        minimo = st.number_input("Mínimo de períodos", min_value=2, value=3, key="minimo_historial")
+        consecutivos = st.checkbox("Solo períodos seguidos", value=True, key="consecutivos_historial")
+        recurrentes = historial.recurrentes(minimo, consecutivos, sede=sede, bodega=filtro_bodega)
+        st.caption(f"{len(recurrentes)} lotes")
+        st.dataframe(recurrentes, use_container_width=True, hide_index=True)
+
+        st.markdown("#### Historia de un producto")
+        codigo = st.text_input("Código de producto", key="codigo_historial")
+        lote = st.text_input("Lote (opcional)", key="lote_historial")
+        if codigo.strip():
+            st.dataframe(
+                historial.del_lote(codigo, lote, sede=sede, bodega=filtro_bodega),
+                use_container_width=True,
+                hide_index=True
+            )
+
+        st.markdown("#### Cargas guardadas")
+        st.dataframe(cargas, use_container_width=True, hide_index=True)
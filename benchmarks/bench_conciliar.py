@@ -0,0 +1,103 @@
+"""Compara la cadena de merges anterior con la agregación en formato largo.
+
+Uso:
+    python benchmarks/bench_conciliar.py --filas 1000000 --lotes 200000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.conciliacion import CANTIDAD, CLAVE, FUENTES, agregar_movimientos  # noqa: E402
+
+
+def movimientos_sinteticos(filas, lotes, semilla=0):
+    rng = np.random.default_rng(semilla)
+    claves = rng.integers(0, lotes, lotes * 2).astype(np.int64) << 32
+
+    def frame(n):
+        return pd.DataFrame({
+            CLAVE: rng.choice(claves, n),
+            CANTIDAD: rng.integers(0, 100, n).astype(np.float64)
+        })
+
+    return [
+        ("Inicial", frame(filas)),
+        ("Recepciones", frame(filas // 4)),
+        ("Salidas", frame(filas // 4)),
+        ("Final_Sistema", frame(filas)),
+        ("Salidas", frame(filas // 8)),
+    ]
+
+
+def cadena_merges(movimientos):
+    # Implementación anterior: agrupar por fuente + merges outer + fillna
+    por_fuente = {}
+    for fuente, df in movimientos:
+        por_fuente.setdefault(fuente, []).append(df)
+
+    agrupados = [
+        pd.concat(por_fuente[fuente], ignore_index=True)
+        .groupby(CLAVE, as_index=False)[CANTIDAD].sum()
+        .rename(columns={CANTIDAD: fuente})
+        for fuente in FUENTES
+    ]
+
+    df = agrupados[0]
+    for siguiente in agrupados[1:]:
+        df = df.merge(siguiente, on=CLAVE, how="outer")
+    df[FUENTES] = df[FUENTES].fillna(0)
+    return df
+
+
+def formato_largo(movimientos):
+    claves, matriz = agregar_movimientos(movimientos)
+    df = pd.DataFrame(matriz, columns=FUENTES)
+    df.insert(0, CLAVE, claves)
+    return df
+
+
+def medir(funcion, movimientos, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion(movimientos)
+        tiempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcion(movimientos)
+    pico = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return resultado, min(tiempos), pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=1_000_000)
+    parser.add_argument("--lotes", type=int, default=200_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    movimientos = movimientos_sinteticos(args.filas, args.lotes)
+    total = sum(len(df) for _, df in movimientos)
+    print(f"Movimientos sintéticos: {total} filas, ~{args.lotes * 2} claves")
+
+    resultados = {}
+    for nombre, funcion in (("merges", cadena_merges), ("largo", formato_largo)):
+        df, segundos, pico = medir(funcion, movimientos, args.repeticiones)
+        resultados[nombre] = df.sort_values(CLAVE).reset_index(drop=True)
+        print(f"{nombre:>8}: {segundos:.3f} s, pico {pico / 1e6:.0f} MB")
+
+    a = resultados["merges"][[CLAVE] + FUENTES]
+    b = resultados["largo"][[CLAVE] + FUENTES]
+    print("Resultados idénticos:", a.equals(b))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Mide el historial de conciliaciones con un año de resultados sintéticos.
+
+Uso:
+    python benchmarks/bench_historial.py --lotes 400000 --periodos 12
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.conciliacion import ResultadoConciliacion, clasificar  # noqa: E402
+from modules.historial import Historial  # noqa: E402
+
+
+def resultado_sintetico(base, tasa, rng):
+    # Un período: cantidades al azar y una fracción `tasa` de diferencias
+    df = base.copy()
+    for columna in ["Inicial", "Recepciones", "Salidas", "Final_Sistema"]:
+        df[columna] = rng.integers(0, 50, len(df)).astype(float)
+    df["Final_Calculado"] = df["Inicial"] + df["Recepciones"] - df["Salidas"]
+    cuadra = rng.random(len(df)) >= tasa
+    df.loc[cuadra, "Final_Sistema"] = df.loc[cuadra, "Final_Calculado"]
+    df["Diferencia"] = df["Final_Sistema"] - df["Final_Calculado"]
+    df["Tipo_Inconsistencia"] = clasificar(df)
+    return ResultadoConciliacion(df)
+
+
+def cronometrar(nombre, funcion):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    print(f"{nombre:<32} {time.perf_counter() - inicio:>8.3f} s  {len(resultado)} filas")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lotes", type=int, default=400_000)
+    parser.add_argument("--periodos", type=int, default=12)
+    parser.add_argument("--tasa-inconsistencia", type=float, default=0.25)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    base = pd.DataFrame({
+        "Codigo_Articulo": [f"{c:06d}" for c in rng.integers(0, args.lotes // 20, args.lotes)],
+        "Nombre_Producto": "PRODUCTO",
+        "Lote": [f"L{i}" for i in range(args.lotes)],
+    })
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "historial.sqlite")
+        historial = Historial(ruta)
+
+        inicio = time.perf_counter()
+        for mes in range(1, args.periodos + 1):
+            resultado = resultado_sintetico(base, args.tasa_inconsistencia, rng)
+            historial.guardar(f"2024-{mes:02d}", resultado)
+        print(f"guardar {args.periodos} períodos: {time.perf_counter() - inicio:.1f} s, "
+              f"{os.path.getsize(ruta) / 1e6:.0f} MB")
+
+        cronometrar("tendencia", historial.tendencia)
+        cronometrar("recurrentes (3 seguidos)", lambda: historial.recurrentes(3))
+        cronometrar("recurrentes (6 seguidos)", lambda: historial.recurrentes(6))
+        cronometrar("recurrentes (3 en el año)", lambda: historial.recurrentes(3, consecutivos=False))
+        cronometrar("del_lote", lambda: historial.del_lote(base["Codigo_Articulo"].iloc[0]))
+
+
+if __name__ == "__main__":
+    main()
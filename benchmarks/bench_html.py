@@ -0,0 +1,77 @@
+"""Compara la lectura de exports HTML (.xls disfrazado) del ERP.
+
+Uso:
+    python benchmarks/bench_html.py --filas 200000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from generador import escribir_html, generar_periodo  # noqa: E402
+from modules.loader import load_excel  # noqa: E402
+
+
+def export_html_sintetico(filas, semilla=0):
+    # Traslados de un período sintético con `filas` movimientos
+    archivos = generar_periodo(filas=filas * 2, semilla=semilla)
+    salida = io.BytesIO()
+    escribir_html(archivos["traslados"], salida, "REPORTE DE TRASLADOS")
+    return salida.getvalue()
+
+
+def medir(contenido, modo, memoria):
+    archivo = io.BytesIO(contenido)
+    if memoria:
+        tracemalloc.start()
+
+    inicio = time.perf_counter()
+    df = load_excel(archivo, "traslados", modo=modo)
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return df, segundos, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--filas", type=int, default=200_000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument(
+        "--memoria", action="store_true",
+        help="medir también el pico de memoria (tracemalloc, más lento)"
+    )
+    args = parser.parse_args()
+
+    contenido = export_html_sintetico(args.filas)
+    print(f"Export sintético: {args.filas} filas, {len(contenido) / 1e6:.1f} MB")
+
+    resultados = {}
+    for modo in ("completo", "streaming"):
+        tiempos = []
+        for _ in range(args.repeticiones):
+            df, segundos, _ = medir(contenido, modo, memoria=False)
+            tiempos.append(segundos)
+        resultados[modo] = df
+
+        linea = f"{modo:>10}: {min(tiempos):.2f} s (mejor de {args.repeticiones})"
+        if args.memoria:
+            _, _, pico = medir(contenido, modo, memoria=True)
+            linea += f", pico {pico / 1e6:.0f} MB"
+        print(linea)
+
+    a = resultados["completo"].reset_index(drop=True).astype(str)
+    b = resultados["streaming"].reset_index(drop=True).astype(str)
+    print("Resultados idénticos:", a.equals(b))
+
+
+if __name__ == "__main__":
+    main()
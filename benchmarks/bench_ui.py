@@ -0,0 +1,105 @@
+"""Mide la latencia de reruns del dashboard al cambiar filtros.
+
+Arma un resultado sintético, lo publica como instantánea y simula las
+interacciones con streamlit.testing (AppTest). Se mide el tiempo de
+ejecución del script (AppTest además espera en intervalos de 0,1 s).
+AppTest vuelve a correr todo app.py en cada interacción: los tiempos son una
+cota superior de lo que tarda el panel de resultados, que en el servidor se
+vuelve a dibujar solo.
+
+Uso:
+    python benchmarks/bench_ui.py --filas 500000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from modules.conciliacion import ResultadoConciliacion, clasificar  # noqa: E402
+from modules.instantaneas import instantaneas  # noqa: E402
+
+
+def resultado_sintetico(filas, semilla=0):
+    rng = np.random.default_rng(semilla)
+    df = pd.DataFrame({
+        "Codigo_Articulo": pd.Categorical([f"{c:06d}" for c in rng.integers(0, filas // 20, filas)]),
+        "Nombre_Producto": pd.Categorical([f"PRODUCTO {c}" for c in rng.integers(0, filas // 20, filas)]),
+        "Lote": pd.Categorical([f"L{i}" for i in range(filas)]),
+    })
+    for columna in ["Inicial", "Recepciones", "Salidas", "Final_Sistema"]:
+        df[columna] = rng.integers(0, 50, filas).astype(float)
+    df["Final_Calculado"] = df["Inicial"] + df["Recepciones"] - df["Salidas"]
+    df["Diferencia"] = df["Final_Sistema"] - df["Final_Calculado"]
+    df["Tipo_Inconsistencia"] = clasificar(df)
+    return ResultadoConciliacion(df)
+
+
+# Duración de cada ejecución de app.py (la completa el script intermedio)
+TIEMPOS = []
+
+# Corre app.py tal cual y anota cuánto tardó, aunque termine en st.rerun()
+SCRIPT = """
+import runpy
+import time
+
+import bench_ui
+
+inicio = time.perf_counter()
+try:
+    runpy.run_path("app.py", run_name="__main__")
+finally:
+    bench_ui.TIEMPOS.append(time.perf_counter() - inicio)
+"""
+
+
+def main():
+    from streamlit.testing.v1 import AppTest
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=500_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    # El script intermedio importa este módulo: que sea el mismo, no una copia
+    sys.modules.setdefault("bench_ui", sys.modules[__name__])
+    instantanea = instantaneas.publicar(resultado_sintetico(args.filas))
+    os.chdir(RAIZ)
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as script:
+        script.write(SCRIPT)
+    app = AppTest.from_file(script.name, default_timeout=300)
+    app.session_state["instantanea"] = instantanea
+
+    app.run()
+    print(f"{args.filas} filas, {len(instantanea.resultado.inconsistencias)} inconsistencias")
+    print(f"{'primera carga':<28} {TIEMPOS[-1]:>8.3f} s")
+
+    filtro = next(s for s in app.selectbox if s.label == "Filtrar inconsistencias")
+    orden = next(s for s in app.selectbox if s.label == "Ordenar por")
+    interacciones = {
+        "filtro por tipo": lambda i: filtro.set_value(filtro.options[1 + i % (len(filtro.options) - 1)]),
+        "filtro Todas": lambda i: filtro.set_value("Todas"),
+        "orden": lambda i: orden.set_value(list(orden.options)[i % len(orden.options)]),
+        "búsqueda": lambda i: app.text_input(key="busqueda").input(f"L{i}1"),
+    }
+    for nombre, interaccion in interacciones.items():
+        tiempos = []
+        for i in range(args.repeticiones):
+            interaccion(i)
+            app.run()
+            tiempos.append(TIEMPOS[-1])
+            if app.exception:
+                raise RuntimeError(app.exception[0].value)
+        print(f"{nombre:<28} {statistics.median(tiempos):>8.3f} s (mediana de {len(tiempos)})")
+    os.unlink(script.name)
+
+
+if __name__ == "__main__":
+    main()
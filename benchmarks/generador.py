@@ -0,0 +1,230 @@
+"""Genera archivos sintéticos de farmacia con el formato de los exports del ERP.
+
+Uso:
+    python benchmarks/generador.py --salida /tmp/periodo --filas 100000
+    python benchmarks/generador.py --salida /tmp/periodo --filas 2000000 --formato html
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from modules.loader import BODEGA_PRINCIPAL  # noqa: E402
+
+# Límite de filas de una hoja de Excel
+MAX_FILAS_XLSX = 1_048_576 - 10
+
+ARCHIVOS = ("inicial", "traslados", "recepciones", "salidas", "final")
+
+# Tamaño de cada archivo de movimientos relativo al inventario inicial
+PROPORCIONES = {"traslados": 0.5, "recepciones": 0.25, "salidas": 0.1}
+
+OTRAS_BODEGAS = ["URGENCIAS", "HOSPITALIZACION", "CIRUGIA"]
+
+
+# =========================
+# Datos
+# =========================
+def generar_periodo(
+    filas=100_000,
+    lotes_por_producto=4,
+    tasa_inconsistencia=0.05,
+    tasa_lotes_nuevos=0.2,
+    semilla=0
+):
+    """Devuelve un dict tipo -> DataFrame con las columnas de cada export.
+
+    `filas` es la cantidad de lotes del inventario inicial; los movimientos
+    se escalan con PROPORCIONES. El inventario final cuadra con los
+    movimientos salvo en una fracción `tasa_inconsistencia` de los lotes.
+    """
+    rng = np.random.default_rng(semilla)
+    productos = max(filas // lotes_por_producto, 1)
+
+    codigos = np.char.zfill(rng.permutation(10 * productos)[:productos].astype(str), 6)
+    nombres = np.char.add("MEDICAMENTO ", codigos)
+
+    def lotes_aleatorios(n):
+        letras = np.array(list("ABCDEFGHJKLMNPQRSTUVWXYZ"))
+        return np.char.add(
+            np.char.add("L", rng.integers(1000, 9999, n).astype(str)),
+            letras[rng.integers(0, len(letras), n)]
+        )
+
+    # Inventario inicial: un registro por lote
+    producto_ini = rng.integers(0, productos, filas)
+    inicial = pd.DataFrame({
+        "CODIGO PRODUCTO": codigos[producto_ini],
+        "DESCRIPCION": nombres[producto_ini],
+        "LOTE": lotes_aleatorios(filas),
+        "CANTIDAD": rng.integers(0, 500, filas),
+    }).drop_duplicates(["CODIGO PRODUCTO", "LOTE"], ignore_index=True)
+
+    def tomar_lotes(n):
+        elegidos = inicial.iloc[rng.integers(0, len(inicial), n)]
+        return elegidos["CODIGO PRODUCTO"].to_numpy(), elegidos["LOTE"].to_numpy()
+
+    def movimientos(tipo):
+        n = int(filas * PROPORCIONES[tipo])
+        codigo, lote = tomar_lotes(n)
+        if tipo == "recepciones":
+            nuevos = rng.random(n) < tasa_lotes_nuevos
+            codigo[nuevos] = codigos[rng.integers(0, productos, nuevos.sum())]
+            lote[nuevos] = lotes_aleatorios(nuevos.sum())
+        return pd.DataFrame({
+            "CODIGO ARTICULO": codigo,
+            "NOMBRE ARTICULO": np.char.add("MEDICAMENTO ", codigo.astype(str)),
+            "LOTE": lote,
+            "CANTIDAD": rng.integers(1, 60, n),
+        })
+
+    traslados = movimientos("traslados")
+    salidas = movimientos("salidas")
+    for df in (traslados, salidas):
+        df["BODEGA ORIGEN"] = np.where(
+            rng.random(len(df)) < 0.8,
+            BODEGA_PRINCIPAL,
+            np.array(OTRAS_BODEGAS)[rng.integers(0, len(OTRAS_BODEGAS), len(df))]
+        )
+
+    recepciones = movimientos("recepciones").rename(
+        columns={"CANTIDAD": "CANTIDAD RECIBIDA"}
+    )
+    recepciones["PROVEEDOR"] = np.where(
+        rng.random(len(recepciones)) < 0.95, "DISTRIBUIDORA S.A.", "--------------"
+    )
+
+    # Inventario final que cuadra con los movimientos válidos
+    claves = ["CODIGO", "LOTE"]
+    partes = [
+        inicial.set_axis(["CODIGO", "NOMBRE", "LOTE", "CANTIDAD"], axis=1)[claves + ["CANTIDAD"]],
+        recepciones[recepciones["PROVEEDOR"] != "--------------"]
+        .rename(columns={"CODIGO ARTICULO": "CODIGO", "CANTIDAD RECIBIDA": "CANTIDAD"})[claves + ["CANTIDAD"]],
+    ]
+    for df in (traslados, salidas):
+        validas = df[df["BODEGA ORIGEN"] == BODEGA_PRINCIPAL]
+        partes.append(
+            validas.rename(columns={"CODIGO ARTICULO": "CODIGO"})[claves]
+            .assign(CANTIDAD=-validas["CANTIDAD"].to_numpy())
+        )
+    final = pd.concat(partes, ignore_index=True).groupby(claves, as_index=False)["CANTIDAD"].sum()
+
+    # Inconsistencias: ajustes en una fracción de lotes
+    alterados = rng.random(len(final)) < tasa_inconsistencia
+    final.loc[alterados, "CANTIDAD"] += rng.choice([-1, 1], alterados.sum()) * rng.integers(1, 20, alterados.sum())
+
+    final = pd.DataFrame({
+        "CODIGO PRODUCTO": final["CODIGO"],
+        "DESCRIPCION": np.char.add("MEDICAMENTO ", final["CODIGO"].to_numpy().astype(str)),
+        "LOTE": final["LOTE"],
+        "CANTIDAD": final["CANTIDAD"],
+    }).sample(frac=1, random_state=semilla, ignore_index=True)
+
+    return {
+        "inicial": inicial,
+        "traslados": traslados,
+        "recepciones": recepciones,
+        "salidas": salidas,
+        "final": final,
+    }
+
+
+# =========================
+# Escritura
+# =========================
+TITULOS = {
+    "inicial": "INVENTARIO INICIAL",
+    "traslados": "REPORTE DE TRASLADOS",
+    "recepciones": "REPORTE DE RECEPCIONES",
+    "salidas": "REPORTE DE SALIDAS DE BODEGA",
+    "final": "INVENTARIO FINAL",
+}
+
+
+def escribir_xlsx(df, destino, titulo="REPORTE"):
+    if len(df) > MAX_FILAS_XLSX:
+        raise ValueError(
+            f"{len(df)} filas no caben en una hoja de Excel; use formato html"
+        )
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Hoja1")
+    # Filas de título antes del encabezado, como en los exports reales
+    ws.append([titulo])
+    ws.append(["Generado por benchmarks/generador.py"])
+    ws.append([])
+    ws.append(list(df.columns))
+    for fila in df.itertuples(index=False, name=None):
+        ws.append(fila)
+    wb.save(destino)
+
+
+def escribir_html(df, destino, titulo="REPORTE"):
+    # "Excel" del ERP: tabla HTML en latin-1 con extensión .xls
+    def filas():
+        yield "<html><body><table>\n"
+        yield f"<tr><td colspan={len(df.columns)}>{titulo}</td></tr>\n"
+        yield "<tr><td>Generado por benchmarks/generador.py</td></tr>\n"
+        yield "<tr>" + "".join(f"<td>{c}</td>" for c in df.columns) + "</tr>\n"
+        for fila in df.itertuples(index=False, name=None):
+            yield "<tr>" + "".join(f"<td>{v}</td>" for v in fila) + "</tr>\n"
+        yield "</table>\n<table><tr><td>TOTAL</td><td>%d</td></tr></table>\n" % len(df)
+        yield "</body></html>\n"
+
+    texto = "".join(filas()).encode("latin-1")
+    if hasattr(destino, "write"):
+        destino.write(texto)
+    else:
+        Path(destino).write_bytes(texto)
+
+
+def escribir_periodo(archivos, directorio, formato="mixto"):
+    """Escribe los archivos; devuelve dict tipo -> ruta.
+
+    formato: "xlsx", "html" o "mixto" (traslados y salidas en HTML, como
+    llegan del ERP). Lo que no cabe en una hoja se escribe en HTML.
+    """
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+
+    rutas = {}
+    for tipo, df in archivos.items():
+        html = formato == "html" or (formato == "mixto" and tipo in ("traslados", "salidas"))
+        if len(df) > MAX_FILAS_XLSX:
+            html = True
+
+        ruta = directorio / f"{tipo}.{'xls' if html else 'xlsx'}"
+        escritor = escribir_html if html else escribir_xlsx
+        escritor(df, ruta, TITULOS[tipo])
+        rutas[tipo] = ruta
+    return rutas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--salida", required=True)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--lotes-por-producto", type=int, default=4)
+    parser.add_argument("--tasa-inconsistencia", type=float, default=0.05)
+    parser.add_argument("--formato", choices=["xlsx", "html", "mixto"], default="mixto")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    archivos = generar_periodo(
+        filas=args.filas,
+        lotes_por_producto=args.lotes_por_producto,
+        tasa_inconsistencia=args.tasa_inconsistencia,
+        semilla=args.semilla
+    )
+    for tipo, ruta in escribir_periodo(archivos, args.salida, args.formato).items():
+        print(f"{tipo:>12}: {len(archivos[tipo]):>9} filas -> {ruta}")
+
+
+if __name__ == "__main__":
+    main()
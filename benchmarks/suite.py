@@ -0,0 +1,201 @@
+"""Mide por etapa el flujo lectura -> conciliar -> exportar con datos sintéticos.
+
+Cada corrida se guarda en benchmarks/resultados/ y se compara con la
+anterior (o con --comparar) para detectar regresiones.
+
+Uso:
+    python benchmarks/suite.py --tamanos 10000 100000
+    python benchmarks/suite.py --tamanos 1000000 --formato html --memoria
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from generador import ARCHIVOS, escribir_periodo, generar_periodo  # noqa: E402
+from modules.conciliacion import conciliar  # noqa: E402
+from modules.exporter import exportar  # noqa: E402
+from modules.loader import load_excel  # noqa: E402
+
+DIRECTORIO_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+UMBRAL_REGRESION = 0.10
+# Diferencias menores a esto (segundos) se consideran ruido
+DIFERENCIA_MINIMA = 0.05
+
+
+def medir(funcion, memoria):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+
+    # tracemalloc distorsiona los tiempos: la memoria se mide aparte
+    pico = None
+    if memoria:
+        tracemalloc.start()
+        funcion()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def correr_tamano(tamano, args, directorio):
+    archivos = generar_periodo(
+        filas=tamano,
+        lotes_por_producto=args.lotes_por_producto,
+        tasa_inconsistencia=args.tasa_inconsistencia
+    )
+    rutas = escribir_periodo(archivos, directorio, args.formato)
+
+    mediciones = []
+
+    def registrar(etapa, funcion, filas=None, bytes_=None):
+        resultado, segundos, pico = medir(funcion, args.memoria)
+        mediciones.append({
+            "tamano": tamano,
+            "etapa": etapa,
+            "segundos": round(segundos, 4),
+            "pico_bytes": pico,
+            "filas": filas if filas is not None else (
+                len(resultado) if hasattr(resultado, "__len__") else None
+            ),
+            "bytes": bytes_,
+        })
+        print(f"{tamano:>9} {etapa:<22} {segundos:>8.3f} s"
+              + (f"  pico {pico / 1e6:>7.1f} MB" if pico is not None else ""))
+        return resultado
+
+    # Lectura: cada archivo por separado
+    dfs = {}
+    for tipo in ARCHIVOS:
+        ruta = rutas[tipo]
+        with open(ruta, "rb") as f:
+            contenido = f.read()
+        dfs[tipo] = registrar(
+            f"lectura:{tipo}",
+            lambda c=contenido, t=tipo: load_excel(io.BytesIO(c), t),
+            bytes_=len(contenido)
+        )
+
+    resultado = registrar(
+        "conciliar",
+        lambda: conciliar(*(dfs[t] for t in ARCHIVOS))
+    )
+    resultado = getattr(resultado, "df", resultado)
+    inconsistencias = resultado[resultado["Diferencia"] != 0]
+
+    for formato in args.exportar:
+        registrar(
+            f"exportar:{formato}",
+            lambda f=formato: exportar(inconsistencias, f),
+            filas=len(inconsistencias)
+        )
+
+    return mediciones
+
+
+def metadatos(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametros": {
+            "tamanos": args.tamanos,
+            "formato": args.formato,
+            "lotes_por_producto": args.lotes_por_producto,
+            "tasa_inconsistencia": args.tasa_inconsistencia,
+            "memoria": args.memoria,
+        },
+    }
+
+
+def comparar(actual, anterior, umbral=UMBRAL_REGRESION):
+    previas = {
+        (m["tamano"], m["etapa"]): m for m in anterior["mediciones"]
+    }
+    regresiones = []
+
+    print(f"\nComparación con {anterior['meta'].get('fecha')} "
+          f"(commit {anterior['meta'].get('commit')}):")
+    for m in actual["mediciones"]:
+        previa = previas.get((m["tamano"], m["etapa"]))
+        if previa is None or not previa["segundos"]:
+            continue
+        razon = m["segundos"] / previa["segundos"]
+        marca = ""
+        if razon > 1 + umbral and m["segundos"] - previa["segundos"] > DIFERENCIA_MINIMA:
+            marca = "  <-- REGRESIÓN"
+            regresiones.append(m)
+        print(f"{m['tamano']:>9} {m['etapa']:<22} {previa['segundos']:>8.3f} -> "
+              f"{m['segundos']:>8.3f} s  (x{razon:.2f}){marca}")
+    return regresiones
+
+
+def ultima_corrida():
+    if not DIRECTORIO_RESULTADOS.exists():
+        return None
+    rutas = sorted(DIRECTORIO_RESULTADOS.glob("*.json"))
+    return rutas[-1] if rutas else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--formato", choices=["xlsx", "html", "mixto"], default="mixto")
+    parser.add_argument("--lotes-por-producto", type=int, default=4)
+    parser.add_argument("--tasa-inconsistencia", type=float, default=0.05)
+    parser.add_argument("--exportar", nargs="*", default=["xlsx", "csv", "parquet"])
+    parser.add_argument("--memoria", action="store_true",
+                        help="medir pico de memoria por etapa (tracemalloc, más lento)")
+    parser.add_argument("--comparar", type=Path,
+                        help="corrida contra la cual comparar (por defecto, la última)")
+    parser.add_argument("--no-guardar", action="store_true")
+    args = parser.parse_args()
+
+    mediciones = []
+    with tempfile.TemporaryDirectory() as temporal:
+        for tamano in args.tamanos:
+            mediciones += correr_tamano(tamano, args, Path(temporal) / str(tamano))
+
+    actual = {"meta": metadatos(args), "mediciones": mediciones}
+
+    ruta_anterior = args.comparar or ultima_corrida()
+    regresiones = []
+    if ruta_anterior is not None:
+        regresiones = comparar(actual, json.loads(Path(ruta_anterior).read_text()))
+
+    if not args.no_guardar:
+        DIRECTORIO_RESULTADOS.mkdir(exist_ok=True)
+        ruta = DIRECTORIO_RESULTADOS / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+        ruta.write_text(json.dumps(actual, indent=2, ensure_ascii=False))
+        print(f"\nResultados guardados en {ruta}")
+
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
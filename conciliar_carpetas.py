@@ -0,0 +1,81 @@
+"""Concilia sin interfaz todas las carpetas de período/sede bajo una raíz.
+
+Cada carpeta con archivos .xlsx/.xls se concilia por separado; el tipo de
+cada archivo se reconoce por las columnas de su encabezado y, cuando varios
+tipos tienen las mismas columnas, por su nombre (inicial, final, traslados,
+recepciones/entradas, salidas) o el título del reporte. Una carpeta con
+archivos repetidos, faltantes o sin reconocer no se concilia y queda con su
+error en resumen.csv. Los resultados se escriben en --salida con
+la misma estructura de carpetas, junto con resumen.csv. Con --historial
+cada carpeta se guarda también en la base de historial: el primer nivel
+de la ruta es el período y el resto, la sede. Con --periodos se guarda
+el estado de cada período y los de una misma sede se concilian en orden:
+una carpeta sin inventario inicial toma el final del período anterior.
+
+Uso:
+    python conciliar_carpetas.py historico/ --salida resultados/
+    python conciliar_carpetas.py historico/2024 --salida out/ --formato parquet --procesos 8
+    python conciliar_carpetas.py historico/ --salida resultados/ --historial
+    python conciliar_carpetas.py historico/ --salida resultados/ --periodos
+"""
+import argparse
+import sys
+
+from modules.carpetas import conciliar_arbol
+from modules.exporter import FORMATOS
+from modules.historial import RUTA_HISTORIAL
+from modules.periodos import DIRECTORIO_PERIODOS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("raiz", help="carpeta con una subcarpeta por período/sede")
+    parser.add_argument("--salida", required=True)
+    parser.add_argument("--formato", choices=list(FORMATOS), default="xlsx")
+    parser.add_argument("--todas-bodegas", action="store_true",
+                        help="conciliar todas las bodegas con inventario, no solo la principal")
+    parser.add_argument("--lotes-similares", action="store_true",
+                        help="marcar lotes posiblemente mal digitados (lotes_similares.csv)")
+    parser.add_argument("--memoria-max", type=int, default=None, metavar="MB",
+                        help="leer por bloques con este tope para las sumas por lote de cada carpeta")
+    parser.add_argument("--historial", nargs="?", const=RUTA_HISTORIAL, default=None, metavar="RUTA",
+                        help=f"guardar cada carpeta en la base de historial (por defecto {RUTA_HISTORIAL})")
+    parser.add_argument("--periodos", nargs="?", const=DIRECTORIO_PERIODOS, default=None, metavar="RUTA",
+                        help=f"guardar el estado de cada período (por defecto en {DIRECTORIO_PERIODOS})")
+    parser.add_argument("--procesos", type=int, default=None,
+                        help="procesos en paralelo (por defecto, uno por CPU)")
+    args = parser.parse_args()
+    if args.memoria_max and args.todas_bodegas:
+        parser.error("--memoria-max no se puede combinar con --todas-bodegas")
+    if args.periodos and (args.memoria_max or args.todas_bodegas):
+        parser.error("--periodos no se puede combinar con --memoria-max ni con --todas-bodegas")
+
+    def al_terminar(fila):
+        if fila["Estado"] == "ok":
+            print(f"{fila['Carpeta']}: {fila['Lotes']} lotes, "
+                  f"{fila['Inconsistencias']} inconsistencias ({fila['Segundos']:.1f} s)")
+            if fila["Avisos"]:
+                print(f"{fila['Carpeta']}: {fila['Avisos']}", file=sys.stderr)
+        else:
+            print(f"{fila['Carpeta']}: ERROR {fila['Error']}", file=sys.stderr)
+
+    resumen = conciliar_arbol(
+        args.raiz,
+        args.salida,
+        formato=args.formato,
+        todas_bodegas=args.todas_bodegas,
+        lotes_similares=args.lotes_similares,
+        memoria_max=args.memoria_max * 1024 * 1024 if args.memoria_max else None,
+        procesos=args.procesos,
+        al_terminar=al_terminar,
+        historial=args.historial,
+        periodos=args.periodos
+    )
+
+    errores = int((resumen["Estado"] != "ok").sum())
+    print(f"\n{len(resumen)} carpetas, {errores} con error. Resumen en {args.salida}/resumen.csv")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from modules.claves import DiccionarioClaves, guardar_tablas
+from modules.conciliacion import (
+    FUENTE_POR_TIPO,
+    FUENTES,
+    ResultadoConciliacion,
+    construir_resultado,
+    normalizar,
+)
+from modules.loader import FILAS_POR_BLOQUE, filas_validas, leer_por_bloques
+from modules.metricas import etapa, verificar_cancelacion
+from modules.similares import marcar_similares
+
+# =========================
+# Configuración
+# =========================
+MEMORIA_MAX = int(os.environ.get("INVENTARIO_MEMORIA_MAX_MB", "512")) * 1024 * 1024
+DIRECTORIO_DESBORDE = os.environ.get("INVENTARIO_DESBORDE_DIR", ".cache/desborde")
+PARTICIONES = 16
+# Clave, fila de la matriz y su parte de la factorización al consolidar
+BYTES_POR_CLAVE = 8 + 8 * len(FUENTES) + 16
+
+# Mismo orden que conciliar(): define qué texto se muestra para cada clave
+ORDEN_BLOQUES = ("inicial", "recepciones", "traslados", "final", "salidas")
+
+
+# =========================
+# Sumas parciales
+# =========================
+def _consolidar(claves, matriz):
+    # Una fila por clave distinta (en orden de primera aparición)
+    posiciones, unicas = pd.factorize(claves)
+    suma = np.zeros((len(unicas), matriz.shape[1]))
+    for j in range(matriz.shape[1]):
+        suma[:, j] = np.bincount(posiciones, weights=matriz[:, j], minlength=len(unicas))
+    return np.asarray(unicas, dtype=np.int64), suma
+
+
+class Acumulador:
+    """Sumas por clave y fuente con un tope de claves en memoria.
+
+    Los bloques se suman aparte y se consolidan cuando pasan el tope. Si
+    después de consolidar siguen ocupando más de la mitad, las sumas se
+    reparten por hash de la clave en PARTICIONES archivos y se liberan; al
+    final cada partición se consolida por separado.
+    """
+
+    def __init__(self, max_claves, directorio=DIRECTORIO_DESBORDE, particiones=PARTICIONES):
+        self.max_claves = max(int(max_claves), 1)
+        self.directorio = directorio
+        self.particiones = particiones
+        self.desbordes = 0
+        self._pendientes = []
+        self._filas = 0
+        self._temporal = None
+
+    def sumar(self, fuente, claves, cantidades):
+        claves, suma = _consolidar(
+            np.asarray(claves, dtype=np.int64),
+            np.asarray(cantidades, dtype=np.float64)[:, None]
+        )
+        matriz = np.zeros((len(claves), len(FUENTES)))
+        matriz[:, FUENTES.index(fuente)] = suma[:, 0]
+        self._pendientes.append((claves, matriz))
+        self._filas += len(claves)
+
+        if self._filas > self.max_claves:
+            claves, matriz = self._juntar()
+            if len(claves) > self.max_claves // 2:
+                self._desbordar(claves, matriz)
+            else:
+                self._pendientes = [(claves, matriz)]
+                self._filas = len(claves)
+
+    def _juntar(self):
+        if not self._pendientes:
+            return np.array([], dtype=np.int64), np.zeros((0, len(FUENTES)))
+        claves = np.concatenate([c for c, _ in self._pendientes])
+        matriz = np.concatenate([m for _, m in self._pendientes])
+        self._pendientes, self._filas = [], 0
+        return _consolidar(claves, matriz)
+
+    def _desbordar(self, claves, matriz):
+        with etapa("desborde", filas=len(claves)) as datos:
+            if self._temporal is None:
+                Path(self.directorio).mkdir(parents=True, exist_ok=True)
+                self._temporal = Path(tempfile.mkdtemp(dir=self.directorio))
+            particion = claves % self.particiones
+            for p in range(self.particiones):
+                filas = particion == p
+                if filas.any():
+                    np.savez(
+                        self._temporal / f"p{p:03d}-{self.desbordes:05d}.npz",
+                        claves=claves[filas],
+                        matriz=matriz[filas]
+                    )
+            self.desbordes += 1
+            datos["detalle"] = f"desborde {self.desbordes}"
+
+    def resultado(self):
+        """Devuelve (claves, matriz) con una fila por clave."""
+        claves, matriz = self._juntar()
+        if self._temporal is None:
+            return claves, matriz
+
+        try:
+            self._desbordar(claves, matriz)
+            del claves, matriz
+            partes = []
+            for p in range(self.particiones):
+                archivos = sorted(self._temporal.glob(f"p{p:03d}-*.npz"))
+                if not archivos:
+                    continue
+                piezas = [np.load(a) for a in archivos]
+                partes.append(_consolidar(
+                    np.concatenate([pieza["claves"] for pieza in piezas]),
+                    np.concatenate([pieza["matriz"] for pieza in piezas])
+                ))
+            return (
+                np.concatenate([c for c, _ in partes]),
+                np.concatenate([m for _, m in partes])
+            )
+        finally:
+            self.limpiar()
+
+    def limpiar(self):
+        if self._temporal is not None:
+            shutil.rmtree(self._temporal, ignore_errors=True)
+            self._temporal = None
+
+
+# =========================
+# Conciliación
+# =========================
+def _abrir(archivo):
+    # Rutas se abren (y cierran) aquí; los archivos ya abiertos (uploads de
+    # Streamlit) quedan como están
+    if isinstance(archivo, (str, os.PathLike)):
+        return open(archivo, "rb")
+    return nullcontext(archivo)
+
+
+def conciliar_por_bloques(
+    archivos,
+    memoria_max=MEMORIA_MAX,
+    filas_por_bloque=FILAS_POR_BLOQUE,
+    directorio=DIRECTORIO_DESBORDE,
+    lotes_similares=False
+):
+    """Concilia sin tener ningún archivo completo en memoria.
+
+    `archivos` es un dict tipo -> ruta o archivo (salidas puede faltar).
+    Cada archivo se lee en bloques de `filas_por_bloque` filas y solo se
+    guardan las sumas por clave; si superan `memoria_max` bytes se
+    desbordan a disco (ver Acumulador). El resultado es el mismo de
+    conciliar() salvo la procedencia, que requiere los archivos completos.
+
+    `memoria_max` acota solo esas sumas. No cuenta los diccionarios de
+    códigos y lotes (DiccionarioClaves y las tablas canónicas), los nombres
+    de producto ni el resultado final, que crecen con la cantidad de
+    códigos y lotes distintos y quedan en memoria.
+    """
+    acumulador = Acumulador(memoria_max // 2 // BYTES_POR_CLAVE, directorio)
+    diccionario = DiccionarioClaves()
+    nombres, todos_los_nombres = {}, set()
+
+    try:
+        for tipo in ORDEN_BLOQUES:
+            if archivos.get(tipo) is None:
+                continue
+
+            with _abrir(archivos[tipo]) as archivo, etapa("bloques", archivo=tipo) as datos:
+                bloques = filas = 0
+                for bloque in leer_por_bloques(archivo, tipo, filas_por_bloque):
+                    verificar_cancelacion()
+                    bloques += 1
+                    filas += len(bloque)
+
+                    # Primer nombre de cada código, como nombres_por_codigo
+                    if tipo == "inicial":
+                        ids = diccionario.codificar_codigos(bloque["CODIGO PRODUCTO"])
+                        for id_codigo, nombre in zip(ids, bloque["NOMBRE PRODUCTO"].to_numpy()):
+                            nombres.setdefault(id_codigo, nombre)
+                        todos_los_nombres.update(bloque["NOMBRE PRODUCTO"].dropna().unique())
+
+                    validas = filas_validas(bloque, tipo)
+                    if len(validas) < len(bloque):
+                        bloque = bloque.iloc[validas]
+                    normalizado = normalizar(bloque, diccionario, tipo)
+                    acumulador.sumar(FUENTE_POR_TIPO[tipo], normalizado["CLAVE"], normalizado["CANTIDAD"])
+                datos["filas"] = filas
+                datos["detalle"] = f"{bloques} bloques"
+
+        with etapa("agrupar") as datos:
+            claves, matriz = acumulador.resultado()
+            datos["filas"] = len(claves)
+            datos["detalle"] = f"{acumulador.desbordes} desbordes"
+    finally:
+        acumulador.limpiar()
+
+    # Mismas categorías que el nombre leído completo
+    nombres = pd.Series(
+        pd.Categorical(list(nombres.values()), categories=sorted(todos_los_nombres)),
+        index=list(nombres)
+    )
+    df = construir_resultado(claves, matriz, diccionario, nombres)
+    guardar_tablas()
+
+    similares = None
+    if lotes_similares:
+        df, similares = marcar_similares(df)
+
+    with etapa("resumen", filas=len(df)):
+        return ResultadoConciliacion(df, similares=similares)
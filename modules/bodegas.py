@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from modules.claves import Diccionario, DiccionarioClaves, guardar_tablas
+from modules.conciliacion import (
+    CANTIDAD,
+    CLAVE,
+    COLUMNAS_RESULTADO,
+    FUENTE_POR_TIPO,
+    FUENTES,
+    ResultadoConciliacion,
+    agregar_movimientos,
+    calcular,
+    nombres_por_codigo,
+    normalizar
+)
+from modules.loader import BODEGA_PRINCIPAL, COLUMNAS_BODEGA, limpiar_bodega
+from modules.metricas import etapa
+from modules.similares import marcar_similares
+
+BODEGA = "Bodega"
+GRUPO = "GRUPO"
+# Archivos que dicen qué bodegas tienen inventario
+INVENTARIOS = ("inicial", "final")
+
+
+def bodegas_de(df, tipo):
+    """Bodega de cada fila (limpia, NA si está vacía).
+
+    Un archivo sin columna de bodega es de BODEGA_PRINCIPAL: así llegan
+    los inventarios y recepciones de una sola bodega.
+    """
+    for columna in COLUMNAS_BODEGA[tipo]:
+        if columna in df.columns:
+            return limpiar_bodega(df[columna])
+    return pd.Series(BODEGA_PRINCIPAL, index=df.index, dtype="string")
+
+
+def _con_grupo(df, tipo, diccionario, bodegas):
+    # Las filas sin bodega no se pueden asignar: quedan fuera
+    de_bodega = bodegas_de(df, tipo)
+    con_bodega = de_bodega.notna().to_numpy()
+    if not con_bodega.all():
+        df, de_bodega = df[con_bodega], de_bodega[con_bodega]
+    normalizado = normalizar(df, diccionario, tipo)
+    # Una búsqueda en el diccionario por bodega distinta, no por fila
+    posiciones, unicas = pd.factorize(de_bodega)
+    normalizado[GRUPO] = bodegas.codificar(unicas.tolist())[posiciones]
+    return normalizado
+
+
+def agregar_por_grupo(movimientos, fuentes=FUENTES):
+    """Igual que agregar_movimientos, pero por (grupo, clave) en una pasada.
+
+    Cada frame trae además la columna GRUPO (entero). Devuelve grupos,
+    claves y la matriz grupo·clave × fuentes.
+    """
+    unicas = pd.Index(pd.unique(np.concatenate(
+        [pd.unique(np.asarray(df[CLAVE], dtype=np.int64)) for _, df in movimientos]
+    )))
+    n = max(len(unicas), 1)
+
+    # Clave combinada densa: grupo * n + posición de la clave
+    combinados = [
+        (
+            fuente,
+            pd.DataFrame({
+                CLAVE: np.asarray(df[GRUPO], dtype=np.int64) * n
+                + unicas.get_indexer(np.asarray(df[CLAVE], dtype=np.int64)),
+                CANTIDAD: df[CANTIDAD].to_numpy()
+            })
+        )
+        for fuente, df in movimientos
+    ]
+    combinadas, matriz = agregar_movimientos(combinados, fuentes=fuentes)
+
+    return combinadas // n, unicas.to_numpy()[combinadas % n], matriz
+
+
+def _conciliar_grupo(archivos, catalogo):
+    diccionario = DiccionarioClaves()
+    bodegas = Diccionario()
+
+    # Los nombres salen del inventario inicial completo, sin filtrar bodegas
+    nombres = nombres_por_codigo(catalogo, diccionario)
+
+    movimientos = [
+        (FUENTE_POR_TIPO[tipo], _con_grupo(df, tipo, diccionario, bodegas))
+        for tipo, df in archivos.items()
+        if df is not None and not df.empty
+    ]
+
+    with etapa("agrupar", filas=sum(len(df) for _, df in movimientos)):
+        grupos, claves, matriz = agregar_por_grupo(movimientos)
+
+    with etapa("unir", filas=len(claves)):
+        # Orden por bodega y luego por código y lote
+        rango_clave = np.empty(len(claves), dtype=np.int64)
+        rango_clave[diccionario.orden(claves)] = np.arange(len(claves))
+        orden = np.lexsort((rango_clave, bodegas.rangos()[grupos]))
+        grupos, claves, matriz = grupos[orden], claves[orden], matriz[orden]
+
+        # Mismos tipos que conciliar(): textos como categorías
+        codigos, lotes = diccionario.categoricos(claves)
+        df = pd.DataFrame(matriz, columns=FUENTES)
+        df.insert(0, BODEGA, bodegas.categorico(grupos))
+        df.insert(1, "Codigo_Articulo", codigos)
+        df.insert(2, "Nombre_Producto", nombres.reindex(diccionario.id_codigo(claves)).array)
+        df.insert(3, "Lote", lotes)
+
+    guardar_tablas()
+    return calcular(df)[[BODEGA] + COLUMNAS_RESULTADO]
+
+
+def _filtrar_bodegas(df, tipo, bodegas):
+    if df is None or df.empty:
+        return df
+    return df[bodegas_de(df, tipo).isin(bodegas).to_numpy(dtype=bool, na_value=False)]
+
+
+def _bodegas_en(archivos, tipos):
+    return set().union(*(
+        bodegas_de(df, tipo).dropna().unique()
+        for tipo, df in archivos.items()
+        if tipo in tipos and df is not None and not df.empty
+    ))
+
+
+def conciliar_por_bodega(
+    inicial,
+    traslados,
+    recepciones,
+    salidas,
+    final_sistema,
+    bodegas=None,
+    procesos=0,
+    lotes_similares=False
+):
+    """Concilia todas las bodegas a partir de una sola lectura de cada archivo.
+
+    Traslados y salidas se reparten por BODEGA ORIGEN; inventarios y
+    recepciones por su columna de bodega (ver COLUMNAS_BODEGA). Solo se
+    concilian las bodegas que aparecen en el inventario inicial o final:
+    las demás (por ejemplo, con inventarios sin columna de bodega) no
+    tienen contra qué cuadrar y saldrían con todos sus lotes
+    inconsistentes. Con `procesos` > 1 las bodegas se reparten entre
+    procesos. Con `lotes_similares`, las parejas se buscan dentro de cada
+    bodega.
+
+    Devuelve (ResultadoConciliacion, resumen por bodega, bodegas que
+    quedaron fuera por no tener inventario). El resultado no trae
+    procedencia: no hay detalle de movimientos por lote.
+    """
+    # Mismos filtros de negocio que filas_validas, salvo el de bodega
+    if recepciones is not None and not recepciones.empty:
+        recepciones = recepciones[recepciones["PROVEEDOR"] != "--------------"]
+
+    catalogo = inicial[["CODIGO PRODUCTO", "NOMBRE PRODUCTO"]]
+    archivos = {
+        "inicial": inicial,
+        "traslados": traslados,
+        "recepciones": recepciones,
+        "salidas": salidas,
+        "final": final_sistema,
+    }
+
+    con_inventario = _bodegas_en(archivos, INVENTARIOS)
+    sin_inventario = sorted(_bodegas_en(archivos, archivos) - con_inventario)
+    if bodegas is None:
+        bodegas = con_inventario
+    else:
+        bodegas = con_inventario & set(limpiar_bodega(pd.Series(list(bodegas))).dropna())
+    if not bodegas:
+        raise ValueError("Ninguna bodega tiene inventario inicial o final")
+    archivos = {
+        tipo: _filtrar_bodegas(df, tipo, bodegas)
+        for tipo, df in archivos.items()
+    }
+
+    if procesos and procesos > 1:
+        resultado = _conciliar_en_procesos(archivos, catalogo, procesos)
+    else:
+        resultado = _conciliar_grupo(archivos, catalogo)
+
+    similares = None
+    if lotes_similares:
+        resultado, similares = marcar_similares(resultado)
+
+    return (
+        ResultadoConciliacion(resultado, similares=similares),
+        resumen_por_bodega(resultado),
+        sin_inventario
+    )
+
+
+def _conciliar_en_procesos(archivos, catalogo, procesos):
+    todas = sorted(_bodegas_en(archivos, archivos))
+    lotes = [todas[i::procesos] for i in range(procesos) if todas[i::procesos]]
+
+    with ProcessPoolExecutor(max_workers=len(lotes)) as executor:
+        futuros = [
+            executor.submit(
+                _conciliar_grupo,
+                {
+                    tipo: _filtrar_bodegas(df, tipo, lote)
+                    for tipo, df in archivos.items()
+                },
+                catalogo
+            )
+            for lote in lotes
+        ]
+        partes = [futuro.result() for futuro in futuros]
+
+    # Cada proceso arma sus propias categorías: se unen (en orden
+    # alfabético, como en conciliar) para que concat no las pase a texto
+    for columna in partes[0].select_dtypes("category").columns:
+        categorias = sorted(set().union(*(p[columna].cat.categories for p in partes)))
+        for parte in partes:
+            parte[columna] = parte[columna].cat.set_categories(categorias)
+    resultado = pd.concat(partes, ignore_index=True)
+    return resultado.sort_values(BODEGA, kind="stable").reset_index(drop=True)
+
+
+def resumen_por_bodega(resultado):
+    inconsistencias = resultado[resultado["Diferencia"] != 0]
+
+    resumen = (
+        inconsistencias
+        .groupby([BODEGA, "Tipo_Inconsistencia"], observed=True)
+        .size()
+        .unstack(fill_value=0)
+    )
+    resumen = resumen.reindex(resultado[BODEGA].unique(), fill_value=0)
+    resumen.columns.name = None
+    resumen["Total"] = resumen.sum(axis=1)
+    resumen["Lotes"] = resultado.groupby(BODEGA, observed=True).size()
+    return resumen.reset_index()
@@ -0,0 +1,190 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+
+import pandas as pd
+
+from modules.loader import load_excel
+from modules.metricas import etapa
+
+# =========================
+# Configuración
+# =========================
+DIRECTORIO_CACHE = os.environ.get("INVENTARIO_CACHE_DIR", ".cache/lecturas")
+MAX_ENTRADAS_MEMORIA = 16
+MAX_EDAD_DISCO = 14 * 24 * 3600          # segundos
+MAX_BYTES_DISCO = 512 * 1024 * 1024
+# Cambia cuando cambian las columnas o los tipos que devuelve load_excel
+VERSION_LECTURA = 3
+
+
+class CacheLecturas:
+    """Caché de DataFrames ya leídos, direccionada por el contenido del archivo.
+
+    Nivel 1: LRU en memoria del proceso.
+    Nivel 2: Parquet en disco local, con desalojo por edad y tamaño total.
+    """
+
+    def __init__(
+        self,
+        directorio=DIRECTORIO_CACHE,
+        max_entradas=MAX_ENTRADAS_MEMORIA,
+        max_edad=MAX_EDAD_DISCO,
+        max_bytes=MAX_BYTES_DISCO
+    ):
+        self.directorio = Path(directorio) if directorio else None
+        self.max_entradas = max_entradas
+        self.max_edad = max_edad
+        self.max_bytes = max_bytes
+
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.estadisticas = {"memoria": 0, "disco": 0, "fallos": 0}
+
+    # ===============================
+    # Claves
+    # ===============================
+    @staticmethod
+    def clave(contenido, tipo):
+        return f"{hashlib.sha256(contenido).hexdigest()}-{tipo}-v{VERSION_LECTURA}"
+
+    def _ruta(self, clave):
+        return self.directorio / f"{clave}.parquet"
+
+    # ===============================
+    # Lectura
+    # ===============================
+    def obtener(self, clave):
+        with self._lock:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                self.estadisticas["memoria"] += 1
+                return self._memoria[clave].copy()
+
+        df = self._leer_disco(clave)
+
+        with self._lock:
+            if df is None:
+                self.estadisticas["fallos"] += 1
+                return None
+            self.estadisticas["disco"] += 1
+            self._guardar_memoria(clave, df)
+            return df.copy()
+
+    def _leer_disco(self, clave):
+        if self.directorio is None:
+            return None
+
+        ruta = self._ruta(clave)
+        if not ruta.exists():
+            return None
+
+        try:
+            df = pd.read_parquet(ruta)
+            os.utime(ruta)
+            # Parquet devuelve string[python]: se vuelve a Arrow
+            texto = [c for c, t in df.dtypes.items() if isinstance(t, pd.StringDtype)]
+            return df.astype({c: "string[pyarrow]" for c in texto})
+        except Exception:
+            # Archivo corrupto o a medio escribir: se descarta
+            ruta.unlink(missing_ok=True)
+            return None
+
+    # ===============================
+    # Escritura
+    # ===============================
+    def guardar(self, clave, df):
+        with self._lock:
+            self._guardar_memoria(clave, df)
+        self._guardar_disco(clave, df)
+
+    def _guardar_memoria(self, clave, df):
+        self._memoria[clave] = df
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def _guardar_disco(self, clave, df):
+        if self.directorio is None:
+            return
+
+        ruta = self._ruta(clave)
+        temporal = ruta.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(temporal)
+            os.replace(temporal, ruta)
+        except Exception:
+            # Columnas con tipos mezclados, disco lleno, etc.: solo memoria
+            temporal.unlink(missing_ok=True)
+            return
+
+        self.desalojar()
+
+    def desalojar(self):
+        if self.directorio is None or not self.directorio.exists():
+            return
+
+        ahora = time.time()
+        archivos = []
+        for ruta in self.directorio.glob("*.parquet"):
+            try:
+                info = ruta.stat()
+            except FileNotFoundError:
+                continue
+            if ahora - info.st_mtime > self.max_edad:
+                ruta.unlink(missing_ok=True)
+            else:
+                archivos.append((info.st_mtime, info.st_size, ruta))
+
+        # Los menos usados primero
+        archivos.sort()
+        total = sum(tam for _, tam, _ in archivos)
+        for _, tam, ruta in archivos:
+            if total <= self.max_bytes:
+                break
+            ruta.unlink(missing_ok=True)
+            total -= tam
+
+    def limpiar(self):
+        with self._lock:
+            self._memoria.clear()
+        if self.directorio is not None and self.directorio.exists():
+            for ruta in self.directorio.glob("*.parquet"):
+                ruta.unlink(missing_ok=True)
+
+    def resumen(self):
+        with self._lock:
+            stats = dict(self.estadisticas)
+            stats["en_memoria"] = len(self._memoria)
+        stats["aciertos"] = stats["memoria"] + stats["disco"]
+        return stats
+
+
+cache_lecturas = CacheLecturas()
+
+
+def load_excel_cached(file, tipo, cache=None):
+    if file is None:
+        return None
+
+    cache = cache or cache_lecturas
+
+    file.seek(0)
+    contenido = file.read()
+    clave = cache.clave(contenido, tipo)
+
+    with etapa("cache", archivo=tipo, bytes=len(contenido)) as datos:
+        df = cache.obtener(clave)
+        datos["detalle"] = "fallo" if df is None else "acierto"
+    if df is not None:
+        return df
+
+    df = load_excel(BytesIO(contenido), tipo)
+    cache.guardar(clave, df)
+    return df.copy()
@@ -0,0 +1,233 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+from modules.bloques import conciliar_por_bloques
+from modules.bodegas import conciliar_por_bodega
+from modules.conciliacion import conciliar
+from modules.deteccion import EXTENSIONES, OBLIGATORIOS, tipo_de_archivo
+from modules.exporter import FORMATOS, exportar
+from modules.historial import Historial
+from modules.ingesta import ORDEN_ARCHIVOS
+from modules.loader import load_excel
+from modules.metricas import registrar
+from modules.periodos import AlmacenPeriodos, conciliar_periodo
+
+# =========================
+# Configuración
+# =========================
+COLUMNAS_RESUMEN = ["Carpeta", "Estado", "Lotes", "Inconsistencias", "Segundos", "Error", "Avisos"]
+
+
+# =========================
+# Detección de archivos
+# =========================
+def detectar_archivos(carpeta, obligatorios=OBLIGATORIOS):
+    """Devuelve (dict tipo -> ruta, lista de problemas) para una carpeta."""
+    archivos, problemas = {}, []
+    for ruta in sorted(Path(carpeta).iterdir()):
+        if not ruta.is_file() or ruta.suffix.lower() not in EXTENSIONES:
+            continue
+        if ruta.name.startswith(("~$", ".")):
+            continue
+
+        # Por encabezado; el nombre desempata (ver modules/deteccion.py)
+        try:
+            with open(ruta, "rb") as f:
+                tipo = tipo_de_archivo(ruta.name, f)
+        except ValueError as e:
+            problemas.append(f"{ruta.name}: {e}")
+            continue
+        if tipo in archivos:
+            problemas.append(f"{ruta.name}: {tipo} repetido (ya está {archivos[tipo].name})")
+        else:
+            archivos[tipo] = ruta
+
+    faltantes = [t for t in obligatorios if t not in archivos]
+    if faltantes:
+        problemas.append("Faltan archivos: " + ", ".join(faltantes))
+    return archivos, problemas
+
+
+def buscar_carpetas(raiz):
+    # Toda carpeta con al menos un Excel es un período/sede
+    raiz = Path(raiz)
+    carpetas = []
+    for directorio, subdirectorios, nombres in os.walk(raiz):
+        subdirectorios.sort()
+        if any(Path(n).suffix.lower() in EXTENSIONES for n in nombres):
+            carpetas.append(Path(directorio))
+    return carpetas
+
+
+def periodo_y_sede(relativa):
+    """Período y sede de una carpeta según su ruta bajo la raíz.
+
+    >>> periodo_y_sede(Path("2024-03/norte/urgencias"))
+    ('2024-03', 'norte/urgencias')
+    >>> periodo_y_sede(Path("2024-03")), periodo_y_sede(Path("."))
+    (('2024-03', ''), ('', ''))
+    """
+    partes = Path(relativa).parts or ("",)
+    return partes[0], "/".join(partes[1:])
+
+
+# =========================
+# Conciliación por carpeta
+# =========================
+def conciliar_carpeta(
+    carpeta,
+    destino,
+    formato="xlsx",
+    todas_bodegas=False,
+    lotes_similares=False,
+    memoria_max=None,
+    historial=None,
+    periodo=None,
+    sede="",
+    periodos=None
+):
+    """Concilia una carpeta y escribe el resultado en `destino`.
+
+    Con `memoria_max` (bytes) los archivos se leen por bloques (ver
+    modules/bloques.py). Con `historial` (ruta de la base) el resultado se
+    guarda además como `periodo` y `sede` (ver modules/historial.py). Con
+    `periodos` (directorio) se guarda el estado del período de la sede y,
+    si hay uno anterior, el inventario inicial es opcional (ver
+    modules/periodos.py). Devuelve una fila del resumen (dict). Pensada
+    para correr en otro proceso: no lanza excepciones, las deja en "Error".
+    """
+    inicio = time.perf_counter()
+    fila = {"Estado": "error", "Lotes": 0, "Inconsistencias": 0, "Error": None, "Avisos": None}
+
+    try:
+        obligatorios = OBLIGATORIOS
+        if periodos:
+            almacen = AlmacenPeriodos(periodos).de_sede(sede)
+            if almacen.anterior(periodo):
+                obligatorios = [t for t in OBLIGATORIOS if t != "inicial"]
+        archivos, problemas = detectar_archivos(carpeta, obligatorios)
+        if problemas:
+            raise ValueError("; ".join(problemas))
+
+        with registrar() as registro:
+            if memoria_max:
+                resultado = conciliar_por_bloques(
+                    archivos, memoria_max, lotes_similares=lotes_similares
+                )
+            else:
+                dfs = []
+                for tipo in ORDEN_ARCHIVOS:
+                    ruta = archivos.get(tipo)
+                    if ruta is None:
+                        dfs.append(None)
+                        continue
+                    with open(ruta, "rb") as f:
+                        dfs.append(load_excel(f, tipo))
+
+                if todas_bodegas:
+                    resultado, _, sin_inventario = conciliar_por_bodega(
+                        *dfs, lotes_similares=lotes_similares
+                    )
+                    if sin_inventario:
+                        fila["Avisos"] = "Sin inventario: " + ", ".join(sin_inventario)
+                elif periodos:
+                    resultado = conciliar_periodo(
+                        almacen, periodo, *dfs, lotes_similares=lotes_similares
+                    )
+                else:
+                    resultado = conciliar(*dfs, lotes_similares=lotes_similares)
+
+        destino = Path(destino)
+        destino.mkdir(parents=True, exist_ok=True)
+        extension, _ = FORMATOS[formato]
+        (destino / f"conciliacion.{extension}").write_bytes(exportar(resultado.df, formato))
+        (destino / "metricas.json").write_text(registro.a_json(), encoding="utf-8")
+        if resultado.similares is not None:
+            resultado.similares.to_csv(destino / "lotes_similares.csv", index=False, encoding="utf-8-sig")
+        if historial:
+            Historial(historial).guardar(periodo, resultado, sede)
+
+        fila.update(
+            Estado="ok",
+            Lotes=len(resultado.df),
+            Inconsistencias=resultado.total_inconsistencias
+        )
+        fila.update(zip(resultado.resumen["Tipo_Inconsistencia"], resultado.resumen["Cantidad"]))
+    except Exception as e:
+        fila["Error"] = str(e) or type(e).__name__
+
+    fila["Segundos"] = round(time.perf_counter() - inicio, 3)
+    return fila
+
+
+def _conciliar_en_orden(tareas):
+    # Carpetas que dependen una de otra (períodos de una sede), en orden
+    return [(carpeta, conciliar_carpeta(*args)) for carpeta, args in tareas]
+
+
+def conciliar_arbol(
+    raiz,
+    salida,
+    formato="xlsx",
+    todas_bodegas=False,
+    lotes_similares=False,
+    memoria_max=None,
+    procesos=None,
+    al_terminar=None,
+    historial=None,
+    periodos=None
+):
+    """Concilia cada carpeta de `raiz` en un pool de procesos.
+
+    Los resultados quedan en `salida` con la misma estructura de carpetas,
+    más resumen.csv con una fila por carpeta. `al_terminar(fila)` se llama
+    a medida que termina cada carpeta. Con `historial` cada carpeta se
+    guarda en esa base (ver periodo_y_sede). Con `periodos` los períodos de
+    cada sede se concilian en orden, uno tras otro, para que cada uno tome
+    el estado del anterior; las sedes siguen en paralelo.
+    """
+    raiz, salida = Path(raiz), Path(salida)
+    carpetas = buscar_carpetas(raiz)
+    filas = []
+
+    # Sin estado de períodos, cada carpeta es independiente
+    grupos = {}
+    for carpeta in carpetas:
+        relativa = carpeta.relative_to(raiz)
+        periodo, sede = periodo_y_sede(relativa)
+        args = (
+            carpeta, salida / relativa, formato, todas_bodegas, lotes_similares,
+            memoria_max, historial, periodo, sede, periodos
+        )
+        grupo = sede if periodos else relativa
+        grupos.setdefault(grupo, []).append((periodo, relativa.as_posix(), args))
+
+    if grupos:
+        with ProcessPoolExecutor(max_workers=procesos) as executor:
+            futuros = [
+                executor.submit(_conciliar_en_orden, [(c, args) for _, c, args in sorted(tareas)])
+                for tareas in grupos.values()
+            ]
+            for futuro in as_completed(futuros):
+                for carpeta, resultado in futuro.result():
+                    fila = {"Carpeta": carpeta, **resultado}
+                    filas.append(fila)
+                    if al_terminar is not None:
+                        al_terminar(fila)
+
+    # Una columna por tipo de inconsistencia encontrado en alguna carpeta
+    resumen = pd.DataFrame(filas)
+    resumen = resumen.reindex(
+        columns=COLUMNAS_RESUMEN + sorted(set(resumen.columns) - set(COLUMNAS_RESUMEN))
+    )
+    resumen = resumen.sort_values("Carpeta", kind="stable", ignore_index=True)
+    tipos = resumen.columns[len(COLUMNAS_RESUMEN):]
+    resumen[tipos] = resumen[tipos].fillna(0).astype(int)
+
+    salida.mkdir(parents=True, exist_ok=True)
+    resumen.to_csv(salida / "resumen.csv", index=False, encoding="utf-8-sig")
+    return resumen
@@ -0,0 +1,273 @@
+import math
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Bits reservados para el lote dentro de la clave compuesta
+BITS_LOTE = 32
+MASCARA_LOTE = (1 << BITS_LOTE) - 1
+
+# Tablas de limpieza persistentes (vacío = solo en memoria)
+DIRECTORIO_CANONICOS = os.environ.get("INVENTARIO_CANONICOS_DIR", ".cache/canonicos")
+MAX_ENTRADAS_TABLA = 2_000_000
+# Cambia cuando cambian las reglas de limpieza (invalida las tablas en disco)
+VERSION_REGLAS = 1
+
+
+# =========================
+# Limpieza de texto
+# =========================
+_ESPACIOS = re.compile(r"\s+")                 # incluye NBSP y tabulaciones
+_DECIMAL_CERO = re.compile(r"([+-]?\d+)\.0+")   # 1234.0 leído como float
+_NUMERICO = re.compile(r"\d+", re.ASCII)
+
+
+def limpiar_texto(valor):
+    """Texto comparable de una celda de código o lote.
+
+    Colapsa espacios (incluido NBSP), pasa a mayúsculas y quita el ".0"
+    que deja Excel cuando la celda se leyó como número. Solo se quita si
+    todo el valor es un número con decimales en cero.
+
+    >>> limpiar_texto("  ab\\xa0 12 ")
+    'AB 12'
+    >>> limpiar_texto("1234.0"), limpiar_texto("1234.000"), limpiar_texto(1234.0)
+    ('1234', '1234', '1234')
+    >>> limpiar_texto("A.0B"), limpiar_texto("L.05"), limpiar_texto("12.50")
+    ('A.0B', 'L.05', '12.50')
+    >>> limpiar_texto(None), limpiar_texto(float("nan")), limpiar_texto(pd.NA)
+    ('', '', '')
+    """
+    if valor is None or valor is pd.NA:
+        return ""
+    if isinstance(valor, float):
+        if math.isnan(valor):
+            return ""
+        if valor.is_integer():
+            return str(int(valor))
+    texto = _ESPACIOS.sub(" ", str(valor)).strip().upper()
+    coincide = _DECIMAL_CERO.fullmatch(texto)
+    return coincide.group(1) if coincide else texto
+
+
+def clave_codigo(texto):
+    """Clave de un código ya limpio: sin ceros a la izquierda si es numérico.
+
+    >>> clave_codigo("000123"), clave_codigo("0000"), clave_codigo("00A1")
+    ('123', '0', '00A1')
+    """
+    if _NUMERICO.fullmatch(texto):
+        return texto.lstrip("0") or "0"
+    return texto
+
+
+class TablaCanonica:
+    """Memo valor original -> (clave, texto a mostrar).
+
+    Las reglas se aplican una sola vez por valor distinto; la tabla se
+    comparte entre archivos y corridas del proceso y, si hay directorio,
+    se guarda en disco para las siguientes. Pasadas `max_entradas` se
+    descartan los valores usados hace más tiempo (LRU).
+    """
+
+    def __init__(self, nombre, clave=None, directorio=DIRECTORIO_CANONICOS, max_entradas=MAX_ENTRADAS_TABLA):
+        self.nombre = nombre
+        self._clave = clave
+        self.directorio = Path(directorio) if directorio else None
+        self.max_entradas = max_entradas
+        self._tabla = None
+        self._nuevos = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tabla or ())
+
+    def _ruta(self):
+        return self.directorio / f"{self.nombre}-v{VERSION_REGLAS}.parquet"
+
+    def _cargar(self):
+        self._tabla = OrderedDict()
+        if self.directorio is None or not self._ruta().exists():
+            return
+        try:
+            df = pd.read_parquet(self._ruta())
+        except Exception:
+            return
+        # El archivo está en orden de uso: se quedan los más recientes
+        df = df.iloc[-self.max_entradas:] if self.max_entradas else df.iloc[:0]
+        self._tabla = OrderedDict(zip(df["original"], zip(df["clave"], df["texto"])))
+
+    def traducir(self, valores):
+        """Devuelve (claves, textos) para cada valor."""
+        claves, textos = [], []
+        with self._lock:
+            if self._tabla is None:
+                self._cargar()
+            tabla = self._tabla
+            for valor in valores:
+                par = tabla.get(valor)
+                if par is not None:
+                    tabla.move_to_end(valor)
+                else:
+                    texto = limpiar_texto(valor)
+                    par = (self._clave(texto) if self._clave else texto, texto)
+                    # NaN no es igual a sí mismo: no sirve como llave
+                    if isinstance(valor, str):
+                        tabla[valor] = par
+                        self._nuevos += 1
+                claves.append(par[0])
+                textos.append(par[1])
+            while len(tabla) > self.max_entradas:
+                tabla.popitem(last=False)
+        return claves, textos
+
+    def guardar(self):
+        # Solo si hubo valores nuevos; escritura atómica como la caché
+        with self._lock:
+            if self.directorio is None or not self._nuevos:
+                return
+            originales = list(self._tabla)
+            pares = list(self._tabla.values())
+            self._nuevos = 0
+
+        df = pd.DataFrame({
+            "original": originales,
+            "clave": [c for c, _ in pares],
+            "texto": [t for _, t in pares],
+        })
+        # Nombre único por escritura: dos hilos (o procesos) pueden guardar
+        # a la vez y cada uno reemplaza el archivo con una tabla completa
+        temporal = self._ruta().with_suffix(f".{uuid.uuid4().hex}.tmp")
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(temporal, index=False)
+            os.replace(temporal, self._ruta())
+        except OSError:
+            temporal.unlink(missing_ok=True)
+
+
+tabla_codigos = TablaCanonica("codigos", clave=clave_codigo)
+tabla_lotes = TablaCanonica("lotes")
+
+
+def guardar_tablas():
+    tabla_codigos.guardar()
+    tabla_lotes.guardar()
+
+
+def canonizar_codigo(valores):
+    """Clave de cada código (ver limpiar_texto y clave_codigo).
+
+    >>> canonizar_codigo([" 00123 ", "123.0", "abc-01"]).tolist()
+    ['123', '123', 'ABC-01']
+    """
+    return pd.Series(tabla_codigos.traducir(valores)[0], dtype=object)
+
+
+def canonizar_lote(valores):
+    """Clave de cada lote; los ceros a la izquierda se conservan.
+
+    >>> canonizar_lote(["2301.0", " l2301 ", "0045", "A.0B"]).tolist()
+    ['2301', 'L2301', '0045', 'A.0B']
+    """
+    return pd.Series(tabla_lotes.traducir(valores)[0], dtype=object)
+
+
+# =========================
+# Diccionarios
+# =========================
+class Diccionario:
+    """Asigna un entero estable a cada clave canónica (solo crece).
+
+    `valores` guarda el texto a mostrar de cada clave: el primero que se vio.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self.valores = []
+        self._rangos = None
+
+    def __len__(self):
+        return len(self.valores)
+
+    def codificar(self, claves, textos=None):
+        textos = claves if textos is None else textos
+        ids = np.empty(len(claves), dtype=np.int64)
+        for i, clave in enumerate(claves):
+            codigo = self._ids.get(clave)
+            if codigo is None:
+                codigo = len(self.valores)
+                self._ids[clave] = codigo
+                self.valores.append(textos[i])
+            ids[i] = codigo
+        return ids
+
+    def rangos(self):
+        # Posición de cada valor en orden alfabético; como el diccionario
+        # solo crece, sirve mientras no haya valores nuevos
+        if self._rangos is not None and len(self._rangos) == len(self.valores):
+            return self._rangos
+        orden = np.argsort(np.asarray(self.valores, dtype=object), kind="stable")
+        rangos = np.empty(len(orden), dtype=np.int64)
+        rangos[orden] = np.arange(len(orden))
+        self._rangos = rangos
+        return rangos
+
+    def categorico(self, ids):
+        # Texto de cada id sin crear un objeto por fila: las categorías
+        # quedan en orden alfabético
+        rangos = self.rangos()
+        categorias = np.empty(len(rangos), dtype=object)
+        categorias[rangos] = self.valores
+        return pd.Categorical.from_codes(rangos[ids], categories=categorias)
+
+
+class DiccionarioClaves:
+    """Clave int64 compartida para cada par (CODIGO PRODUCTO, LOTE).
+
+    La limpieza se hace una vez por valor distinto (ver TablaCanonica) y el
+    texto solo se recupera al presentar resultados.
+    """
+
+    def __init__(self):
+        self.codigos = Diccionario()
+        self.lotes = Diccionario()
+
+    @staticmethod
+    def _codificar_columna(serie, tabla, diccionario):
+        posiciones, unicos = pd.factorize(serie, use_na_sentinel=False)
+        claves, textos = tabla.traducir(unicos.tolist())
+        ids_unicos = diccionario.codificar(claves, textos)
+        return ids_unicos[posiciones]
+
+    def codificar(self, codigos, lotes):
+        ids_codigo = self._codificar_columna(codigos, tabla_codigos, self.codigos)
+        ids_lote = self._codificar_columna(lotes, tabla_lotes, self.lotes)
+        return (ids_codigo << BITS_LOTE) | ids_lote
+
+    def codificar_codigos(self, codigos):
+        return self._codificar_columna(codigos, tabla_codigos, self.codigos)
+
+    @staticmethod
+    def id_codigo(claves):
+        return np.asarray(claves, dtype=np.int64) >> BITS_LOTE
+
+    def categoricos(self, claves):
+        claves = np.asarray(claves, dtype=np.int64)
+        return (
+            self.codigos.categorico(claves >> BITS_LOTE),
+            self.lotes.categorico(claves & MASCARA_LOTE)
+        )
+
+    def orden(self, claves):
+        # Índices que ordenan las claves por (código, lote) como texto
+        claves = np.asarray(claves, dtype=np.int64)
+        rango_codigo = self.codigos.rangos()[claves >> BITS_LOTE]
+        rango_lote = self.lotes.rangos()[claves & MASCARA_LOTE]
+        return np.lexsort((rango_lote, rango_codigo))
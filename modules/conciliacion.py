@@ -1,52 +1,153 @@
+import copy
+
+import numpy as np
 import pandas as pd
-from modules.loader import preparar_datos
+from modules.claves import DiccionarioClaves, guardar_tablas
+from modules.loader import filas_validas
+from modules.metricas import etapa
+from modules.procedencia import construir_procedencia
+from modules.similares import marcar_similares
 
 # =========================
 # Constantes
 # =========================
 CLAVES = ["CODIGO PRODUCTO", "LOTE"]
+CLAVE = "CLAVE"
 CANTIDAD = "CANTIDAD"
 
+COLUMNAS_RESULTADO = [
+    "Codigo_Articulo",
+    "Nombre_Producto",
+    "Lote",
+    "Tipo_Inconsistencia",
+    "Inicial",
+    "Recepciones",
+    "Salidas",
+    "Final_Calculado",
+    "Final_Sistema",
+    "Diferencia"
+]
+
 
 # =========================
 # Normalización de datos
 # =========================
-def normalizar(df):
-    df = df.copy()
-
-    # Código de producto: texto limpio
-    df["CODIGO PRODUCTO"] = (
-        df["CODIGO PRODUCTO"]
-        .astype(str)
-        .str.strip()
-    )
+def normalizar(df, diccionario, fuente=None):
+    # Única pasada de limpieza: las claves quedan como enteros
+    with etapa("normalizar", archivo=fuente, filas=len(df)):
+        return _normalizar(df, diccionario)
 
-    df["LOTE"] = (
-        df["LOTE"]
-        .astype(str)
-        .str.replace(".0", "", regex=False)  
-        .str.strip()
-        .str.upper()                         
-    )
+
+def _normalizar(df, diccionario):
+    normalizado = pd.DataFrame({
+        CLAVE: diccionario.codificar(df["CODIGO PRODUCTO"], df["LOTE"]),
+        CANTIDAD: df[CANTIDAD].to_numpy()
+    })
 
     # Cantidad: numérica segura
-    df[CANTIDAD] = (
-        pd.to_numeric(df[CANTIDAD], errors="coerce")
-        .fillna(0)
-    )
+    if not pd.api.types.is_numeric_dtype(normalizado[CANTIDAD]):
+        normalizado[CANTIDAD] = (
+            pd.to_numeric(normalizado[CANTIDAD], errors="coerce")
+            .fillna(0)
+        )
 
-    return df
+    return normalizado
 
 # =========================
-# Agrupación
+# Agregación
 # =========================
-def agrupar(df):
-    return (
-        df
-        .groupby(CLAVES, as_index=False)[CANTIDAD]
-        .sum()
-    )
-    
+# Columnas de la matriz clave × fuente, en este orden
+FUENTES = ["Inicial", "Recepciones", "Salidas", "Final_Sistema"]
+
+# Salidas = traslados + salidas de bodega
+FUENTE_POR_TIPO = {
+    "inicial": "Inicial",
+    "recepciones": "Recepciones",
+    "traslados": "Salidas",
+    "salidas": "Salidas",
+    "final": "Final_Sistema",
+}
+
+
+def agregar_movimientos(movimientos, fuentes=FUENTES, con_posiciones=False):
+    """Suma las cantidades de todas las fuentes en una matriz densa.
+
+    `movimientos` es una lista de (fuente, frame normalizado); una fuente
+    puede repetirse (traslados y salidas suman en "Salidas"). Devuelve las
+    claves distintas y la matriz clave × fuentes; con `con_posiciones`,
+    además la posición de clave de cada fila de cada movimiento.
+    """
+    # Unión de claves de todas las fuentes: los lotes nuevos de
+    # recepciones quedan con Inicial = 0 sin tratamiento aparte
+    unicas = pd.unique(np.concatenate(
+        [pd.unique(np.asarray(df[CLAVE], dtype=np.int64)) for _, df in movimientos]
+    ))
+    indice = pd.Index(unicas)
+
+    # Cada fila del formato largo suma en su celda (clave, fuente)
+    matriz = np.zeros((len(unicas), len(fuentes)))
+    todas = []
+    for fuente, df in movimientos:
+        posiciones = indice.get_indexer(np.asarray(df[CLAVE], dtype=np.int64))
+        matriz[:, fuentes.index(fuente)] += np.bincount(
+            posiciones,
+            weights=np.asarray(df[CANTIDAD], dtype=np.float64),
+            minlength=len(unicas)
+        )
+        todas.append(posiciones)
+
+    claves = np.asarray(unicas, dtype=np.int64)
+    if con_posiciones:
+        return claves, matriz, todas
+    return claves, matriz
+
+
+def nombres_por_codigo(inicial, diccionario):
+    # Primer nombre registrado para cada código canónico. Antes se unía
+    # con todos los pares (código, nombre) distintos, y un código con dos
+    # nombres duplicaba cada uno de sus lotes (y sus cantidades en los
+    # totales); ahora cada lote es una sola fila
+    ids = diccionario.codificar_codigos(inicial["CODIGO PRODUCTO"])
+    nombres = pd.Series(inicial["NOMBRE PRODUCTO"].to_numpy(), index=ids)
+    nombres = nombres[~nombres.index.duplicated()]
+    # Categórico: al reindexar por lote no se copia el texto por fila
+    return nombres.astype("category")
+
+
+def construir_resultado(claves, matriz, diccionario, nombres, orden=None):
+    with etapa("unir", filas=len(claves)):
+        # Orden alfabético por código y lote
+        if orden is None:
+            orden = diccionario.orden(claves)
+        claves = claves[orden]
+        matriz = matriz[orden]
+
+        # Textos como categorías: sin un objeto Python por fila
+        codigos, lotes = diccionario.categoricos(claves)
+        df = pd.DataFrame(matriz, columns=FUENTES)
+        df.insert(0, "Codigo_Articulo", codigos)
+        df.insert(1, "Nombre_Producto", nombres.reindex(diccionario.id_codigo(claves)).array)
+        df.insert(2, "Lote", lotes)
+
+    return calcular(df)[COLUMNAS_RESULTADO]
+
+
+def calcular(df):
+    # ===============================
+    # Cálculos (a partir de FUENTES)
+    # ===============================
+    df["Final_Calculado"] = df["Inicial"] + df["Recepciones"] - df["Salidas"]
+    df["Diferencia"] = df["Final_Sistema"] - df["Final_Calculado"]
+
+    # ===============================
+    # Clasificación de inconsistencias
+    # ===============================
+    with etapa("clasificar", filas=len(df)):
+        df["Tipo_Inconsistencia"] = clasificar(df)
+
+    return df
+
+
 def clasificar_inconsistencia(row):
 
     inicial = row["Inicial"]
@@ -85,143 +186,206 @@ def clasificar_inconsistencia(row):
     return "Inconsistencia de Inventario"
 
 
-def conciliar(inicial, traslados, recepciones, salidas, final_sistema):
-
-    # ===============================
-    # Limpiezas específicas
-    # ===============================
-    traslados, salidas, recepciones = preparar_datos(traslados, salidas, recepciones)
-
-    # ===============================
-    # Guardar nombres de productos
-    # ===============================
-    nombres = (
-        inicial[["CODIGO PRODUCTO", "NOMBRE PRODUCTO"]]
-        .drop_duplicates()
-    )
-
-    # ===============================
-    # Normalizar (sin agrupar)
-    # ===============================
-    inicial = normalizar(inicial)
-    traslados = normalizar(traslados)
-    recepciones = normalizar(recepciones)
-    final_sistema = normalizar(final_sistema)
-
-    if salidas is not None and not salidas.empty:
-        salidas = normalizar(salidas)
-    else:
-        salidas = pd.DataFrame(columns=["CODIGO PRODUCTO", "LOTE", "CANTIDAD"])
-
-
-    # ===============================
-    # Detectar lotes nuevos desde recepciones
-    # ===============================
-    nuevos = (
-        recepciones[CLAVES]
-        .drop_duplicates()
-        .merge(
-            inicial[CLAVES],
-            on=CLAVES,
-            how="left",
-            indicator=True
-        )
-    )
-
-    nuevos = nuevos[nuevos["_merge"] == "left_only"].drop(columns="_merge")
-
-    if not nuevos.empty:
-        nuevos[CANTIDAD] = 0
-        inicial = pd.concat([inicial, nuevos], ignore_index=True)
-
-    # ===============================
-    # Unificar salidas (traslados + salidas bodega)
-    # ===============================
-    
-    traslados["TIPO_SALIDA"] = "TRASLADO"
-
-    frames_salidas = [traslados]
-
-    if salidas is not None and not salidas.empty:
-        salidas["TIPO_SALIDA"] = "SALIDA_BODEGA"
-        frames_salidas.append(salidas)
-
-    salidas_total = pd.concat(frames_salidas, ignore_index=True)
-
-
-
-    salidas_total = pd.concat(
-        [traslados, salidas],
-        ignore_index=True
+# =========================
+# Reglas de clasificación
+# =========================
+# Cada regla es (etiqueta, condición). La condición recibe el DataFrame
+# completo y devuelve una máscara booleana. Gana la primera regla que
+# aplica; si ninguna aplica se usa CATEGORIA_POR_DEFECTO.
+REGLAS_INCONSISTENCIA = [
+    (
+        "Sin Inconsistencia",
+        lambda df: df["Diferencia"] == 0,
+    ),
+    (
+        "Inconsistencia de Recepción",
+        lambda df: (df["Final_Sistema"] > df["Inicial"]) & (df["Recepciones"] == 0),
+    ),
+    (
+        "Inconsistencia de Traslado",
+        lambda df: (df["Inicial"] > df["Final_Sistema"]) & (df["Salidas"] == 0),
+    ),
+    (
+        "Inconsistencia en Salidas",
+        lambda df: (df["Salidas"] > 0) & (df["Final_Sistema"] != df["Final_Calculado"]),
+    ),
+]
+
+CATEGORIA_POR_DEFECTO = "Inconsistencia de Inventario"
+
+
+def clasificar(df, reglas=REGLAS_INCONSISTENCIA, por_defecto=CATEGORIA_POR_DEFECTO):
+    # Equivalente vectorizado de clasificar_inconsistencia
+    etiquetas = [etiqueta for etiqueta, _ in reglas]
+    mascaras = [np.asarray(condicion(df), dtype=bool) for _, condicion in reglas]
+
+    # np.select respeta el orden de las reglas (primera coincidencia);
+    # se eligen posiciones y el resultado es categórico (orden alfabético)
+    etiquetas.append(por_defecto)
+    posiciones = np.select(mascaras, np.arange(len(mascaras)), default=len(mascaras))
+    categorias = sorted(set(etiquetas))
+    codigos = np.array([categorias.index(e) for e in etiquetas])
+    return pd.Series(
+        pd.Categorical.from_codes(codigos[posiciones], categories=categorias),
+        index=df.index
     )
 
-    # ===============================
-    # Agrupar
-    # ===============================
-    inicial = agrupar(inicial).rename(columns={CANTIDAD: "Inicial"})
-    recepciones = agrupar(recepciones).rename(columns={CANTIDAD: "Recepciones"})
-    salidas_total = agrupar(salidas_total).rename(columns={CANTIDAD: "Salidas"})
-    final_sistema = agrupar(final_sistema).rename(columns={CANTIDAD: "Final_Sistema"})
-    
-    print("Inicial cols after group:", inicial.columns.tolist())
 
-    # ===============================
-    # Merge general
-    # ===============================
-    df = inicial.merge(recepciones, on=CLAVES, how="outer")
-    df = df.merge(salidas_total, on=CLAVES, how="outer")
-    df = df.merge(final_sistema, on=CLAVES, how="outer")
+# =========================
+# Resultado
+# =========================
+class ResultadoConciliacion:
+    """Detalle por lote más lo que la vista consulta en cada rerun.
+
+    Se arma una vez por conciliación: las inconsistencias (Diferencia != 0),
+    el resumen por tipo y, por cada tipo, las posiciones de sus filas
+    dentro de `inconsistencias`. `similares` son las parejas de lotes
+    posiblemente mal digitados (None si no se buscaron).
+    """
+
+    def __init__(self, df, procedencia=None, similares=None):
+        self.df = df
+        self.procedencia = procedencia
+        self.similares = similares
+        self._bodegas = {}
+
+        diferentes = np.flatnonzero(df["Diferencia"].to_numpy() != 0)
+        self.inconsistencias = df.iloc[diferentes]
+
+        # Índice por tipo: las posiciones de cada tipo quedan contiguas
+        # al ordenar por código de categoría (estable: conserva el orden)
+        tipos = self.inconsistencias["Tipo_Inconsistencia"].astype("category")
+        codigos = tipos.cat.codes.to_numpy()
+        orden = np.argsort(codigos, kind="stable")
+        cortes = np.cumsum(np.bincount(codigos, minlength=len(tipos.cat.categories)))
+        self.posiciones_por_tipo = {
+            tipo: posiciones
+            for tipo, posiciones in zip(tipos.cat.categories, np.split(orden, cortes[:-1]))
+            if len(posiciones)
+        }
+
+        total = len(self.inconsistencias)
+        self.resumen = pd.DataFrame({
+            "Tipo_Inconsistencia": list(self.posiciones_por_tipo),
+            "Cantidad": [len(p) for p in self.posiciones_por_tipo.values()],
+        })
+        self.resumen["Porcentaje"] = (self.resumen["Cantidad"] / max(total, 1) * 100).round(1)
+
+    @property
+    def total_inconsistencias(self):
+        return len(self.inconsistencias)
+
+    def tipos(self):
+        return list(self.posiciones_por_tipo)
+
+    def del_tipo(self, tipo):
+        # "Todas" (o None) devuelve todas las inconsistencias
+        if tipo is None or tipo == "Todas":
+            return self.inconsistencias
+        posiciones = self.posiciones_por_tipo.get(tipo, np.array([], dtype=np.intp))
+        return self.inconsistencias.iloc[posiciones]
+
+    def de_bodega(self, bodega, columna="Bodega"):
+        # Sub-resultado de una bodega (conciliar_por_bodega), armado una vez
+        if bodega is None or bodega == "Todas":
+            return self
+        if bodega not in self._bodegas:
+            filas = np.flatnonzero((self.df[columna] == bodega).to_numpy())
+            similares = self.similares
+            if similares is not None and columna in similares.columns:
+                similares = similares[(similares[columna] == bodega).to_numpy()]
+            self._bodegas[bodega] = ResultadoConciliacion(
+                self.df.iloc[filas], self.procedencia, similares
+            )
+        return self._bodegas[bodega]
+
+    def con_procedencia(self, procedencia):
+        # El mismo resultado (sin copiar tablas) con otra procedencia
+        copia = copy.copy(self)
+        copia.procedencia = procedencia
+        copia._bodegas = {}
+        return copia
+
+    def movimientos(self, etiqueta):
+        """Filas de los archivos de entrada que aportan al lote `etiqueta`.
+
+        `etiqueta` es el índice de la fila en `df` (se conserva en
+        `inconsistencias`, en los sub-resultados por bodega y en las
+        páginas del visor). None si no hay procedencia.
+        """
+        if self.procedencia is None:
+            return None
+        return self.procedencia.filas_de(etiqueta)
+
+
+def preparar_movimientos(entradas, diccionario, fuente_por_tipo=FUENTE_POR_TIPO):
+    """Filtros de negocio y normalización de cada archivo de `entradas`.
+
+    Devuelve los movimientos para agregar_movimientos y, por archivo,
+    (nombre, DataFrame leído, filas que quedan): la procedencia de cada lote.
+    """
+    movimientos, origenes = [], []
+    for tipo, df in entradas.items():
+        # Salidas de bodega es opcional
+        if tipo == "salidas" and (df is None or df.empty):
+            continue
+
+        filas = filas_validas(df, tipo)
+        validas = df if len(filas) == len(df) else df.iloc[filas]
+        movimientos.append((fuente_por_tipo[tipo], normalizar(validas, diccionario, tipo)))
+        origenes.append((tipo, df, filas))
+    return movimientos, origenes
+
+
+def procedencia_de(claves, orden, origenes, posiciones):
+    # Lote de cada fila aportada, en el orden del resultado
+    with etapa("procedencia", filas=sum(len(p) for p in posiciones)):
+        fila_resultado = np.empty(len(claves), dtype=np.int64)
+        fila_resultado[orden] = np.arange(len(claves))
+        return construir_procedencia(len(claves), [
+            (nombre, original, fila_resultado[lotes], filas)
+            for (nombre, original, filas), lotes in zip(origenes, posiciones)
+        ])
+
+
+def conciliar(inicial, traslados, recepciones, salidas, final_sistema, lotes_similares=False):
+    """Concilia los cinco archivos y devuelve un ResultadoConciliacion.
+
+    Con `lotes_similares`, las parejas de inconsistencias que parecen un
+    mismo lote mal digitado se marcan como tales (ver modules/similares.py).
+    """
+
+    entradas = {
+        "inicial": inicial,
+        "recepciones": recepciones,
+        "traslados": traslados,
+        "final": final_sistema,
+        "salidas": salidas,
+    }
 
     # ===============================
-    # Agregar nombre del producto
+    # Normalizar (sin agrupar)
     # ===============================
-    df = df.merge(nombres, on="CODIGO PRODUCTO", how="left")
+    diccionario = DiccionarioClaves()
+    nombres = nombres_por_codigo(inicial, diccionario)
+    movimientos, origenes = preparar_movimientos(entradas, diccionario)
 
     # ===============================
-    # Reemplazar NaN por 0
+    # Agregar (una sola pasada)
     # ===============================
-    df[["Inicial", "Recepciones", "Salidas", "Final_Sistema"]] = (
-        df[["Inicial", "Recepciones", "Salidas", "Final_Sistema"]]
-        .fillna(0)
-    )
+    with etapa("agrupar", filas=sum(len(df) for _, df in movimientos)):
+        claves, matriz, posiciones = agregar_movimientos(movimientos, con_posiciones=True)
 
-    # ===============================
-    # Cálculos
-    # ===============================
-    df["Final_Calculado"] = df["Inicial"] + df["Recepciones"] - df["Salidas"]
-    df["Diferencia"] = df["Final_Sistema"] - df["Final_Calculado"]
+    orden = diccionario.orden(claves)
+    df = construir_resultado(claves, matriz, diccionario, nombres, orden)
+    procedencia = procedencia_de(claves, orden, origenes, posiciones)
 
-    # ===============================
-    # Clasificación de inconsistencias
-    # ===============================
-    df["Tipo_Inconsistencia"] = df.apply(
-        clasificar_inconsistencia,
-        axis=1
-    )
+    # Los valores nuevos quedan para las próximas corridas
+    guardar_tablas()
 
-    # ===============================
-    # Renombrar columnas
-    # ===============================
-    df = df.rename(columns={
-        "CODIGO PRODUCTO": "Codigo_Articulo",
-        "NOMBRE PRODUCTO": "Nombre_Producto",
-        "LOTE": "Lote"
-    })
+    similares = None
+    if lotes_similares:
+        df, similares = marcar_similares(df)
 
-    # ===============================
-    # Orden final
-    # ===============================
-    columnas_orden = [
-        "Codigo_Articulo",
-        "Nombre_Producto",
-        "Lote",
-        "Tipo_Inconsistencia",
-        "Inicial",
-        "Recepciones",
-        "Salidas",
-        "Final_Calculado",
-        "Final_Sistema",
-        "Diferencia"
-    ]
-
-    return df[columnas_orden]
+    with etapa("resumen", filas=len(df)):
+        return ResultadoConciliacion(df, procedencia, similares)
@@ -0,0 +1,223 @@
+import contextvars
+import os
+import re
+import unicodedata
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+from modules.ingesta import MAX_WORKERS
+from modules.loader import leer_encabezado
+from modules.metricas import etapa
+
+# =========================
+# Configuración
+# =========================
+EXTENSIONES = {".xlsx", ".xls"}
+OBLIGATORIOS = ("inicial", "traslados", "recepciones", "final")
+# Tope de lo que se descomprime de un ZIP subido
+MAX_BYTES_ZIP = int(os.environ.get("INVENTARIO_MAX_MB_ZIP", "2048")) * 1024 * 1024
+
+# Palabras del nombre de archivo que identifican cada tipo. Se prueban en
+# este orden: "inventario final" no debe confundirse con "inicial", y
+# "salidas por traslado" es un traslado.
+PATRONES_TIPO = [
+    ("inicial", re.compile(r"INICIAL")),
+    ("final", re.compile(r"FINAL")),
+    ("traslados", re.compile(r"TRASLAD")),
+    ("recepciones", re.compile(r"RECEPC|ENTRADA")),
+    ("salidas", re.compile(r"SALIDA")),
+]
+
+# Columnas del encabezado que delatan los tipos posibles, en orden de
+# prueba. Inventarios (inicial/final) y movimientos de salida
+# (traslados/salidas) tienen las mismas columnas: el nombre del archivo o
+# el título del reporte deciden.
+FIRMAS = [
+    ({"recepciones"}, {"CANTIDAD RECIBIDA", "PROVEEDOR"}),
+    ({"traslados", "salidas"}, {"BODEGA ORIGEN"}),
+    ({"traslados", "salidas", "recepciones"}, {"CODIGO ARTICULO", "CÓDIGO ARTICULO", "NOMBRE ARTICULO"}),
+    ({"inicial", "final"}, {"CODIGO PRODUCTO", "CÓDIGO PRODUCTO"}),
+]
+
+
+# =========================
+# Por nombre
+# =========================
+def _sin_tildes(texto):
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).upper()
+
+
+def tipo_por_texto(texto):
+    """Primer tipo cuyo patrón aparece en `texto` (None si ninguno).
+
+    >>> tipo_por_texto("Reporte de salidas por traslado")
+    'traslados'
+    >>> tipo_por_texto("Recepción de pedidos"), tipo_por_texto("Resumen")
+    ('recepciones', None)
+    """
+    texto = _sin_tildes(texto)
+    for tipo, patron in PATRONES_TIPO:
+        if patron.search(texto):
+            return tipo
+    return None
+
+
+def tipo_por_nombre(nombre):
+    # None si el nombre no dice qué archivo es
+    return tipo_por_texto(Path(nombre).stem)
+
+
+# =========================
+# Por encabezado
+# =========================
+def tipos_por_encabezado(columnas):
+    """Tipos posibles según los nombres de columna (vacío si no se reconoce).
+
+    >>> sorted(tipos_por_encabezado(["CODIGO ARTICULO", "LOTE", "CANTIDAD RECIBIDA"]))
+    ['recepciones']
+    >>> sorted(tipos_por_encabezado(["CODIGO PRODUCTO", "DESCRIPCION", "LOTE", "CANTIDAD"]))
+    ['final', 'inicial']
+    """
+    columnas = set(columnas)
+    for tipos, firma in FIRMAS:
+        if columnas & firma:
+            return set(tipos)
+    return set()
+
+
+def tipo_de_archivo(nombre, file):
+    """Tipo de un archivo según su encabezado, su nombre y su título.
+
+    Solo se leen las primeras filas. El encabezado manda; el nombre (y si
+    no alcanza, las filas de título sobre el encabezado) elige entre los
+    tipos con las mismas columnas. Lanza ValueError si no se puede decidir.
+    """
+    leido = leer_encabezado(file)
+    por_nombre = tipo_por_nombre(nombre)
+    if leido is None:
+        if por_nombre is None:
+            raise ValueError("no se encontró el encabezado ni se reconoce el nombre")
+        return por_nombre
+
+    previas, columnas = leido
+    posibles = tipos_por_encabezado(columnas)
+    if not posibles:
+        raise ValueError("no se reconocen las columnas: " + ", ".join(columnas))
+    if len(posibles) == 1:
+        return posibles.pop()
+    if por_nombre in posibles:
+        return por_nombre
+
+    titulo = " ".join(str(c) for fila in previas for c in fila)
+    por_titulo = tipo_por_texto(titulo)
+    if por_titulo in posibles:
+        return por_titulo
+    raise ValueError(
+        "puede ser " + " o ".join(sorted(posibles)) + "; indíquelo en el nombre del archivo"
+    )
+
+
+# =========================
+# Carga masiva
+# =========================
+def _ignorado(nombre):
+    # Temporales de Office, ocultos y metadatos de macOS
+    partes = PurePosixPath(nombre).parts
+    return (
+        not partes
+        or "__MACOSX" in partes
+        or partes[-1].startswith(("~$", "."))
+        or PurePosixPath(nombre).suffix.lower() not in EXTENSIONES
+    )
+
+
+def expandir(nombre, contenido):
+    """Lista de (origen, bytes) de un archivo subido; un ZIP se abre.
+
+    El origen es (nombre subido, miembro del ZIP o None) y sirve para
+    volver a leer el archivo con `extraer`. Del ZIP solo se toman los
+    Excel (en cualquier carpeta). Lanza ValueError si el ZIP está dañado o
+    descomprimido supera MAX_BYTES_ZIP.
+    """
+    if not nombre.lower().endswith(".zip"):
+        return [] if _ignorado(nombre) else [((nombre, None), contenido)]
+
+    try:
+        with zipfile.ZipFile(BytesIO(contenido)) as zip_:
+            miembros = [m for m in zip_.infolist() if not m.is_dir() and not _ignorado(m.filename)]
+            if sum(m.file_size for m in miembros) > MAX_BYTES_ZIP:
+                raise ValueError(
+                    f"{nombre}: descomprimido supera {MAX_BYTES_ZIP // (1024 * 1024)} MB"
+                )
+            return [((nombre, m.filename), zip_.read(m)) for m in miembros]
+    except zipfile.BadZipFile:
+        raise ValueError(f"{nombre}: el ZIP está dañado")
+
+
+def extraer(contenido, miembro=None):
+    # Bytes de un origen de `expandir`: el archivo subido o un miembro del ZIP
+    if miembro is None:
+        return contenido
+    with zipfile.ZipFile(BytesIO(contenido)) as zip_:
+        return zip_.read(miembro)
+
+
+def nombre_de(origen):
+    nombre, miembro = origen
+    return miembro or nombre
+
+
+def _clasificar(nombre, contenido):
+    with etapa("detección", archivo=nombre, bytes=len(contenido)) as datos:
+        tipo = tipo_de_archivo(nombre, BytesIO(contenido))
+        datos["detalle"] = tipo
+    return tipo
+
+
+def clasificar_archivos(subidos, max_workers=MAX_WORKERS):
+    """Reconoce el tipo de varios archivos (o ZIPs) a la vez.
+
+    `subidos` es una lista de (nombre, bytes). Devuelve (dict tipo ->
+    lista de orígenes, lista de problemas), como carpetas.detectar_archivos;
+    los bytes no se guardan, se vuelven a leer con `extraer`. Un tipo con
+    más de un origen es un repetido: no se puede conciliar hasta quitarlo.
+    """
+    archivos, problemas = [], []
+    for nombre, contenido in subidos:
+        try:
+            archivos.extend(expandir(nombre, contenido))
+        except ValueError as e:
+            problemas.append(str(e))
+
+    # Cada hilo hereda el registro de métricas activo
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(archivos) or 1))) as executor:
+        futuros = [
+            executor.submit(contextvars.copy_context().run, _clasificar, nombre_de(origen), contenido)
+            for origen, contenido in archivos
+        ]
+
+    clasificados = {}
+    for (origen, _), futuro in zip(archivos, futuros):
+        try:
+            tipo = futuro.result()
+        except ValueError as e:
+            problemas.append(f"{nombre_de(origen)}: {e}")
+            continue
+        if tipo in clasificados:
+            problemas.append(
+                f"{nombre_de(origen)}: {tipo} repetido (ya está {nombre_de(clasificados[tipo][0])})"
+            )
+        clasificados.setdefault(tipo, []).append(origen)
+
+    faltantes = [t for t in OBLIGATORIOS if t not in clasificados]
+    if faltantes:
+        problemas.append("Faltan archivos: " + ", ".join(faltantes))
+    return clasificados, problemas
+
+
+def repetidos(clasificados):
+    # Tipos con más de un archivo: bloquean la conciliación
+    return [tipo for tipo, origenes in clasificados.items() if len(origenes) > 1]
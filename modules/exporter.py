@@ -1,8 +1,154 @@
-import pandas as pd
+import re
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
+import pandas as pd
+from openpyxl import Workbook
+
+from modules.metricas import etapa
+
+# =========================
+# Configuración
+# =========================
+# A partir de este tamaño el XLSX se escribe en modo streaming (write_only)
+FILAS_XLSX_STREAMING = 50_000
+FILAS_POR_BLOQUE = 10_000
+MAX_EXPORTACIONES_CACHE = 8
+
+FORMATOS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "xlsx_por_tipo": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+    "parquet": ("parquet", "application/octet-stream"),
+}
+
+
+# =========================
+# Escritores
+# =========================
+def _nombre_hoja(nombre, usados):
+    # Excel: máx. 31 caracteres, sin []:*?/\ y sin repetir
+    base = re.sub(r"[\[\]:*?/\\]", "", str(nombre))[:31] or "Hoja"
+    nombre, i = base, 1
+    while nombre.lower() in usados:
+        sufijo = f" ({i})"
+        nombre = base[:31 - len(sufijo)] + sufijo
+        i += 1
+    usados.add(nombre.lower())
+    return nombre
+
+
+def _escribir_hoja_streaming(wb, df, titulo):
+    ws = wb.create_sheet(titulo)
+    ws.append([str(c) for c in df.columns])
+
+    for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_POR_BLOQUE].astype(object)
+        bloque = bloque.where(bloque.notna(), None)
+        for fila in bloque.itertuples(index=False, name=None):
+            ws.append(fila)
+
+
+def _xlsx(hojas):
+    # hojas: lista de (titulo, DataFrame)
+    output = BytesIO()
+    total = sum(len(df) for _, df in hojas)
+
+    if total < FILAS_XLSX_STREAMING:
+        with pd.ExcelWriter(output, engine="openpyxl") as writer:
+            for titulo, df in hojas:
+                df.to_excel(writer, index=False, sheet_name=titulo)
+        return output.getvalue()
+
+    # Memoria constante: openpyxl no arma el libro completo
+    wb = Workbook(write_only=True)
+    for titulo, df in hojas:
+        _escribir_hoja_streaming(wb, df, titulo)
+    wb.save(output)
+    return output.getvalue()
+
+
+def resumen_por_tipo(df):
+    resumen = (
+        df.groupby("Tipo_Inconsistencia", observed=True)
+        .size()
+        .reset_index(name="Cantidad")
+    )
+    resumen["Porcentaje"] = (resumen["Cantidad"] / max(len(df), 1) * 100).round(1)
+    return resumen
+
+
 def to_excel_download(df):
+    return _xlsx([("Conciliacion", df)])
+
+
+def to_excel_por_tipo(df):
+    usados = set()
+    hojas = [(_nombre_hoja("Resumen", usados), resumen_por_tipo(df))]
+    for tipo, grupo in df.groupby("Tipo_Inconsistencia", sort=True, observed=True):
+        hojas.append((_nombre_hoja(tipo, usados), grupo))
+    return _xlsx(hojas)
+
+
+def to_csv_download(df):
+    # BOM para que Excel reconozca UTF-8 (tildes, ñ)
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def to_parquet_download(df):
     output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="Conciliacion")
+    df.to_parquet(output, index=False)
     return output.getvalue()
+
+
+_ESCRITORES = {
+    "xlsx": to_excel_download,
+    "xlsx_por_tipo": to_excel_por_tipo,
+    "csv": to_csv_download,
+    "parquet": to_parquet_download,
+}
+
+
+def exportar(df, formato="xlsx"):
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    with etapa("exportar", filas=len(df)) as datos:
+        contenido = _ESCRITORES[formato](df)
+        datos["bytes"] = len(contenido)
+        datos["detalle"] = formato
+    return contenido
+
+
+# =========================
+# Memoización
+# =========================
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def exportar_cacheado(clave, obtener_df, formato="xlsx"):
+    """Genera el archivo una sola vez por (clave, formato).
+
+    `clave` identifica el resultado y el filtro aplicado; `obtener_df` solo
+    se llama si el archivo no está en caché.
+    """
+    clave = (clave, formato)
+    with _lock:
+        if clave in _cache:
+            _cache.move_to_end(clave)
+            return _cache[clave]
+
+    contenido = exportar(obtener_df(), formato)
+
+    with _lock:
+        _cache[clave] = contenido
+        _cache.move_to_end(clave)
+        while len(_cache) > MAX_EXPORTACIONES_CACHE:
+            _cache.popitem(last=False)
+    return contenido
+
+
+def en_cache(clave, formato="xlsx"):
+    with _lock:
+        return (clave, formato) in _cache
@@ -0,0 +1,439 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from modules.claves import canonizar_codigo, canonizar_lote
+from modules.loader import BODEGA_PRINCIPAL
+
+# =========================
+# Configuración
+# =========================
+RUTA_HISTORIAL = os.environ.get("INVENTARIO_HISTORIAL_DB", ".cache/historial.sqlite")
+ESPERA_BLOQUEO = 60          # segundos (varios procesos pueden guardar a la vez)
+
+# AAAA-MM: los períodos se ordenan como texto
+PERIODO_VALIDO = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+# Columnas numéricas del resultado -> columna en la base
+NUMERICAS = {
+    "Inicial": "inicial",
+    "Recepciones": "recepciones",
+    "Salidas": "salidas",
+    "Final_Calculado": "final_calculado",
+    "Final_Sistema": "final_sistema",
+    "Diferencia": "diferencia",
+}
+
+# Dimensiones como tablas aparte: los hechos solo guardan enteros y la
+# clave primaria (lote, período) deja juntos los meses de cada lote. Los
+# lotes se identifican por las claves de la conciliación ("00123" y "123"
+# son el mismo código); codigo y lote son el primer texto guardado
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS periodos (
+    id INTEGER PRIMARY KEY,
+    periodo TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS tipos (
+    id INTEGER PRIMARY KEY,
+    tipo TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS lotes (
+    id INTEGER PRIMARY KEY,
+    sede TEXT NOT NULL,
+    bodega TEXT NOT NULL,
+    clave_codigo TEXT NOT NULL,
+    clave_lote TEXT NOT NULL,
+    codigo TEXT NOT NULL,
+    lote TEXT NOT NULL,
+    nombre TEXT,
+    UNIQUE (sede, bodega, clave_codigo, clave_lote)
+);
+CREATE INDEX IF NOT EXISTS lotes_codigo ON lotes (clave_codigo, clave_lote);
+CREATE INDEX IF NOT EXISTS lotes_bodega ON lotes (bodega, sede);
+CREATE TABLE IF NOT EXISTS cargas (
+    periodo_id INTEGER NOT NULL REFERENCES periodos (id),
+    sede TEXT NOT NULL,
+    bodega TEXT NOT NULL,
+    creado TEXT NOT NULL,
+    lotes INTEGER NOT NULL,
+    inconsistencias INTEGER NOT NULL,
+    PRIMARY KEY (periodo_id, sede, bodega)
+);
+CREATE TABLE IF NOT EXISTS resumen (
+    periodo_id INTEGER NOT NULL,
+    sede TEXT NOT NULL,
+    bodega TEXT NOT NULL,
+    tipo_id INTEGER NOT NULL REFERENCES tipos (id),
+    cantidad INTEGER NOT NULL,
+    PRIMARY KEY (periodo_id, sede, bodega, tipo_id)
+);
+CREATE TABLE IF NOT EXISTS inconsistencias (
+    lote_id INTEGER NOT NULL REFERENCES lotes (id),
+    periodo_id INTEGER NOT NULL REFERENCES periodos (id),
+    tipo_id INTEGER NOT NULL REFERENCES tipos (id),
+    inicial REAL,
+    recepciones REAL,
+    salidas REAL,
+    final_calculado REAL,
+    final_sistema REAL,
+    diferencia REAL,
+    racha INTEGER NOT NULL,
+    acumulado REAL,
+    PRIMARY KEY (lote_id, periodo_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS inconsistencias_periodo ON inconsistencias (periodo_id, tipo_id);
+CREATE INDEX IF NOT EXISTS inconsistencias_racha ON inconsistencias (racha);
+"""
+
+# Cargas de cada sede y bodega numeradas por período. "Meses seguidos" son
+# cargas seguidas de la misma bodega, aunque falte un período en otra
+_CARGAS_NUMERADAS = """
+SELECT c.periodo_id, c.sede, c.bodega, p.periodo,
+       ROW_NUMBER() OVER w AS n,
+       LEAD(c.periodo_id) OVER w AS siguiente,
+       LEAD(p.periodo) OVER w AS periodo_siguiente
+FROM cargas c JOIN periodos p ON p.id = c.periodo_id
+WINDOW w AS (PARTITION BY c.sede, c.bodega ORDER BY p.periodo)
+"""
+
+
+def validar_periodo(periodo):
+    """El período sin espacios; ValueError si no es AAAA-MM.
+
+    >>> validar_periodo(" 2024-03 ")
+    '2024-03'
+    """
+    periodo = "" if periodo is None else str(periodo).strip()
+    if not periodo:
+        raise ValueError("Falta el período")
+    if not PERIODO_VALIDO.match(periodo):
+        raise ValueError(f"Período inválido: {periodo!r} (use AAAA-MM, por ejemplo 2024-03)")
+    return periodo
+
+
+class Historial:
+    """Resultados de conciliaciones pasadas en una base SQLite local.
+
+    Se guardan las inconsistencias de cada (período, sede, bodega) y el
+    resumen por tipo; volver a guardar la misma combinación la reemplaza.
+    Cada inconsistencia lleva su racha (cuántas cargas seguidas de su
+    bodega lleva el lote con inconsistencia) y la diferencia acumulada en
+    esa racha: las consultas de recurrencia no recorren toda la historia.
+    """
+
+    def __init__(self, ruta=RUTA_HISTORIAL):
+        self.ruta = Path(ruta)
+        self._lock = threading.Lock()
+        self._creada = False
+
+    def _conectar(self):
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        conexion = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO)
+        if not self._creada:
+            with self._lock:
+                conexion.execute("PRAGMA journal_mode=WAL")
+                conexion.executescript(ESQUEMA)
+                self._creada = True
+        return conexion
+
+    # ===============================
+    # Escritura
+    # ===============================
+    def guardar(self, periodo, resultado, sede=""):
+        """Agrega (o reemplaza) un ResultadoConciliacion del período.
+
+        Con conciliar_por_bodega se guarda cada bodega por separado; si no,
+        todo queda en BODEGA_PRINCIPAL. Devuelve las filas guardadas.
+        """
+        periodo = validar_periodo(periodo)
+
+        df = resultado.inconsistencias
+        bodegas = (
+            df["Bodega"].astype(str).to_numpy() if "Bodega" in df.columns
+            else np.full(len(df), BODEGA_PRINCIPAL, dtype=object)
+        )
+        codigos = df["Codigo_Articulo"].astype(str).to_numpy()
+        lotes = df["Lote"].astype(str).to_numpy()
+        filas = pd.DataFrame({
+            "bodega": bodegas,
+            "clave_codigo": canonizar_codigo(codigos).to_numpy(),
+            "clave_lote": canonizar_lote(lotes).to_numpy(),
+            "codigo": codigos,
+            "lote": lotes,
+            "nombre": df["Nombre_Producto"].astype(object).to_numpy(),
+            "tipo": df["Tipo_Inconsistencia"].astype(str).to_numpy(),
+            **{columna: df[origen].to_numpy(dtype=np.float64) for origen, columna in NUMERICAS.items()},
+        })
+
+        # Lotes y tipos de todas las bodegas del resultado (también las
+        # que no tienen inconsistencias)
+        if "Bodega" in resultado.df.columns:
+            todas = resultado.df["Bodega"].astype(str).value_counts()
+        else:
+            todas = pd.Series({BODEGA_PRINCIPAL: len(resultado.df)})
+        resumen = filas.groupby(["bodega", "tipo"]).size()
+        por_bodega = filas["bodega"].value_counts()
+        creado = datetime.now().isoformat(timespec="seconds")
+
+        with closing(self._conectar()) as conexion, conexion:
+            conexion.execute("INSERT OR IGNORE INTO periodos (periodo) VALUES (?)", (periodo,))
+            (periodo_id,) = conexion.execute(
+                "SELECT id FROM periodos WHERE periodo = ?", (periodo,)
+            ).fetchone()
+            conexion.executemany(
+                "INSERT OR IGNORE INTO tipos (tipo) VALUES (?)",
+                [(t,) for t in filas["tipo"].unique()]
+            )
+
+            # Reemplaza lo que hubiera de estas bodegas en el período
+            for bodega in todas.index:
+                conexion.execute(
+                    "DELETE FROM inconsistencias WHERE periodo_id = ? AND lote_id IN "
+                    "(SELECT id FROM lotes WHERE sede = ? AND bodega = ?)",
+                    (periodo_id, sede, bodega)
+                )
+                conexion.execute(
+                    "DELETE FROM resumen WHERE periodo_id = ? AND sede = ? AND bodega = ?",
+                    (periodo_id, sede, bodega)
+                )
+            conexion.executemany(
+                "INSERT OR REPLACE INTO cargas VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (periodo_id, sede, bodega, creado, int(lotes), int(por_bodega.get(bodega, 0)))
+                    for bodega, lotes in todas.items()
+                ]
+            )
+            conexion.executemany(
+                "INSERT INTO resumen SELECT ?, ?, ?, id, ? FROM tipos WHERE tipo = ?",
+                [(periodo_id, sede, b, int(n), t) for (b, t), n in resumen.items()]
+            )
+
+            # Hechos: por una tabla temporal, para resolver los ids en SQL
+            conexion.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS carga (bodega, clave_codigo, clave_lote, codigo, lote, nombre, tipo, "
+                + ", ".join(NUMERICAS.values()) + ")"
+            )
+            conexion.execute("DELETE FROM carga")
+            conexion.executemany(
+                f"INSERT INTO carga VALUES ({', '.join('?' * len(filas.columns))})",
+                filas.itertuples(index=False, name=None)
+            )
+            conexion.execute(
+                "INSERT OR IGNORE INTO lotes (sede, bodega, clave_codigo, clave_lote, codigo, lote, nombre) "
+                "SELECT ?, bodega, clave_codigo, clave_lote, codigo, lote, nombre FROM carga",
+                (sede,)
+            )
+            conexion.execute(
+                "INSERT INTO inconsistencias SELECT l.id, ?, t.id, "
+                + ", ".join(f"c.{c}" for c in NUMERICAS.values())
+                + ", 1, c.diferencia FROM carga c"
+                " JOIN lotes l ON l.sede = ? AND l.bodega = c.bodega"
+                " AND l.clave_codigo = c.clave_codigo AND l.clave_lote = c.clave_lote"
+                " JOIN tipos t ON t.tipo = c.tipo",
+                (periodo_id, sede)
+            )
+            conexion.execute("DELETE FROM carga")
+
+            for bodega in todas.index:
+                _encadenar(conexion, sede, bodega, periodo)
+        return len(filas)
+
+    def eliminar(self, periodo, sede=None, bodega=None):
+        with closing(self._conectar()) as conexion, conexion:
+            fila = conexion.execute("SELECT id FROM periodos WHERE periodo = ?", (periodo,)).fetchone()
+            if fila is None:
+                return
+            condicion, parametros = _filtro(sede, bodega, "")
+            afectadas = conexion.execute(
+                f"SELECT sede, bodega FROM cargas WHERE periodo_id = :periodo{condicion}",
+                {"periodo": fila[0], **parametros}
+            ).fetchall()
+            for tabla in ("cargas", "resumen"):
+                conexion.execute(
+                    f"DELETE FROM {tabla} WHERE periodo_id = :periodo{condicion}",
+                    {"periodo": fila[0], **parametros}
+                )
+            condicion, parametros = _filtro(sede, bodega, "l.")
+            conexion.execute(
+                "DELETE FROM inconsistencias WHERE periodo_id = :periodo AND lote_id IN "
+                f"(SELECT l.id FROM lotes l WHERE 1 = 1{condicion})",
+                {"periodo": fila[0], **parametros}
+            )
+            # Las rachas de los períodos siguientes cambian
+            for sede_afectada, bodega_afectada in afectadas:
+                _encadenar(conexion, sede_afectada, bodega_afectada, periodo)
+
+    # ===============================
+    # Consultas
+    # ===============================
+    def _consultar(self, sql, parametros=None):
+        with closing(self._conectar()) as conexion:
+            return pd.read_sql_query(sql, conexion, params=parametros)
+
+    def cargas(self):
+        """Qué se guardó: una fila por (período, sede, bodega)."""
+        return self._consultar(
+            "SELECT p.periodo AS Periodo, c.sede AS Sede, c.bodega AS Bodega, "
+            "c.lotes AS Lotes, c.inconsistencias AS Inconsistencias, c.creado AS Guardado "
+            "FROM cargas c JOIN periodos p ON p.id = c.periodo_id "
+            "ORDER BY p.periodo, c.sede, c.bodega"
+        )
+
+    def periodos(self):
+        return self._consultar("SELECT periodo FROM periodos ORDER BY periodo")["periodo"].tolist()
+
+    def tendencia(self, sede=None, bodega=None, desde=None, hasta=None):
+        """Inconsistencias por período (filas) y tipo (columnas)."""
+        condicion, parametros = _filtro(sede, bodega, "r.")
+        largo = self._consultar(
+            "SELECT p.periodo AS Periodo, t.tipo AS Tipo, SUM(r.cantidad) AS Cantidad "
+            "FROM resumen r JOIN periodos p ON p.id = r.periodo_id "
+            "JOIN tipos t ON t.id = r.tipo_id "
+            f"WHERE p.periodo BETWEEN :desde AND :hasta{condicion} "
+            "GROUP BY p.periodo, t.tipo ORDER BY p.periodo",
+            {**_rango(desde, hasta), **parametros}
+        )
+        tabla = largo.pivot(index="Periodo", columns="Tipo", values="Cantidad").fillna(0).astype(int)
+        tabla.columns.name = None
+        tabla["Total"] = tabla.sum(axis=1)
+        return tabla
+
+    def recurrentes(self, minimo=3, consecutivos=True, sede=None, bodega=None, desde=None, hasta=None):
+        """Lotes con inconsistencia en al menos `minimo` períodos.
+
+        Con `consecutivos`, cada fila es una racha de al menos `minimo`
+        cargas seguidas de la misma sede y bodega que termina entre `desde`
+        y `hasta` (puede haber empezado antes), con su primer y último
+        período y la diferencia acumulada. Sin `consecutivos`, cuenta los
+        períodos del rango en que el lote tuvo inconsistencia.
+        """
+        condicion, parametros = _filtro(sede, bodega, "l.")
+        parametros = {**_rango(desde, hasta), **parametros, "minimo": int(minimo)}
+        columnas = (
+            "l.sede AS Sede, l.bodega AS Bodega, l.codigo AS Codigo_Articulo, "
+            "l.nombre AS Nombre_Producto, l.lote AS Lote"
+        )
+
+        if not consecutivos:
+            return self._consultar(
+                f"""
+                WITH conteo AS (
+                    SELECT i.lote_id, COUNT(*) AS periodos, MIN(p.periodo) AS desde,
+                           MAX(p.periodo) AS hasta, SUM(i.diferencia) AS diferencia
+                    FROM inconsistencias i CROSS JOIN periodos p ON p.id = i.periodo_id
+                    WHERE p.periodo BETWEEN :desde AND :hasta
+                    GROUP BY i.lote_id
+                    HAVING COUNT(*) >= :minimo
+                )
+                SELECT {columnas}, r.periodos AS Periodos, r.desde AS Desde,
+                       r.hasta AS Hasta, r.diferencia AS Diferencia_Acumulada
+                FROM conteo r JOIN lotes l ON l.id = r.lote_id
+                WHERE 1 = 1{condicion}
+                ORDER BY r.periodos DESC, ABS(r.diferencia) DESC, l.codigo, l.lote
+                """,
+                parametros
+            )
+
+        # Fin de racha: la siguiente carga de la bodega no tiene al lote
+        # (o queda fuera del rango). Se parte del índice por racha, que deja
+        # fuera a casi todas las filas; CROSS JOIN fija ese orden de cruce
+        return self._consultar(
+            f"""
+            WITH numeradas AS ({_CARGAS_NUMERADAS}),
+            largas AS MATERIALIZED (
+                SELECT lote_id, periodo_id, racha, acumulado
+                FROM inconsistencias WHERE racha >= :minimo
+            )
+            SELECT {columnas}, i.racha AS Periodos, d.periodo AS Desde,
+                   n.periodo AS Hasta, i.acumulado AS Diferencia_Acumulada
+            FROM largas i
+            CROSS JOIN lotes l ON l.id = i.lote_id
+            CROSS JOIN numeradas n ON n.periodo_id = i.periodo_id
+                AND n.sede = l.sede AND n.bodega = l.bodega
+            CROSS JOIN numeradas d ON d.sede = n.sede AND d.bodega = n.bodega
+                AND d.n = n.n - i.racha + 1
+            LEFT JOIN inconsistencias s ON s.lote_id = i.lote_id
+                AND s.periodo_id = n.siguiente AND n.periodo_siguiente <= :hasta
+            WHERE s.lote_id IS NULL AND n.periodo BETWEEN :desde AND :hasta{condicion}
+            ORDER BY i.racha DESC, ABS(i.acumulado) DESC, l.codigo, l.lote
+            """,
+            parametros
+        )
+
+    def del_lote(self, codigo, lote=None, sede=None, bodega=None):
+        """Historia de un código (o de uno de sus lotes) período a período."""
+        condicion, parametros = _filtro(sede, bodega, "l.")
+        condicion += " AND l.clave_codigo = :codigo"
+        parametros["codigo"] = canonizar_codigo([codigo])[0]
+        if lote:
+            condicion += " AND l.clave_lote = :lote"
+            parametros["lote"] = canonizar_lote([lote])[0]
+        return self._consultar(
+            "SELECT p.periodo AS Periodo, l.sede AS Sede, l.bodega AS Bodega, "
+            "l.codigo AS Codigo_Articulo, l.lote AS Lote, t.tipo AS Tipo_Inconsistencia, "
+            + ", ".join(f"i.{c} AS {o}" for o, c in NUMERICAS.items())
+            + " FROM lotes l JOIN inconsistencias i ON i.lote_id = l.id"
+            " JOIN periodos p ON p.id = i.periodo_id JOIN tipos t ON t.id = i.tipo_id"
+            f" WHERE 1 = 1{condicion} ORDER BY l.lote, p.periodo",
+            parametros
+        )
+
+
+def _encadenar(conexion, sede, bodega, periodo):
+    """Recalcula racha y acumulado desde `periodo` en adelante.
+
+    Lo normal es guardar el último período: solo se encadena esa carga con
+    la anterior. Al guardar o borrar uno intermedio se rehacen las que siguen.
+    """
+    cargas = conexion.execute(
+        "SELECT c.periodo_id, p.periodo FROM cargas c JOIN periodos p ON p.id = c.periodo_id "
+        "WHERE c.sede = ? AND c.bodega = ? ORDER BY p.periodo",
+        (sede, bodega)
+    ).fetchall()
+
+    # Otras bodegas pueden tener otras cargas: solo se tocan estos lotes
+    de_bodega = "i.lote_id IN (SELECT id FROM lotes WHERE sede = :sede AND bodega = :bodega)"
+    for k, (actual, periodo_actual) in enumerate(cargas):
+        if periodo_actual < periodo:
+            continue
+        parametros = {"sede": sede, "bodega": bodega, "actual": actual}
+        if periodo_actual > periodo:
+            conexion.execute(
+                "UPDATE inconsistencias AS i SET racha = 1, acumulado = diferencia "
+                f"WHERE i.periodo_id = :actual AND {de_bodega}",
+                parametros
+            )
+        if k > 0:
+            conexion.execute(
+                "UPDATE inconsistencias AS i SET racha = a.racha + 1, acumulado = i.diferencia + a.acumulado "
+                "FROM inconsistencias AS a "
+                f"WHERE i.periodo_id = :actual AND a.periodo_id = :anterior AND a.lote_id = i.lote_id AND {de_bodega}",
+                {**parametros, "anterior": cargas[k - 1][0]}
+            )
+
+
+def _rango(desde, hasta):
+    # Los períodos se comparan como texto (AAAA-MM ordena bien)
+    return {"desde": desde or "", "hasta": hasta or "\uffff"}
+
+
+def _filtro(sede, bodega, prefijo):
+    # Condiciones opcionales de sede y bodega (parámetros con nombre)
+    condicion, parametros = "", {}
+    if sede is not None:
+        condicion += f" AND {prefijo}sede = :sede"
+        parametros["sede"] = sede
+    if bodega is not None:
+        condicion += f" AND {prefijo}bodega = :bodega"
+        parametros["bodega"] = bodega
+    return condicion, parametros
+
+
+historial = Historial()
@@ -0,0 +1,138 @@
+import re
+
+from lxml import etree
+
+# Tamaño de cada bloque que se entrega al parser
+TAMANO_BLOQUE = 1024 * 1024
+
+# Mismo criterio de espacios que pd.read_html
+_ESPACIOS = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def _texto_celda(celda):
+    # Camino rápido: celda sin etiquetas internas
+    if len(celda) == 0:
+        texto = celda.text
+    else:
+        # <br> separa como en pd.read_html: "Acetaminófen<br>500" -> "Acetaminófen 500"
+        for br in celda.iter("br"):
+            br.tail = "\n" + (br.tail or "")
+        texto = "".join(celda.itertext())
+    if not texto:
+        return None
+    if "  " in texto or not texto.isprintable():
+        texto = _ESPACIOS.sub(" ", texto)
+    return texto.strip() or None
+
+
+def _entero(valor):
+    # colspan / rowspan; un valor inválido cuenta como 1
+    if valor is None:
+        return 1
+    try:
+        return max(int(valor), 1)
+    except ValueError:
+        return 1
+
+
+def _bajar(pendiente, valores, siguen):
+    # Celda de una fila anterior con rowspan que ocupa su lugar en esta
+    columna, texto, filas = pendiente
+    if filas > 1:
+        siguen.append((columna, texto, filas - 1))
+    valores.append(texto)
+
+
+def _valores_fila(tr, pendientes):
+    """Textos de la fila y las celdas con rowspan que siguen bajando.
+
+    Mismo criterio que pd.read_html: colspan repite la celda a la derecha y
+    rowspan la copia en las filas siguientes. `pendientes` son las celdas
+    (columna, texto, filas que faltan) que bajan de filas anteriores.
+    """
+    valores, siguen = [], []
+    for celda in tr:
+        if celda.tag != "td" and celda.tag != "th":
+            continue
+        while pendientes and pendientes[0][0] <= len(valores):
+            _bajar(pendientes.pop(0), valores, siguen)
+
+        # Camino rápido: celda sin atributos
+        if not celda.keys():
+            valores.append(_texto_celda(celda))
+            continue
+        texto, filas = _texto_celda(celda), _entero(celda.get("rowspan"))
+        for _ in range(_entero(celda.get("colspan"))):
+            if filas > 1:
+                siguen.append((len(valores), texto, filas - 1))
+            valores.append(texto)
+
+    for pendiente in pendientes:
+        _bajar(pendiente, valores, siguen)
+    return valores, siguen
+
+
+def _filas_pendientes(pendientes):
+    # Filas que solo existen por un rowspan que pasa de la última fila
+    while pendientes:
+        valores, siguen = [], []
+        for pendiente in pendientes:
+            _bajar(pendiente, valores, siguen)
+        yield valores
+        pendientes = siguen
+
+
+def iterar_filas_html(file, encoding="ISO-8859-1", tamano_bloque=TAMANO_BLOQUE):
+    """Recorre las filas de la primera tabla de un export HTML del ERP.
+
+    Cada fila se entrega como lista de textos (None para celdas vacías)
+    apenas se cierra su <tr>; la lectura termina con la primera </table>.
+    Las celdas con colspan y rowspan se repiten como en pd.read_html; un
+    rowspan no pasa de una sección (<thead>, <tbody>) a la siguiente.
+    """
+    file.seek(0)
+    parser = etree.HTMLPullParser(
+        events=("start", "end"),
+        tag=("table", "tr"),
+        encoding=encoding
+    )
+
+    profundidad = 0
+    pendientes, seccion = [], None
+    try:
+        while True:
+            bloque = file.read(tamano_bloque)
+            if not bloque:
+                break
+            parser.feed(bloque)
+
+            for evento, elem in parser.read_events():
+                if elem.tag == "table":
+                    profundidad += 1 if evento == "start" else -1
+                    if evento == "end" and profundidad == 0:
+                        yield from _filas_pendientes(pendientes)
+                        return
+                    continue
+
+                # Filas de tablas anidadas forman parte de su celda
+                if evento != "end" or profundidad != 1:
+                    continue
+
+                padre = elem.getparent()
+                if padre is not seccion:
+                    yield from _filas_pendientes(pendientes)
+                    pendientes, seccion = [], padre
+                valores, pendientes = _valores_fila(elem, pendientes)
+                yield valores
+
+                # Liberar lo ya procesado
+                elem.clear()
+                if padre is not None:
+                    while elem.getprevious() is not None:
+                        del padre[0]
+        yield from _filas_pendientes(pendientes)
+    finally:
+        try:
+            parser.close()
+        except etree.XMLSyntaxError:
+            pass
@@ -0,0 +1,62 @@
+import contextvars
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+from modules.cache import load_excel_cached
+
+# Mismo orden de argumentos que conciliar()
+ORDEN_ARCHIVOS = ("inicial", "traslados", "recepciones", "salidas", "final")
+
+MAX_WORKERS = int(os.environ.get("INVENTARIO_INGESTA_WORKERS", "5"))
+USAR_PROCESOS = os.environ.get("INVENTARIO_INGESTA_PROCESOS", "0") == "1"
+
+
+def _leer(contenido, tipo):
+    return load_excel_cached(BytesIO(contenido), tipo)
+
+
+def cargar_archivos(archivos, max_workers=MAX_WORKERS, procesos=USAR_PROCESOS):
+    """Lee todos los archivos a la vez.
+
+    `archivos` es un dict tipo -> archivo (o None). Devuelve la lista de
+    DataFrames en ORDEN_ARCHIVOS (None si no se cargó o falló) y un dict
+    tipo -> mensaje con los errores de cada archivo.
+    """
+    # Los bytes se leen en el hilo principal: los uploads no son thread-safe
+    contenidos = {}
+    for tipo in ORDEN_ARCHIVOS:
+        archivo = archivos.get(tipo)
+        if archivo is not None:
+            archivo.seek(0)
+            contenidos[tipo] = archivo.read()
+
+    resultados = dict.fromkeys(ORDEN_ARCHIVOS)
+    errores = {}
+
+    if not contenidos:
+        return [resultados[t] for t in ORDEN_ARCHIVOS], errores
+
+    Executor = ProcessPoolExecutor if procesos else ThreadPoolExecutor
+    workers = max(1, min(max_workers, len(contenidos)))
+
+    with Executor(max_workers=workers) as executor:
+        if procesos:
+            # Las etapas medidas en otro proceso no llegan al registro
+            futuros = {
+                tipo: executor.submit(_leer, contenido, tipo)
+                for tipo, contenido in contenidos.items()
+            }
+        else:
+            # Cada hilo hereda el registro de métricas activo
+            futuros = {
+                tipo: executor.submit(contextvars.copy_context().run, _leer, contenido, tipo)
+                for tipo, contenido in contenidos.items()
+            }
+        for tipo, futuro in futuros.items():
+            try:
+                resultados[tipo] = futuro.result()
+            except Exception as e:
+                errores[tipo] = str(e) or type(e).__name__
+
+    return [resultados[t] for t in ORDEN_ARCHIVOS], errores
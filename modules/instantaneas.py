@@ -0,0 +1,200 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from modules.conciliacion import ResultadoConciliacion
+from modules.metricas import etapa
+from modules.visor import Visor
+
+# =========================
+# Configuración
+# =========================
+DIRECTORIO_INSTANTANEAS = os.environ.get("INVENTARIO_INSTANTANEAS_DIR", ".cache/instantaneas")
+MAX_EDAD = 24 * 3600          # segundos sin uso antes de borrar el archivo
+# Cambia cuando cambian las columnas del resultado
+VERSION_INSTANTANEA = 1
+
+
+def huella(df):
+    """Hash del contenido (valores, índice, columnas y tipos) de un DataFrame."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _leer_mapeado(ruta):
+    # Sin compresión, Arrow IPC se lee sobre el mapa de memoria: números y
+    # códigos de categorías quedan como vistas de solo lectura del archivo
+    # (el mapa sigue abierto mientras alguna columna lo use)
+    tabla = pa.ipc.open_file(pa.memory_map(str(ruta))).read_all()
+    return tabla.to_pandas(split_blocks=True)
+
+
+class _Entrada:
+    # Un resultado compartido por todas las sesiones que lo abrieron, con
+    # una sola procedencia (y sus archivos de entrada) para todas
+    def __init__(self, resultado):
+        self.resultado = resultado
+        self.referencias = 0
+        self.visores = {}
+        self._lock = threading.Lock()
+
+    def adoptar(self, procedencia):
+        # Queda la de la primera conciliación que la trajo: mismo resultado,
+        # mismos lotes y sumas. Uno publicado sin procedencia (por bloques)
+        # la toma de la siguiente
+        with self._lock:
+            if self.resultado.procedencia is None and procedencia is not None:
+                self.resultado = self.resultado.con_procedencia(procedencia)
+
+    def visor(self, bodega):
+        with self._lock:
+            if bodega not in self.visores:
+                sub = self.resultado.de_bodega(bodega)
+                self.visores[bodega] = Visor(sub.inconsistencias, sub.posiciones_por_tipo)
+            return self.visores[bodega]
+
+
+class Instantanea:
+    """Lo que guarda una sesión: la clave del resultado, no sus tablas.
+
+    `resultado` (con su procedencia) y `visor()` son los del proceso,
+    compartidos con otras sesiones que conciliaron lo mismo. Al desaparecer
+    el objeto (sesión cerrada o reemplazada) se suelta la referencia.
+    """
+
+    def __init__(self, registro, clave, entrada):
+        self.clave = clave
+        self._entrada = entrada
+        weakref.finalize(self, registro._soltar, clave)
+
+    @property
+    def resultado(self):
+        return self._entrada.resultado
+
+    def visor(self, bodega="Todas"):
+        return self._entrada.visor(bodega)
+
+
+class Instantaneas:
+    """Resultados escritos una vez en Arrow IPC y leídos con memory map.
+
+    La clave es el hash del contenido: conciliaciones idénticas comparten
+    archivo y objetos en memoria. Cada Instantanea cuenta como referencia;
+    sin referencias el resultado sale de memoria y el archivo queda para
+    reutilizarse hasta cumplir `max_edad` sin uso.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_INSTANTANEAS, max_edad=MAX_EDAD):
+        self.directorio = Path(directorio) if directorio else None
+        self.max_edad = max_edad
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def _ruta(self, clave, parte="resultado"):
+        return self.directorio / f"{clave}-{parte}.arrow"
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entradas)
+
+    # ===============================
+    # Publicar
+    # ===============================
+    def publicar(self, resultado):
+        """Devuelve una Instantanea del ResultadoConciliacion."""
+        partes = {"resultado": resultado.df}
+        if resultado.similares is not None:
+            partes["similares"] = resultado.similares
+        clave = "-".join(huella(df) for df in partes.values())
+        clave = hashlib.blake2b(f"{clave}-v{VERSION_INSTANTANEA}".encode(), digest_size=16).hexdigest()
+
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                entrada.referencias += 1
+        if entrada is None:
+            nueva = _Entrada(self._escribir(clave, partes) or resultado.con_procedencia(None))
+            with self._lock:
+                entrada = self._entradas.setdefault(clave, nueva)
+                entrada.referencias += 1
+        entrada.adoptar(resultado.procedencia)
+        self.desalojar()
+        return Instantanea(self, clave, entrada)
+
+    def _escribir(self, clave, partes):
+        # Devuelve el resultado leído del archivo (None si no hay disco)
+        if self.directorio is None:
+            return None
+        with etapa("escribir instantánea", filas=len(partes["resultado"])) as datos:
+            temporal = None
+            try:
+                self.directorio.mkdir(parents=True, exist_ok=True)
+                for parte, df in partes.items():
+                    ruta = self._ruta(clave, parte)
+                    if ruta.exists():
+                        os.utime(ruta)
+                        continue
+                    temporal = ruta.with_suffix(f".{uuid.uuid4().hex}.tmp")
+                    feather.write_feather(df, temporal, compression="uncompressed")
+                    os.replace(temporal, ruta)
+                    temporal = None
+                leidas = {parte: _leer_mapeado(self._ruta(clave, parte)) for parte in partes}
+            except OSError as e:
+                # Disco lleno, sin permisos, etc.: el resultado queda en
+                # memoria y el motivo, en las métricas del trabajo
+                if temporal is not None:
+                    temporal.unlink(missing_ok=True)
+                datos["detalle"] = f"en memoria: {e}"
+                return None
+        return ResultadoConciliacion(leidas["resultado"], similares=leidas.get("similares"))
+
+    # ===============================
+    # Referencias
+    # ===============================
+    def _soltar(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return
+            entrada.referencias -= 1
+            if entrada.referencias <= 0:
+                del self._entradas[clave]
+        # Al soltarse, el archivo vuelve a contar su edad desde ahora
+        if self.directorio is not None:
+            for ruta in self.directorio.glob(f"{clave}-*.arrow"):
+                try:
+                    os.utime(ruta)
+                except OSError:
+                    pass
+
+    # ===============================
+    # Limpieza
+    # ===============================
+    def desalojar(self):
+        # Borra los archivos sin uso hace más de max_edad (nunca los abiertos)
+        if self.directorio is None or not self.directorio.exists():
+            return
+        with self._lock:
+            abiertas = set(self._entradas)
+        ahora = time.time()
+        for ruta in self.directorio.glob("*.arrow"):
+            if ruta.name.split("-")[0] in abiertas:
+                continue
+            try:
+                if ahora - ruta.stat().st_mtime > self.max_edad:
+                    ruta.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+
+
+instantaneas = Instantaneas()
@@ -1,31 +1,277 @@
 import pandas as pd
+from contextlib import closing
 from io import StringIO
+from itertools import islice
+import numpy as np
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
 
-def preparar_datos(traslados,salidas,  recepciones):
-
-    # Filtros de negocio
-    traslados = traslados[traslados["BODEGA ORIGEN"] == "SERVICIO FARMACEUTICO SOTANO"]
-    if salidas is not None and not salidas.empty:
-        salidas = salidas[
-            salidas["BODEGA ORIGEN"] == "SERVICIO FARMACEUTICO SOTANO"
-        ]
-    
-    recepciones = recepciones[
-        (recepciones["PROVEEDOR"] != "--------------")
+from modules.html_erp import iterar_filas_html
+from modules.metricas import etapa
+
+BODEGA_PRINCIPAL = "SERVICIO FARMACEUTICO SOTANO"
+
+
+def limpiar_bodega(serie):
+    """Nombres de bodega comparables: espacios colapsados y mayúsculas.
+
+    Los vacíos quedan como NA. Es el mismo criterio para el filtro de
+    BODEGA_PRINCIPAL y para la conciliación por bodegas.
+    """
+    # Se limpia cada valor distinto una vez
+    codigos, unicos = pd.factorize(serie)
+    limpios = (
+        pd.Index(unicos, dtype=object).astype("string")
+        .str.replace(r"\s+", " ", regex=True).str.strip().str.upper()
+    )
+    limpios = limpios.where(limpios != "")
+    return pd.Series(
+        pd.array(np.append(limpios.to_numpy(dtype=object), pd.NA)[codigos], dtype="string"),
+        index=serie.index
+    )
+
+
+def filas_validas(df, tipo):
+    # Posiciones de las filas que pasan los filtros de negocio
+    if tipo in ["traslados", "salidas"]:
+        validas = limpiar_bodega(df["BODEGA ORIGEN"]) == BODEGA_PRINCIPAL
+        return np.flatnonzero(validas.to_numpy(dtype=bool, na_value=False))
+    if tipo == "recepciones":
+        validas = df["PROVEEDOR"] != "--------------"
+        return np.flatnonzero(validas.to_numpy(dtype=bool, na_value=True))
+    return np.arange(len(df))
+
+
+# Nombres de columna de cada export -> nombre interno
+_MAPA_INVENTARIO = {
+    "CODIGO PRODUCTO": "CODIGO PRODUCTO",
+    "CÓDIGO PRODUCTO": "CODIGO PRODUCTO",
+    "PRODUCTO": "NOMBRE PRODUCTO",
+    "DESCRIPCION": "NOMBRE PRODUCTO",
+    "DESCRIPCIÓN": "NOMBRE PRODUCTO",
+    "LOTE": "LOTE",
+    "CANTIDAD": "CANTIDAD"
+}
+_MAPA_MOVIMIENTOS = {
+    "CODIGO ARTICULO": "CODIGO PRODUCTO",
+    "CÓDIGO ARTICULO": "CODIGO PRODUCTO",
+    "NOMBRE ARTICULO": "NOMBRE PRODUCTO",
+    "LOTE": "LOTE",
+    "CANTIDAD": "CANTIDAD"
+}
+MAPA_COLUMNAS = {
+    "inicial": _MAPA_INVENTARIO,
+    "final": _MAPA_INVENTARIO,
+    "traslados": _MAPA_MOVIMIENTOS,
+    "salidas": _MAPA_MOVIMIENTOS,
+    "recepciones": {
+        "CODIGO ARTICULO": "CODIGO PRODUCTO",
+        "CÓDIGO ARTICULO": "CODIGO PRODUCTO",
+        "NOMBRE ARTICULO": "NOMBRE PRODUCTO",
+        "DESCRIPCION": "NOMBRE PRODUCTO",
+        "LOTE": "LOTE",
+        "CANTIDAD RECIBIDA": "CANTIDAD"
+    },
+}
+
+# Columna que indica la bodega en cada archivo, en orden de preferencia.
+# Los archivos sin ninguna de ellas se asignan a BODEGA_PRINCIPAL.
+COLUMNAS_BODEGA = {
+    "inicial": ["BODEGA"],
+    "recepciones": ["BODEGA DESTINO", "BODEGA"],
+    "traslados": ["BODEGA ORIGEN"],
+    "salidas": ["BODEGA ORIGEN"],
+    "final": ["BODEGA"],
+}
+
+# Columnas que usa la conciliación; el resto no se carga
+COLUMNAS_UTILES = {
+    tipo: {"CODIGO PRODUCTO", "NOMBRE PRODUCTO", "LOTE", "CANTIDAD"}
+    | set(COLUMNAS_BODEGA[tipo])
+    | ({"PROVEEDOR"} if tipo == "recepciones" else set())
+    for tipo in MAPA_COLUMNAS
+}
+
+
+def _limpiar_nombre(columna):
+    return str(columna).strip().upper()
+
+
+def columnas_a_leer(tipo):
+    # Nombres originales (ya limpios) que terminan en una columna útil
+    utiles = COLUMNAS_UTILES[tipo]
+    return {
+        original for original, interno in MAPA_COLUMNAS[tipo].items()
+        if interno in utiles
+    } | utiles
+
+
+# Filas que se revisan al buscar el encabezado en modo streaming
+FILAS_BUSQUEDA_ENCABEZADO = 200
+
+# En df.attrs: fila de Excel (desde 1) del encabezado. El índice del
+# DataFrame es la fila de datos (desde 0) debajo de él, así que la fila de
+# Excel de cada movimiento es encabezado + 1 + índice
+FILA_ENCABEZADO = "fila_encabezado"
+
+
+def es_encabezado(valores):
+    fila = [str(v).upper() for v in valores]
+    return any("CODIGO" in c for c in fila) and any("LOTE" in c for c in fila)
+
+
+def _leer_xlsx_streaming(file, leer):
+    # Solo las primeras filas se recorren con el iterador read-only;
+    # el cuerpo se parsea una sola vez con pandas.
+    try:
+        file.seek(0)
+        wb = load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        return None
+
+    try:
+        ws = wb.worksheets[0]
+        header_row, encabezado = None, None
+        for i, fila in enumerate(ws.iter_rows(values_only=True)):
+            if i >= FILAS_BUSQUEDA_ENCABEZADO:
+                break
+            if es_encabezado(fila):
+                header_row, encabezado = i, fila
+                break
+    finally:
+        wb.close()
+
+    if header_row is None:
+        return None
+
+    # Texto para todo salvo cantidades
+    tipos = {
+        v: str
+        for v in encabezado
+        if isinstance(v, str) and "CANTIDAD" not in v.upper()
+    }
+
+    file.seek(0)
+    df = pd.read_excel(
+        file,
+        header=header_row,
+        dtype=tipos,
+        usecols=lambda c: _limpiar_nombre(c) in leer
+    )
+    df.attrs[FILA_ENCABEZADO] = header_row + 1
+    return df
+
+
+def _abrir_html(file, leer):
+    # Export del ERP: HTML con extensión .xls. Devuelve (filas restantes,
+    # encabezado, posiciones útiles, fila del encabezado desde 1) o None si
+    # no hay encabezado
+    filas = iterar_filas_html(file)
+
+    encabezado = None
+    for i, fila in enumerate(filas):
+        if i >= FILAS_BUSQUEDA_ENCABEZADO:
+            break
+        if es_encabezado(fila):
+            encabezado, fila_encabezado = fila, i + 1
+            break
+
+    if encabezado is None:
+        filas.close()
+        return None
+
+    posiciones = [i for i, c in enumerate(encabezado) if _limpiar_nombre(c) in leer]
+    return filas, encabezado, posiciones, fila_encabezado
+
+
+def _cuerpo_html(filas, encabezado, posiciones):
+    # Solo se guardan las celdas de las columnas útiles
+    ancho = len(encabezado)
+    relleno = [None] * ancho
+    cuerpo = [
+        [fila[i] for i in posiciones]
+        for fila in ((fila + relleno) if len(fila) < ancho else fila for fila in filas)
     ]
+    df = pd.DataFrame(cuerpo, columns=[encabezado[i] for i in posiciones], dtype=object)
+    return df.fillna(np.nan)
 
-    # Ahora sí limpiamos columnas
-    columnas = ["CODIGO PRODUCTO", "LOTE", "CANTIDAD"]
-    traslados = traslados[columnas]
-    recepciones = recepciones[columnas]
 
-    return traslados, salidas, recepciones
+def _leer_html_streaming(file, leer):
+    abierto = _abrir_html(file, leer)
+    if abierto is None:
+        return None
+    filas, encabezado, posiciones, fila_encabezado = abierto
+    df = _cuerpo_html(filas, encabezado, posiciones)
+    df.attrs[FILA_ENCABEZADO] = fila_encabezado
+    return df
 
 
-def load_excel(file, tipo):
-    if file is None:
+def formato_archivo(file):
+    file.seek(0)
+    firma = file.read(8)
+    file.seek(0)
+
+    if firma.startswith(b"PK"):
+        return "xlsx"
+    if firma.startswith(b"\xd0\xcf\x11\xe0"):
+        return "xls"
+    return "html"
+
+
+def _primeras_filas(file, formato):
+    # Valores de las primeras filas, sin leer el resto del archivo
+    if formato == "xlsx":
+        file.seek(0)
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            filas = wb.worksheets[0].iter_rows(values_only=True)
+            yield from islice(filas, FILAS_BUSQUEDA_ENCABEZADO)
+        finally:
+            wb.close()
+    elif formato == "html":
+        filas = iterar_filas_html(file)
+        try:
+            yield from islice(filas, FILAS_BUSQUEDA_ENCABEZADO)
+        finally:
+            filas.close()
+    else:
+        file.seek(0)
+        df = pd.read_excel(file, header=None, nrows=FILAS_BUSQUEDA_ENCABEZADO, dtype=str)
+        yield from df.itertuples(index=False, name=None)
+
+
+def leer_encabezado(file):
+    """(filas anteriores, nombres de columna) de las primeras filas.
+
+    Sirve para reconocer un archivo sin leerlo completo. None si el
+    encabezado no aparece o el archivo no se puede abrir.
+    """
+    previas = []
+    try:
+        with closing(_primeras_filas(file, formato_archivo(file))) as filas:
+            for fila in filas:
+                if es_encabezado(fila):
+                    return previas, [_limpiar_nombre(c) for c in fila if pd.notna(c)]
+                previas.append([c for c in fila if pd.notna(c)])
+    except Exception:
         return None
+    finally:
+        file.seek(0)
+    return None
+
+
+def _encabezado_como_filas(df):
+    # read_html sube a nombres de columna las filas de <thead> (o las de
+    # solo <th> del comienzo): vuelven a ser filas, como en el archivo
+    if df.columns.equals(pd.RangeIndex(df.shape[1])):
+        return df
+    niveles = [df.columns.get_level_values(i).tolist() for i in range(df.columns.nlevels)]
+    cuerpo = df.set_axis(range(df.shape[1]), axis=1)
+    return pd.concat([pd.DataFrame(niveles), cuerpo], ignore_index=True)
 
+
+def _leer_completo(file):
     # Leer SIEMPRE como texto
     try:
         file.seek(0)
@@ -34,20 +280,17 @@ def load_excel(file, tipo):
             header=None,
             dtype=str
         )
-        print("Leído como Excel real")
     except Exception:
         file.seek(0)
         raw = file.read()
         text = raw.decode("latin-1", errors="ignore")
-        df_raw = pd.read_html(StringIO(text), header=None)[0]
+        df_raw = _encabezado_como_filas(pd.read_html(StringIO(text), header=None)[0])
         df_raw = df_raw.astype(str)
-        print("Leído como HTML disfrazado")
 
     # Buscar encabezado real
     header_row = None
     for i in range(len(df_raw)):
-        fila = df_raw.iloc[i].astype(str).str.upper().tolist()
-        if any("CODIGO" in c for c in fila) and any("LOTE" in c for c in fila):
+        if es_encabezado(df_raw.iloc[i].astype(str).tolist()):
             header_row = i
             break
 
@@ -55,58 +298,191 @@ def load_excel(file, tipo):
         raise ValueError("No se encontró la fila de encabezados")
 
     # Reconstruir
-    df = df_raw.iloc[header_row + 1:].copy()
-    df.columns = df_raw.iloc[header_row].astype(str).str.strip().str.upper()
+    df = df_raw.iloc[header_row + 1:].reset_index(drop=True)
+    df.columns = df_raw.iloc[header_row]
+    df.attrs[FILA_ENCABEZADO] = header_row + 1
+    return df
+
+
+def load_excel(file, tipo, modo="streaming"):
+    if file is None:
+        return None
+    if tipo not in MAPA_COLUMNAS:
+        raise ValueError("Tipo de archivo no reconocido")
+
+    with etapa("lectura", archivo=tipo) as datos:
+        df = None
+        formato = formato_archivo(file)
+        leer = columnas_a_leer(tipo)
+        if modo == "streaming":
+            if formato == "xlsx":
+                df = _leer_xlsx_streaming(file, leer)
+            elif formato == "html":
+                df = _leer_html_streaming(file, leer)
+
+        if df is None:
+            df = _leer_completo(file)
+            formato += " (completo)"
+
+        datos["filas"] = len(df)
+        datos["bytes"] = file.seek(0, 2)
+        file.seek(0)
+        datos["detalle"] = formato
+
+    with etapa("columnas", archivo=tipo, filas=len(df)) as datos:
+        df = _normalizar_columnas(df, tipo)
+        datos["detalle"] = ", ".join(df.columns)
+    return df
+
+
+def _normalizar_columnas(df, tipo):
+    df.columns = pd.Index(df.columns).astype(str).str.strip().str.upper()
     df = df.dropna(how="all")
     df = df.loc[:, ~df.columns.str.contains("UNNAMED")]
 
     # Normalización de columnas
-    if tipo in ["inicial", "final"]:
-        rename_map = {
-            "CODIGO PRODUCTO": "CODIGO PRODUCTO",
-            "CÓDIGO PRODUCTO": "CODIGO PRODUCTO",
-            "PRODUCTO": "NOMBRE PRODUCTO",
-            "DESCRIPCION": "NOMBRE PRODUCTO",
-            "DESCRIPCIÓN": "NOMBRE PRODUCTO",
-            "LOTE": "LOTE",
-            "CANTIDAD": "CANTIDAD"
-        }
-    elif tipo in ["traslados", "salidas"]:
-        rename_map = {
-            "CODIGO ARTICULO": "CODIGO PRODUCTO",
-            "CÓDIGO ARTICULO": "CODIGO PRODUCTO",
-            "NOMBRE ARTICULO": "NOMBRE PRODUCTO",
-            "LOTE": "LOTE",
-            "CANTIDAD": "CANTIDAD"
-        }
-    elif tipo == "recepciones":
-        rename_map = {
-            "CODIGO ARTICULO": "CODIGO PRODUCTO",
-            "CÓDIGO ARTICULO": "CODIGO PRODUCTO",
-            "NOMBRE ARTICULO": "NOMBRE PRODUCTO",
-            "DESCRIPCION": "NOMBRE PRODUCTO",
-            "LOTE": "LOTE",
-            "CANTIDAD RECIBIDA": "CANTIDAD"
-        }
-    else:
-        raise ValueError("Tipo de archivo no reconocido")
+    df = df.rename(columns=MAPA_COLUMNAS[tipo])
+    df = df[[c for c in df.columns if c in COLUMNAS_UTILES[tipo]]]
 
-    df = df.rename(columns=rename_map)
+    # La limpieza de CODIGO PRODUCTO y LOTE se hace una sola vez en
+    # conciliacion.normalizar (modules/claves.py)
+    return compactar(df)
 
-    print(f"Columnas {tipo}:", df.columns.tolist())
 
-    # Limpieza fuerte
-    df["CODIGO PRODUCTO"] = df["CODIGO PRODUCTO"].astype(str).str.strip()
-    df["LOTE"] = df["LOTE"].astype(str).str.strip()
+# =========================
+# Lectura por bloques
+# =========================
+FILAS_POR_BLOQUE = 50_000
 
-    # Eliminar basura tipo ".0"
-    df["LOTE"] = df["LOTE"].str.replace(".0", "", regex=False)
 
-    df["CANTIDAD"] = pd.to_numeric(df["CANTIDAD"], errors="coerce").fillna(0)
+def _celda_xlsx(celda):
+    # Misma conversión que pandas.read_excel (motor openpyxl)
+    if celda.value is None:
+        return ""
+    if celda.data_type == TYPE_ERROR:
+        return np.nan
+    if celda.data_type == TYPE_NUMERIC:
+        entero = int(celda.value)
+        return entero if entero == celda.value else float(celda.value)
+    return celda.value
 
-    return df
 
+def _bloques_xlsx(file, leer, filas):
+    # Recorre la hoja una sola vez en modo read-only; cada bloque pasa por
+    # el mismo parser que usa read_excel
+    try:
+        file.seek(0)
+        wb = load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        return None
+
+    ws = wb.worksheets[0]
+    ws.reset_dimensions()
+    iterador = ws.iter_rows()
+    encabezado = None
+    for i, fila in enumerate(iterador):
+        if i >= FILAS_BUSQUEDA_ENCABEZADO:
+            break
+        if es_encabezado([c.value for c in fila]):
+            encabezado = fila
+            break
+
+    if encabezado is None:
+        wb.close()
+        return None
+    return _generar_bloques_xlsx(wb, iterador, encabezado, leer, filas)
+
+
+def _generar_bloques_xlsx(wb, iterador, encabezado, leer, filas):
+    nombres = [_celda_xlsx(c) for c in encabezado]
+    tipos = {
+        c.value: str
+        for c in encabezado
+        if isinstance(c.value, str) and "CANTIDAD" not in c.value.upper()
+    }
+    ancho = len(nombres)
+    vacia = [""] * ancho
+
+    def parsear(bloque):
+        return TextParser(
+            [nombres] + bloque,
+            header=0,
+            dtype=tipos,
+            usecols=lambda c: _limpiar_nombre(c) in leer
+        ).read()
+
+    try:
+        bloque = []
+        for fila in iterador:
+            valores = [_celda_xlsx(c) for c in fila[:ancho]]
+            bloque.append(valores + vacia[len(valores):])
+            if len(bloque) >= filas:
+                yield parsear(bloque)
+                bloque = []
+        if bloque:
+            yield parsear(bloque)
+    finally:
+        wb.close()
+
+
+def _bloques_html(file, leer, filas):
+    abierto = _abrir_html(file, leer)
+    if abierto is None:
+        return None
+    iterador, encabezado, posiciones, _ = abierto
+
+    def generar():
+        while True:
+            bloque = list(islice(iterador, filas))
+            if not bloque:
+                return
+            yield _cuerpo_html(bloque, encabezado, posiciones)
 
+    return generar()
 
 
+def leer_por_bloques(file, tipo, filas=FILAS_POR_BLOQUE):
+    """Como load_excel, pero entrega el archivo en DataFrames de `filas` filas.
+
+    xlsx y HTML se recorren una sola vez sin tener el archivo completo en
+    memoria. Los .xls binarios (o sin encabezado reconocible) se leen
+    completos con load_excel y luego se parten.
+    """
+    if tipo not in MAPA_COLUMNAS:
+        raise ValueError("Tipo de archivo no reconocido")
+
+    formato = formato_archivo(file)
+    leer = columnas_a_leer(tipo)
+    bloques = None
+    if formato == "xlsx":
+        bloques = _bloques_xlsx(file, leer, filas)
+    elif formato == "html":
+        bloques = _bloques_html(file, leer, filas)
 
+    if bloques is None:
+        df = load_excel(file, tipo)
+        for inicio in range(0, len(df), filas):
+            yield df.iloc[inicio:inicio + filas]
+        return
+
+    for bloque in bloques:
+        yield _normalizar_columnas(bloque, tipo)
+
+
+def compactar(df):
+    # Tipos compactos: lotes como texto Arrow, textos repetidos como
+    # categorías y cantidades enteras de 32 bits cuando se puede
+    tipos = {}
+    for columna in df.columns:
+        if columna == "CANTIDAD":
+            continue
+        tipos[columna] = "string[pyarrow]" if columna == "LOTE" else "category"
+    df = df.astype(tipos)
+
+    cantidad = pd.to_numeric(df["CANTIDAD"], errors="coerce").fillna(0)
+    enteros = cantidad.to_numpy(dtype=np.float64)
+    if (np.mod(enteros, 1) == 0).all() and (np.abs(enteros) < 2 ** 31).all():
+        cantidad = cantidad.astype(np.int32)
+    df["CANTIDAD"] = cantidad
+
+    return df
@@ -0,0 +1,174 @@
+import contextvars
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+
+class Cancelado(Exception):
+    """La ejecución se canceló (ver Registro.cancelar)."""
+
+
+class Registro:
+    """Etapas medidas durante una ejecución (lectura, conciliación, exportación).
+
+    También sirve de progreso: `en_curso` tiene las etapas abiertas y, una
+    vez llamado `cancelar()`, la siguiente etapa que empiece lanza Cancelado.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.creado = time.time()
+        self.etapas = []
+        self.en_curso = []
+        self._cancelado = threading.Event()
+        self._lock = threading.Lock()
+
+    def iniciar(self, etapa):
+        verificar_cancelacion(self)
+        with self._lock:
+            self.en_curso.append(etapa)
+
+    def agregar(self, etapa):
+        with self._lock:
+            self.en_curso = [e for e in self.en_curso if e is not etapa]
+            self.etapas.append(etapa)
+
+    def cancelar(self):
+        self._cancelado.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def progreso(self):
+        """(etapas terminadas, etapas en curso) como listas de dicts."""
+        with self._lock:
+            return list(self.etapas), list(self.en_curso)
+
+    def a_dataframe(self):
+        with self._lock:
+            etapas = list(self.etapas)
+        columnas = ["etapa", "archivo", "inicio", "segundos", "filas", "bytes", "detalle"]
+        df = pd.DataFrame(etapas, columns=columnas)
+        return df.sort_values("inicio", kind="stable").reset_index(drop=True)
+
+    def total(self):
+        with self._lock:
+            if not self.etapas:
+                return 0.0
+            return max(e["inicio"] + e["segundos"] for e in self.etapas)
+
+    def a_json(self):
+        with self._lock:
+            etapas = list(self.etapas)
+        return json.dumps(
+            {"creado": self.creado, "total_segundos": self.total(), "etapas": etapas},
+            ensure_ascii=False,
+            indent=2,
+            default=str
+        )
+
+
+_registro_actual = contextvars.ContextVar("registro_metricas", default=None)
+
+
+def registro_actual():
+    return _registro_actual.get()
+
+
+def verificar_cancelacion(registro=None):
+    """Lanza Cancelado si el registro (por defecto el activo) se canceló."""
+    registro = registro or _registro_actual.get()
+    if registro is not None and registro.cancelado:
+        raise Cancelado("Ejecución cancelada")
+
+
+@contextmanager
+def registrar(registro=None):
+    """Activa `registro` (o uno nuevo) para las etapas del bloque."""
+    registro = registro or Registro()
+    token = _registro_actual.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_actual.reset(token)
+
+
+@contextmanager
+def etapa(nombre, archivo=None, filas=None, bytes=None):
+    """Mide una etapa. Sin registro activo no hace nada.
+
+    Devuelve un dict en el que el bloque puede completar "filas", "bytes"
+    o "detalle" una vez conocidos.
+    """
+    registro = _registro_actual.get()
+    datos = {"etapa": nombre, "archivo": archivo, "filas": filas, "bytes": bytes, "detalle": None}
+    if registro is None:
+        yield datos
+        return
+
+    inicio = time.perf_counter()
+    datos["inicio"] = round(inicio - registro.inicio, 6)
+    registro.iniciar(datos)
+    try:
+        yield datos
+    finally:
+        datos["segundos"] = round(time.perf_counter() - inicio, 6)
+        registro.agregar(datos)
+
+
+# =========================
+# Memoria por sesión
+# =========================
+def _bytes_sin_compactar(serie):
+    # Lo que ocuparía la columna como float64 u objetos Python, sin
+    # convertirla: los tamaños salen de los valores distintos
+    filas = len(serie)
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return 8 * filas
+    if serie.dtype == object:
+        return int(serie.memory_usage(index=False, deep=True))
+
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, unicos = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, unicos = pd.factorize(serie)
+    tamanos = np.fromiter(
+        (sys.getsizeof(valor) for valor in unicos.astype(object)),
+        dtype=np.int64, count=len(unicos)
+    )
+    # Los faltantes (código -1) quedan como un NaN por fila
+    tamanos = np.append(tamanos, sys.getsizeof(np.nan))
+    conteos = np.bincount(np.where(codigos < 0, len(unicos), codigos), minlength=len(tamanos))
+    return 8 * filas + int(conteos @ tamanos)
+
+
+def reporte_memoria(frames):
+    """Memoria de cada frame (dict nombre -> DataFrame), en bytes.
+
+    "Sin compactar" estima el mismo frame con columnas object/float64, como
+    las dejaba el flujo anterior a los tipos Arrow y categóricos.
+    """
+    filas = []
+    for nombre, df in frames.items():
+        if df is None:
+            continue
+        filas.append({
+            "Objeto": nombre,
+            "Filas": len(df),
+            "MB": df.memory_usage(deep=True).sum() / 1e6,
+            "MB sin compactar": (
+                sum(_bytes_sin_compactar(df[c]) for c in df.columns) + df.index.memory_usage()
+            ) / 1e6,
+        })
+
+    reporte = pd.DataFrame(filas, columns=["Objeto", "Filas", "MB", "MB sin compactar"])
+    total = reporte[["Filas", "MB", "MB sin compactar"]].sum()
+    reporte.loc[len(reporte)] = ["Total", *total]
+    reporte["Filas"] = reporte["Filas"].astype(int)
+    return reporte.round({"MB": 2, "MB sin compactar": 2})
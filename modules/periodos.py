@@ -0,0 +1,321 @@
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from modules.claves import DiccionarioClaves, guardar_tablas
+from modules.conciliacion import (
+    ResultadoConciliacion,
+    agregar_movimientos,
+    construir_resultado,
+    nombres_por_codigo,
+    normalizar,
+    preparar_movimientos,
+    procedencia_de
+)
+from modules.historial import PERIODO_VALIDO, validar_periodo
+from modules.loader import filas_validas
+from modules.metricas import etapa
+from modules.similares import marcar_similares
+
+DIRECTORIO_PERIODOS = os.environ.get("INVENTARIO_PERIODOS_DIR", ".cache/periodos")
+
+# Estado por lote: una columna por archivo de entrada
+COLUMNAS_ESTADO = {
+    "inicial": "Inicial",
+    "recepciones": "Recepciones",
+    "traslados": "Traslados",
+    "salidas": "Salidas_Bodega",
+    "final": "Final_Sistema",
+}
+FUENTES_ESTADO = list(COLUMNAS_ESTADO.values())
+TEXTO = ["Codigo_Articulo", "Nombre_Producto", "Lote"]
+
+# Bit por fuente: en qué archivos aparece cada lote
+PRESENCIA = "Presencia"
+
+
+class AlmacenPeriodos:
+    """Estado agregado por lote de cada período conciliado (Parquet).
+
+    Por lote se guarda la suma de cada archivo y en cuáles aparece; con eso
+    el período siguiente toma de aquí su inventario inicial y la corrección
+    de un archivo recalcula solo los lotes que ese archivo toca.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_PERIODOS):
+        self.directorio = Path(directorio)
+
+    def de_sede(self, sede):
+        # Cada sede lleva su propia secuencia de períodos
+        return AlmacenPeriodos(self.directorio / sede) if sede else self
+
+    def _ruta(self, periodo, extension):
+        return self.directorio / f"{validar_periodo(periodo)}.{extension}"
+
+    def periodos(self):
+        if not self.directorio.exists():
+            return []
+        return sorted(
+            ruta.stem for ruta in self.directorio.glob("*.parquet")
+            if PERIODO_VALIDO.match(ruta.stem)
+        )
+
+    def anterior(self, periodo):
+        previos = [p for p in self.periodos() if p < periodo]
+        return previos[-1] if previos else None
+
+    def siguiente(self, periodo):
+        posteriores = [p for p in self.periodos() if p > periodo]
+        return posteriores[0] if posteriores else None
+
+    def cargar(self, periodo):
+        ruta = self._ruta(periodo, "parquet")
+        if not ruta.exists():
+            raise ValueError(f"No hay estado guardado del período {periodo}")
+
+        estado = pd.read_parquet(ruta)
+        meta_ruta = self._ruta(periodo, "json")
+        meta = json.loads(meta_ruta.read_text(encoding="utf-8")) if meta_ruta.exists() else {}
+        return estado, meta
+
+    def guardar(self, periodo, estado, meta=None):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+
+        # Texto como diccionario (categorías): compacto en disco
+        compacto = estado.astype({columna: "category" for columna in TEXTO})
+        for ruta, escribir in (
+            (self._ruta(periodo, "parquet"), lambda t: compacto.to_parquet(t, index=False)),
+            (self._ruta(periodo, "json"), lambda t: t.write_text(json.dumps(meta or {}), encoding="utf-8")),
+        ):
+            temporal = ruta.with_suffix(f".{uuid.uuid4().hex}.tmp")
+            try:
+                escribir(temporal)
+                os.replace(temporal, ruta)
+            finally:
+                temporal.unlink(missing_ok=True)
+
+
+almacen_periodos = AlmacenPeriodos()
+
+
+# =========================
+# Estado <-> resultado
+# =========================
+def _bit(fuente):
+    return np.uint8(1 << FUENTES_ESTADO.index(fuente))
+
+
+def _estado(claves, matriz, presencia, diccionario, nombres):
+    # Ordenado por código y lote, como el resultado
+    orden = diccionario.orden(claves)
+    claves = claves[orden]
+    codigos, lotes = diccionario.categoricos(claves)
+    estado = pd.DataFrame(matriz[orden], columns=FUENTES_ESTADO)
+    estado.insert(0, "Codigo_Articulo", codigos)
+    estado.insert(1, "Nombre_Producto", nombres.reindex(diccionario.id_codigo(claves)).array)
+    estado.insert(2, "Lote", lotes)
+    estado[PRESENCIA] = presencia[orden]
+    return estado
+
+
+def _claves_de(estado, diccionario):
+    return diccionario.codificar(estado["Codigo_Articulo"], estado["Lote"])
+
+
+def _nombres_de(estado, claves, diccionario):
+    # Nombre de cada código en el estado (el mismo en todos sus lotes)
+    nombres = pd.Series(estado["Nombre_Producto"].to_numpy(), index=diccionario.id_codigo(claves))
+    return nombres[~nombres.index.duplicated()].astype("category")
+
+
+def _resultado(estado, claves, diccionario, nombres, lotes_similares, procedencia=None, orden=None):
+    # Traslados y salidas de bodega suman en "Salidas", como en conciliar()
+    matriz = np.column_stack([
+        estado["Inicial"].to_numpy(dtype=np.float64),
+        estado["Recepciones"].to_numpy(dtype=np.float64),
+        estado["Traslados"].to_numpy(dtype=np.float64) + estado["Salidas_Bodega"].to_numpy(dtype=np.float64),
+        estado["Final_Sistema"].to_numpy(dtype=np.float64),
+    ])
+    df = construir_resultado(claves, matriz, diccionario, nombres, orden)
+    guardar_tablas()
+
+    similares = None
+    if lotes_similares:
+        df, similares = marcar_similares(df)
+
+    with etapa("resumen", filas=len(df)):
+        return ResultadoConciliacion(df, procedencia, similares)
+
+
+def inventario_final(estado):
+    """El inventario final de un estado como un archivo de inventario.
+
+    Solo los lotes con existencias: es el inicial del período siguiente.
+    """
+    con_stock = estado[estado["Final_Sistema"].to_numpy() != 0]
+    return pd.DataFrame({
+        "CODIGO PRODUCTO": con_stock["Codigo_Articulo"].astype(object).to_numpy(),
+        "NOMBRE PRODUCTO": con_stock["Nombre_Producto"].astype(object).to_numpy(),
+        "LOTE": con_stock["Lote"].astype(object).to_numpy(),
+        "CANTIDAD": con_stock["Final_Sistema"].to_numpy(),
+    })
+
+
+def resultado_periodo(almacen, periodo, lotes_similares=False):
+    """ResultadoConciliacion de un período guardado, sin leer ningún archivo."""
+    estado, _ = almacen.cargar(periodo)
+    diccionario = DiccionarioClaves()
+    claves = _claves_de(estado, diccionario)
+    return _resultado(estado, claves, diccionario, _nombres_de(estado, claves, diccionario), lotes_similares)
+
+
+# =========================
+# Conciliación de un período
+# =========================
+def conciliar_periodo(
+    almacen,
+    periodo,
+    inicial,
+    traslados,
+    recepciones,
+    salidas,
+    final_sistema,
+    lotes_similares=False
+):
+    """Concilia un período como conciliar() y guarda su estado por lote.
+
+    Sin `inicial` (None), el inventario inicial es el final guardado del
+    período anterior en `almacen`: solo se leen los movimientos y el nuevo
+    inventario final. Devuelve un ResultadoConciliacion.
+    """
+    periodo = validar_periodo(periodo)
+    meta = {}
+    nombre_inicial = "inicial"
+    if inicial is None:
+        anterior = almacen.anterior(periodo)
+        if anterior is None:
+            raise ValueError(
+                f"No hay un período anterior a {periodo} del cual tomar el inventario inicial"
+            )
+        estado_anterior, _ = almacen.cargar(anterior)
+        inicial = inventario_final(estado_anterior)
+        meta["inicial_desde"] = anterior
+        nombre_inicial = f"final de {anterior}"
+
+    entradas = {
+        "inicial": inicial,
+        "recepciones": recepciones,
+        "traslados": traslados,
+        "final": final_sistema,
+        "salidas": salidas,
+    }
+    diccionario = DiccionarioClaves()
+    nombres = nombres_por_codigo(inicial, diccionario)
+    movimientos, origenes = preparar_movimientos(entradas, diccionario, COLUMNAS_ESTADO)
+    origenes = [
+        (nombre_inicial if tipo == "inicial" else tipo, df, filas) for tipo, df, filas in origenes
+    ]
+
+    with etapa("agrupar", filas=sum(len(df) for _, df in movimientos)):
+        claves, matriz, posiciones = agregar_movimientos(
+            movimientos, fuentes=FUENTES_ESTADO, con_posiciones=True
+        )
+        presencia = np.zeros(len(claves), dtype=np.uint8)
+        for (fuente, _), lotes in zip(movimientos, posiciones):
+            presencia[lotes] |= _bit(fuente)
+
+    orden = diccionario.orden(claves)
+    with etapa("estado del período", filas=len(claves)):
+        estado = _estado(claves, matriz, presencia, diccionario, nombres)
+        almacen.guardar(periodo, estado, meta)
+
+    procedencia = procedencia_de(claves, orden, origenes, posiciones)
+    return _resultado(
+        estado, claves[orden], diccionario, nombres, lotes_similares,
+        procedencia, orden=np.arange(len(claves))
+    )
+
+
+# =========================
+# Recálculo incremental
+# =========================
+def _reemplazar_fuente(estado, claves, fuente, nuevas, valores, diccionario, nombres):
+    # Sustituye una columna de fuente: solo cambian los lotes que estaban
+    # en el archivo anterior o están en el corregido
+    faltan = pd.Index(claves).get_indexer(nuevas) == -1
+    if faltan.any():
+        codigos, lotes = diccionario.categoricos(nuevas[faltan])
+        nuevos = pd.DataFrame(0.0, index=range(int(faltan.sum())), columns=FUENTES_ESTADO)
+        nuevos.insert(0, "Codigo_Articulo", codigos.astype(object))
+        nuevos.insert(1, "Nombre_Producto", nombres.reindex(diccionario.id_codigo(nuevas[faltan])).to_numpy())
+        nuevos.insert(2, "Lote", lotes.astype(object))
+        nuevos[PRESENCIA] = np.uint8(0)
+        estado = pd.concat([estado.astype({c: object for c in TEXTO}), nuevos], ignore_index=True)
+        claves = np.concatenate([claves, nuevas[faltan]])
+
+    posiciones = pd.Index(claves).get_indexer(nuevas)
+    bit = _bit(fuente)
+    presencia = estado[PRESENCIA].to_numpy(dtype=np.uint8).copy()
+    columna = estado[fuente].to_numpy(dtype=np.float64).copy()
+    columna[(presencia & bit) != 0] = 0
+    columna[posiciones] = valores
+    presencia &= ~bit
+    presencia[posiciones] |= bit
+
+    estado = estado.assign(**{fuente: columna, PRESENCIA: presencia})
+
+    # Lotes que ya no aparecen en ningún archivo
+    quedan = presencia != 0
+    estado, claves = estado[quedan], claves[quedan]
+    orden = diccionario.orden(claves)
+    return estado.iloc[orden].reset_index(drop=True), claves[orden]
+
+
+def corregir_archivo(almacen, periodo, tipo, df, lotes_similares=False, propagar=True):
+    """Reemplaza un archivo ya conciliado de `periodo` por su versión corregida.
+
+    Solo se lee el archivo corregido y solo cambian los lotes que
+    aparecían en el archivo anterior o en el nuevo. Si se corrige el
+    inventario final y el período siguiente tomó de aquí su inicial, la
+    corrección se propaga. Devuelve el ResultadoConciliacion del período
+    (sin procedencia: los demás archivos no se vuelven a leer).
+    """
+    if tipo not in COLUMNAS_ESTADO:
+        raise ValueError(f"Tipo de archivo no reconocido: {tipo}")
+
+    estado, meta = almacen.cargar(periodo)
+    diccionario = DiccionarioClaves()
+    claves = _claves_de(estado, diccionario)
+    nombres = _nombres_de(estado, claves, diccionario)
+    fuente = COLUMNAS_ESTADO[tipo]
+
+    with etapa("corrección", archivo=tipo, filas=0 if df is None else len(df)):
+        if df is not None and not df.empty:
+            if tipo == "inicial":
+                # Los nombres salen solo del inventario inicial, como en conciliar()
+                nombres = nombres_por_codigo(df, diccionario)
+            filas = filas_validas(df, tipo)
+            validas = df if len(filas) == len(df) else df.iloc[filas]
+            nuevas, matriz = agregar_movimientos(
+                [(fuente, normalizar(validas, diccionario, tipo))], fuentes=[fuente]
+            )
+            valores = matriz[:, 0]
+        else:
+            nuevas, valores = np.empty(0, dtype=np.int64), np.empty(0)
+
+        estado, claves = _reemplazar_fuente(estado, claves, fuente, nuevas, valores, diccionario, nombres)
+        if tipo == "inicial":
+            estado["Nombre_Producto"] = nombres.reindex(diccionario.id_codigo(claves)).to_numpy()
+        almacen.guardar(periodo, estado, meta)
+
+    siguiente = almacen.siguiente(periodo)
+    if propagar and tipo == "final" and siguiente is not None:
+        _, meta_siguiente = almacen.cargar(siguiente)
+        if meta_siguiente.get("inicial_desde") == periodo:
+            corregir_archivo(almacen, siguiente, "inicial", inventario_final(estado))
+
+    return _resultado(estado, claves, diccionario, nombres, lotes_similares, orden=np.arange(len(claves)))
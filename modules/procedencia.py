@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from modules.loader import FILA_ENCABEZADO
+
+ARCHIVO = "Archivo"
+FILA = "Fila"
+
+
+class Procedencia:
+    """Índice lote -> filas de los archivos de entrada que lo produjeron.
+
+    Formato CSR: las filas que aportan al lote i del resultado están en
+    `archivo[inicio[i]:inicio[i + 1]]` (qué archivo) y `fila[...]`
+    (posición en ese archivo). Los archivos se guardan tal como se leyeron;
+    no se copian filas.
+
+    Al conciliar solo se guarda el lote de cada fila aportada; el índice
+    se ordena la primera vez que se consulta.
+    """
+
+    def __init__(self, n, aportes):
+        # aportes: lista de (nombre, DataFrame original, lote de cada fila
+        # aportada, posición de esa fila en el DataFrame original)
+        self.n = n
+        self.archivos = [(nombre, df) for nombre, df, _, _ in aportes]
+        self._aportes = [(lotes, filas) for _, _, lotes, filas in aportes]
+        self._lock = threading.Lock()
+        self.inicio = self.archivo = self.fila = None
+
+    def __len__(self):
+        return self.n
+
+    def _indexar(self):
+        with self._lock:
+            if self.inicio is not None:
+                return
+
+            lotes = np.concatenate([l for l, _ in self._aportes])
+            filas = np.concatenate([f for _, f in self._aportes])
+            archivo = np.concatenate([
+                np.full(len(l), i, dtype=np.int8) for i, (l, _) in enumerate(self._aportes)
+            ])
+
+            # Orden estable por lote: dentro de cada lote, archivo y fila
+            orden = np.argsort(lotes, kind="stable")
+            inicio = np.zeros(self.n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(lotes, minlength=self.n), out=inicio[1:])
+
+            self.archivo = archivo[orden]
+            self.fila = filas[orden]
+            self.inicio = inicio
+            self._aportes = None
+
+    def cantidad(self, posicion):
+        self._indexar()
+        return int(self.inicio[posicion + 1] - self.inicio[posicion])
+
+    def filas_de(self, posicion):
+        """Filas de origen del lote en `posicion` (fila del resultado).
+
+        FILA es el número de fila en Excel (el que se ve al abrir el
+        archivo); vacío si el DataFrame no salió de load_excel.
+        """
+        self._indexar()
+        tramo = slice(self.inicio[posicion], self.inicio[posicion + 1])
+        archivos, filas = self.archivo[tramo], self.fila[tramo]
+
+        partes = []
+        for i in np.unique(archivos):
+            nombre, df = self.archivos[i]
+            posiciones = filas[archivos == i]
+            parte = df.iloc[posiciones]
+            parte.insert(0, FILA, fila_excel(df, posiciones))
+            parte.insert(0, ARCHIVO, nombre)
+            partes.append(parte)
+
+        if not partes:
+            return pd.DataFrame(columns=[ARCHIVO, FILA])
+        return pd.concat(partes, ignore_index=True)
+
+
+def fila_excel(df, posiciones):
+    # Encabezado + 1 + fila de datos; el índice conserva la fila de datos
+    # aunque se hayan quitado filas vacías
+    encabezado = df.attrs.get(FILA_ENCABEZADO)
+    if encabezado is None:
+        return pd.array([pd.NA] * len(posiciones), dtype="Int64")
+    return encabezado + 1 + df.index.to_numpy()[posiciones]
+
+
+def _compacto(valores):
+    valores = np.asarray(valores)
+    if len(valores) == 0 or valores.max() < 2 ** 31:
+        return valores.astype(np.int32)
+    return valores.astype(np.int64)
+
+
+def construir_procedencia(n, aportes):
+    """Procedencia de un resultado de `n` lotes (ver Procedencia)."""
+    return Procedencia(n, [
+        (nombre, df, _compacto(lotes), _compacto(filas))
+        for nombre, df, lotes, filas in aportes
+    ])
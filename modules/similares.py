@@ -0,0 +1,185 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from modules.metricas import etapa
+
+# =========================
+# Configuración
+# =========================
+LOTE_SIMILAR = "Posible Lote Mal Digitado"
+MAX_DISTANCIA = 1
+# Lotes más cortos no se comparan: "1" y "2" están a distancia 1
+MIN_LARGO_LOTE = 4
+GRUPOS = ["Codigo_Articulo", "Bodega"]
+
+
+# =========================
+# Distancia
+# =========================
+def distancia(a, b, maximo=MAX_DISTANCIA):
+    """Distancia de edición con transposiciones (OSA), cortada en maximo + 1.
+
+    >>> distancia("L2304A", "L23O4A"), distancia("L2304", "L2340")
+    (1, 1)
+    >>> distancia("L2304", "L2304AB"), distancia("L2304", "X9", maximo=2)
+    (2, 3)
+    """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+
+    anterior, actual = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previa, anterior = anterior, actual
+        actual = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            costo = a[i - 1] != b[j - 1]
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + costo)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                actual[j] = min(actual[j], previa[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+    return min(actual[-1], maximo + 1)
+
+
+# =========================
+# Índice
+# =========================
+_BASE = np.uint64(1_000_003)
+_MEZCLA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _bloques(grupos, lotes, borrados=MAX_DISTANCIA):
+    """Índice de borrados simétricos: (fila, bloque) por cada variante.
+
+    Las variantes de un lote son el lote y todo lo que queda al borrarle
+    hasta `borrados` caracteres; dos lotes a distancia <= `borrados`
+    comparten al menos una. El bloque es un hash de (grupo, variante)
+    calculado por columnas de caracteres, sin armar textos: una colisión
+    solo agrega un candidato, que luego descarta `distancia`.
+    """
+    largos = np.fromiter((len(l) for l in lotes), dtype=np.int64, count=len(lotes))
+    filas, bloques = [], []
+    for largo in np.unique(largos):
+        indices = np.flatnonzero(largos == largo)
+        caracteres = (
+            np.asarray(lotes[indices], dtype=f"U{largo}")
+            .view(np.uint32)
+            .reshape(len(indices), largo)
+            .astype(np.uint64)
+        )
+        semilla = grupos[indices].astype(np.uint64) * _MEZCLA
+        for k in range(min(borrados, largo) + 1):
+            potencias = _BASE ** np.arange(largo - k, dtype=np.uint64)
+            for quitar in combinations(range(largo), k):
+                resto = np.delete(caracteres, quitar, axis=1)
+                filas.append(indices)
+                bloques.append(semilla ^ (resto * potencias).sum(axis=1, dtype=np.uint64))
+    return np.concatenate(filas), np.concatenate(bloques)
+
+
+# =========================
+# Pares
+# =========================
+def _candidatos(df):
+    # Inconsistencias con lote comparable: posición, bloque y signo
+    diferencia = df["Diferencia"].to_numpy()
+    lotes = df["Lote"].astype(str).to_numpy()
+    largos = np.fromiter((len(l) for l in lotes), dtype=np.int64, count=len(lotes))
+    posiciones = np.flatnonzero((diferencia != 0) & (largos >= MIN_LARGO_LOTE))
+
+    # Bloque: código (y bodega si la hay) como un entero
+    grupo = np.zeros(len(df), dtype=np.int64)
+    for columna in GRUPOS:
+        if columna in df.columns:
+            codigos, unicos = pd.factorize(df[columna])
+            grupo = grupo * (len(unicos) + 1) + codigos
+    return posiciones, grupo[posiciones], lotes[posiciones], diferencia[posiciones]
+
+
+def buscar_pares(df, max_distancia=MAX_DISTANCIA):
+    """Parejas de inconsistencias que parecen el mismo lote mal digitado.
+
+    Dentro de cada código (y bodega), une una diferencia positiva con una
+    negativa cuyos lotes están a `max_distancia` ediciones o menos. Cada
+    fila queda en una sola pareja: primero las más parecidas y, a igual
+    distancia, las que mejor se compensan. Devuelve (posiciones sobrantes,
+    posiciones faltantes, distancias) como arreglos alineados.
+    """
+    posiciones, grupos, lotes, diferencias = _candidatos(df)
+    vacio = np.array([], dtype=np.int64)
+    if len(posiciones) == 0:
+        return vacio, vacio, vacio
+
+    # Dos filas del mismo bloque (grupo, variante) son candidatas
+    filas, bloques = _bloques(grupos, lotes, max_distancia)
+    positivo = diferencias[filas] > 0
+    parejas = (
+        pd.DataFrame({"fila": filas[positivo], "bloque": bloques[positivo]})
+        .merge(pd.DataFrame({"fila": filas[~positivo], "bloque": bloques[~positivo]}),
+               on="bloque", suffixes=("_a", "_b"))
+        [["fila_a", "fila_b"]]
+        .drop_duplicates()
+    )
+    if parejas.empty:
+        return vacio, vacio, vacio
+
+    a = parejas["fila_a"].to_numpy()
+    b = parejas["fila_b"].to_numpy()
+    dist = np.array([
+        distancia(lotes[i], lotes[j], max_distancia) for i, j in zip(a, b)
+    ], dtype=np.int64)
+    neta = np.abs(diferencias[a] + diferencias[b])
+
+    # Asignación voraz uno a uno
+    usadas = set()
+    elegidas = []
+    for k in np.lexsort((b, a, neta, dist)):
+        if dist[k] > max_distancia or a[k] in usadas or b[k] in usadas:
+            continue
+        usadas.update((a[k], b[k]))
+        elegidas.append(k)
+
+    elegidas = np.array(elegidas, dtype=np.int64)
+    if len(elegidas) == 0:
+        return vacio, vacio, vacio
+    return posiciones[a[elegidas]], posiciones[b[elegidas]], dist[elegidas]
+
+
+def marcar_similares(df, max_distancia=MAX_DISTANCIA):
+    """Reclasifica las parejas de buscar_pares como LOTE_SIMILAR.
+
+    Devuelve (df con Tipo_Inconsistencia y Lote_Similar, tabla de parejas).
+    """
+    with etapa("lotes similares", filas=len(df)) as datos:
+        sobrantes, faltantes, distancias = buscar_pares(df, max_distancia)
+        datos["detalle"] = f"{len(sobrantes)} parejas"
+
+        df = df.copy()
+        tipos = df["Tipo_Inconsistencia"].astype("category").cat
+        categorias = sorted(set(tipos.categories) | {LOTE_SIMILAR})
+        codigos = tipos.set_categories(categorias).cat.codes.to_numpy().copy()
+        codigos[np.concatenate([sobrantes, faltantes])] = categorias.index(LOTE_SIMILAR)
+        df["Tipo_Inconsistencia"] = pd.Categorical.from_codes(codigos, categories=categorias)
+
+        lotes = df["Lote"].astype(str).to_numpy()
+        similar = np.full(len(df), None, dtype=object)
+        similar[sobrantes] = lotes[faltantes]
+        similar[faltantes] = lotes[sobrantes]
+        df.insert(df.columns.get_loc("Lote") + 1, "Lote_Similar", similar)
+
+        sobrante, faltante = df.iloc[sobrantes], df.iloc[faltantes]
+        pares = pd.DataFrame({
+            columna: sobrante[columna].to_numpy()
+            for columna in ["Codigo_Articulo", "Nombre_Producto", "Bodega"]
+            if columna in df.columns
+        })
+        pares["Lote_Sobrante"] = sobrante["Lote"].to_numpy()
+        pares["Diferencia_Sobrante"] = sobrante["Diferencia"].to_numpy()
+        pares["Lote_Faltante"] = faltante["Lote"].to_numpy()
+        pares["Diferencia_Faltante"] = faltante["Diferencia"].to_numpy()
+        pares["Distancia"] = distancias
+        pares["Diferencia_Neta"] = pares["Diferencia_Sobrante"] + pares["Diferencia_Faltante"]
+
+    return df, pares
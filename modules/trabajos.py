@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from modules.bloques import conciliar_por_bloques
+from modules.bodegas import conciliar_por_bodega
+from modules.conciliacion import conciliar
+from modules.historial import historial
+from modules.ingesta import ORDEN_ARCHIVOS, cargar_archivos
+from modules.instantaneas import instantaneas
+from modules.metricas import Cancelado, Registro, etapa, registrar, reporte_memoria
+from modules.periodos import almacen_periodos, conciliar_periodo, corregir_archivo
+
+# =========================
+# Configuración
+# =========================
+# Compartido por todas las sesiones del servidor
+TRABAJADORES = int(os.environ.get("INVENTARIO_TRABAJADORES", "2"))
+MAX_EN_COLA = int(os.environ.get("INVENTARIO_MAX_EN_COLA", "8"))
+
+EN_COLA = "en cola"
+CORRIENDO = "corriendo"
+LISTO = "listo"
+ERROR = "error"
+CANCELADO = "cancelado"
+TERMINADOS = (LISTO, ERROR, CANCELADO)
+
+
+class ColaLlena(RuntimeError):
+    """No hay lugar en la cola de trabajos."""
+
+
+class Trabajo:
+    """Una ejecución en el pool: estado, progreso y resultado.
+
+    El progreso son las etapas de su Registro (las mismas de "Rendimiento");
+    cancelar() hace que la siguiente etapa lance Cancelado. Un trabajo
+    todavía en cola se cancela sin empezar.
+    """
+
+    def __init__(self, funcion, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.registro = Registro()
+        self.estado = EN_COLA
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.terminado_en = None
+        self._tarea = (funcion, args, kwargs)
+
+    @property
+    def terminado(self):
+        return self.estado in TERMINADOS
+
+    def cancelar(self):
+        self.registro.cancelar()
+
+    def progreso(self):
+        """(etapas terminadas, etapas en curso, segundos desde que se envió)."""
+        terminadas, en_curso = self.registro.progreso()
+        fin = self.terminado_en or time.time()
+        return terminadas, en_curso, fin - self.creado
+
+    def _correr(self):
+        funcion, args, kwargs = self._tarea
+        # Los argumentos (archivos) no se guardan más de lo necesario
+        self._tarea = None
+        try:
+            if self.registro.cancelado:
+                raise Cancelado("Ejecución cancelada")
+            self.estado = CORRIENDO
+            with registrar(self.registro):
+                self.resultado = funcion(*args, **kwargs)
+            # Una etapa cancelada en otro hilo puede quedar como error de
+            # ese archivo: lo que manda es el pedido de cancelación
+            self.estado = CANCELADO if self.registro.cancelado else LISTO
+        except Cancelado:
+            self.estado = CANCELADO
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            self.estado = ERROR
+        finally:
+            self.terminado_en = time.time()
+
+
+class PoolTrabajos:
+    """Hilos compartidos con cola acotada.
+
+    Hay a lo sumo `trabajadores` trabajos corriendo y `max_en_cola`
+    esperando; enviar() lanza ColaLlena si no hay lugar.
+    """
+
+    def __init__(self, trabajadores=TRABAJADORES, max_en_cola=MAX_EN_COLA):
+        self.trabajadores = max(int(trabajadores), 1)
+        self.max_en_cola = max(int(max_en_cola), 0)
+        self._executor = None
+        self._pendientes = 0
+        self._lock = threading.Lock()
+
+    def pendientes(self):
+        with self._lock:
+            return self._pendientes
+
+    def enviar(self, funcion, *args, **kwargs):
+        trabajo = Trabajo(funcion, args, kwargs)
+        with self._lock:
+            if self._pendientes >= self.trabajadores + self.max_en_cola:
+                raise ColaLlena(
+                    f"Hay {self._pendientes} conciliaciones en curso o en espera; intente en un momento"
+                )
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.trabajadores, thread_name_prefix="trabajo"
+                )
+            self._pendientes += 1
+        futuro = self._executor.submit(trabajo._correr)
+        futuro.add_done_callback(self._liberar)
+        return trabajo
+
+    def _liberar(self, _futuro):
+        with self._lock:
+            self._pendientes -= 1
+
+
+pool_trabajos = PoolTrabajos()
+
+
+# =========================
+# Conciliación como trabajo
+# =========================
+def _salida():
+    return {"instantanea": None, "resumen_bodegas": None, "memoria": None, "errores": {}, "avisos": []}
+
+
+def conciliar_archivos(
+    contenidos,
+    todas_bodegas=False,
+    lotes_similares=False,
+    memoria_acotada=False,
+    periodo=None,
+    guardar_historial=True,
+    guardar_estado=False
+):
+    """Lo que hace el botón de conciliar, pensado para correr en el pool.
+
+    `contenidos` es un dict tipo -> bytes (o None). Con `periodo` el
+    resultado se guarda en el historial (salvo `guardar_historial=False`)
+    y, con `guardar_estado`, el estado por lote del período queda en
+    modules/periodos.py: sin inventario inicial, se toma el final del
+    período anterior. Devuelve un dict con "instantanea" (el resultado
+    publicado, ver modules/instantaneas.py), "resumen_bodegas", "memoria",
+    "errores" (tipo -> mensaje) y "avisos" (lista de mensajes que no
+    impiden el resultado).
+    """
+    archivos = {
+        tipo: BytesIO(contenido) if contenido is not None else None
+        for tipo, contenido in contenidos.items()
+    }
+    salida = _salida()
+    errores = salida["errores"]
+    resultado, dfs = None, []
+
+    if memoria_acotada and not todas_bodegas:
+        # Sin DataFrames de entrada: solo sumas por lote
+        with etapa("conciliar"):
+            try:
+                resultado = conciliar_por_bloques(archivos, lotes_similares=lotes_similares)
+            except ValueError as e:
+                errores["conciliación"] = str(e)
+    else:
+        with etapa("ingesta"):
+            dfs, leidos = cargar_archivos(archivos)
+            errores.update(leidos)
+
+        with etapa("conciliar"):
+            if not errores and todas_bodegas:
+                try:
+                    resultado, salida["resumen_bodegas"], sin_inventario = conciliar_por_bodega(
+                        *dfs, lotes_similares=lotes_similares
+                    )
+                except ValueError as e:
+                    errores["conciliación"] = str(e)
+                else:
+                    if sin_inventario:
+                        salida["avisos"].append(
+                            "Sin inventario inicial ni final, no se concilian: "
+                            + ", ".join(sin_inventario)
+                        )
+            elif not errores and guardar_estado:
+                try:
+                    resultado = conciliar_periodo(
+                        almacen_periodos, periodo, *dfs, lotes_similares=lotes_similares
+                    )
+                except ValueError as e:
+                    errores["conciliación"] = str(e)
+            elif not errores:
+                resultado = conciliar(*dfs, lotes_similares=lotes_similares)
+
+    _terminar(salida, resultado, dict(zip(ORDEN_ARCHIVOS, dfs)), periodo if guardar_historial else None)
+    return salida
+
+
+def corregir_periodo(periodo, tipo, contenido, lotes_similares=False, guardar_historial=False):
+    """Reemplaza un archivo de un período guardado (ver corregir_archivo).
+
+    Solo se lee el archivo corregido; `contenido` None lo deja vacío
+    (salidas de bodega). Devuelve el mismo dict que conciliar_archivos.
+    """
+    salida = _salida()
+    errores = salida["errores"]
+    resultado, df = None, None
+
+    if contenido is not None:
+        with etapa("ingesta"):
+            dfs, leidos = cargar_archivos({tipo: BytesIO(contenido)})
+            errores.update(leidos)
+            df = dfs[ORDEN_ARCHIVOS.index(tipo)]
+
+    if not errores:
+        with etapa("conciliar"):
+            try:
+                resultado = corregir_archivo(
+                    almacen_periodos, periodo, tipo, df, lotes_similares=lotes_similares
+                )
+            except ValueError as e:
+                errores["conciliación"] = str(e)
+
+    _terminar(salida, resultado, {tipo: df}, periodo if guardar_historial else None)
+    return salida
+
+
+def _terminar(salida, resultado, leidos, periodo):
+    errores = salida["errores"]
+
+    # Se reemplaza lo guardado antes para el mismo período y bodega
+    if not errores and periodo is not None:
+        with etapa("historial"):
+            try:
+                historial.guardar(periodo, resultado)
+            except ValueError as e:
+                errores["historial"] = str(e)
+
+    # Memoria que ocupa la sesión: archivos leídos y resultado
+    if not errores:
+        with etapa("memoria"):
+            salida["memoria"] = reporte_memoria({**leidos, "resultado": resultado.df})
+
+        # La sesión guarda solo la instantánea; este resultado se libera
+        with etapa("instantánea", filas=len(resultado.df)):
+            salida["instantanea"] = instantaneas.publicar(resultado)
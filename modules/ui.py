@@ -1,132 +1,295 @@
-import streamlit as st
 import base64
+from functools import cache
+
+import pandas as pd
+import streamlit as st
+
+from modules.deteccion import clasificar_archivos, extraer, nombre_de, repetidos
+from modules.ingesta import ORDEN_ARCHIVOS
+
+# =========================
+# Recursos estáticos
+# =========================
+# Se leen y arman una vez por proceso; cada rerun solo los vuelve a enviar
+ICONO = "assets/inventario.png"
+
+ESTILOS = """
+    <style>
+    .column-title {
+        display: flex;
+        justify-content: center;
+        align-items: center;
+        text-align: center;
+        font-weight: 600;
+        font-size: 1.6rem;
+        margin-bottom: 1rem;
+        width: 100%;
+    }
+
+    .column-subtitle {
+        text-align: center;
+        color: #6c757d;
+        font-size: 0.9rem;
+        margin-bottom: 0.75rem;
+    }
+
+    /* Tarjetas normales */
+    .card {
+        background-color: #ffffff;
+        border-radius: 14px;
+        padding: 1.2rem 1.4rem;
+        box-shadow: 0 4px 14px rgba(0,0,0,0.06);
+        border-left: 6px solid #c1121f;
+    }
+
+    .card h4 {
+        margin: 0;
+        font-size: 0.95rem;
+        text-align: center;
+        color: #343a40;
+    }
+
+    .card .count {
+        font-size: 1.8rem;
+        text-align: center;
+        font-weight: 700;
+        margin-top: 0.3rem;
+    }
+
+    /* Tarjeta TOTAL (roja) */
+    .total-card {
+        background-color: #c1121f;
+        border-radius: 14px;
+        padding: 1.2rem 1.4rem;
+        box-shadow: 0 6px 16px rgba(0,0,0,0.12);
+    }
+
+    .total-card h4 {
+        margin: 0;
+        font-size: 0.95rem;
+        text-align: center;
+        color: #ffffff;
+        opacity: 0.9;
+    }
+
+    .total-card .count {
+        font-size: 2.2rem;
+        text-align: center;
+        font-weight: 800;
+        margin-top: 0.3rem;
+        color: #ffffff;
+    }
+
+    .header-box {
+        background-color: #f8f9fa;
+        border-left: 6px solid #c1121f;
+        padding: 1.5rem 2rem;
+        border-radius: 12px;
+        margin-bottom: 1.5rem;
+        display: flex;
+        align-items: center;
+        justify-content: space-between;
+    }
+
+    .header-text h1 {
+        margin: 0;
+    }
+
+    .header-text p {
+        margin: 0.2rem 0 0;
+        color: #6c757d;
+    }
 
+    .header-icon img {
+        width: 120px;
+        opacity: 0.9;
+        margin-right: 20px;
+    }
+    </style>
+    """
+
+
+@cache
 def img_to_base64(path):
     with open(path, "rb") as f:
         return base64.b64encode(f.read()).decode()
 
 
-def upload_section():
-    icono = img_to_base64("assets/inventario.png")
-
-    st.markdown(
-        f"""
-        <style>
-        .header-box {{
-            background-color: #f8f9fa;
-            border-left: 6px solid #c1121f;
-            padding: 1.5rem 2rem;
-            border-radius: 12px;
-            margin-bottom: 1.5rem;
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-        }}
-
-        .header-text h1 {{
-            margin: 0;
-        }}
-
-        .header-text p {{
-            margin: 0.2rem 0 0;
-            color: #6c757d;
-        }}
-
-        .header-icon img {{
-            width: 64px;
-            opacity: 0.9;
-        }}
-        </style>
-
-        <div class="header-box">
-            <div class="header-text">
-                <h1>Conciliación de Inventario Farmacéutico</h1>
-                <p>Control de traslados, salidas y recepciones</p>
-            </div>
-            <div class="header-icon">
-                <img src="data:image/png;base64,{icono}">
-            </div>
+@cache
+def encabezado():
+    return f"""
+    <div class="header-box">
+        <div class="header-text">
+            <h1>Conciliación de Inventario Farmacéutico</h1>
+            <p>Control de traslados, salidas y recepciones</p>
         </div>
-        """,
-        unsafe_allow_html=True
-    )
+        <div class="header-icon">
+            <img src="data:image/png;base64,{img_to_base64(ICONO)}">
+        </div>
+    </div>
+    """
 
 
+def mostrar_encabezado():
+    st.markdown(ESTILOS, unsafe_allow_html=True)
+    st.markdown(encabezado(), unsafe_allow_html=True)
     st.markdown("---")
 
-    col1, col2 = st.columns(2)
 
-    with col1:
-        st.markdown("### 📦 Inventario Base")
+# ======================
+# UI – SECCIÓN DE CARGA
+# ======================
+def uploader_con_estado(label, icon, key, obligatorio=True):
+    f_col, s_col = st.columns([4, 1], vertical_alignment="center")
 
-        inicial = st.file_uploader(
-            "📘 Inventario Inicial",
+    with f_col:
+        archivo = st.file_uploader(
+            f"{icon} {label}",
             type=["xlsx", "xls"],
-            key="inicial"
+            key=key
         )
 
-        traslados = st.file_uploader(
-            "📤 Traslados (Salidas internas)",
-            type=["xlsx", "xls"],
-            key="traslados"
+    with s_col:
+        if archivo:
+            st.markdown("✅")
+        else:
+            if obligatorio:
+                st.markdown("❌")
+            else:
+                st.markdown("➖")
+
+    return archivo
+
+
+def upload_section():
+
+    col1, col2 = st.columns(2)
+
+    # ======================
+    # COLUMNA IZQUIERDA
+    # ======================
+    with col1:
+        st.markdown(
+            "<div class='column-title'>📦 Inventario inicial y final</div>",
+            unsafe_allow_html=True
         )
 
-    with col2:
-        st.markdown("### 🔄 Movimientos y Cierre")
+        inicial = uploader_con_estado(
+            "Inventario Inicial", "📘", "inicial"
+        )
+        final = uploader_con_estado(
+            "Inventario Final", "📕", "final"
+        )
 
-        recepciones = st.file_uploader(
-            "📥 Recepciones (Entradas)",
-            type=["xlsx", "xls"],
-            key="recepciones"
+    # ======================
+    # COLUMNA DERECHA
+    # ======================
+    with col2:
+        st.markdown(
+            "<div class='column-title'>🔄 Recepciones y traslados</div>",
+            unsafe_allow_html=True
         )
 
-        final = st.file_uploader(
-            "📊 Inventario Final (Sistema)",
-            type=["xlsx", "xls"],
-            key="final"
+        recepciones = uploader_con_estado(
+            "Recepciones (Entradas)", "📥", "recepciones"
+        )
+        traslados = uploader_con_estado(
+            "Traslados (Salidas internas)", "📤", "traslados"
         )
 
     st.markdown("---")
 
-    # =========================
-    # SALIDAS DE BODEGA (CONDICIONAL)
-    # =========================
+    # ======================
+    # SALIDAS DE BODEGA
+    # ======================
     st.markdown("### 🚚 Salidas de bodega")
-
-    hubo_salidas = st.checkbox(
-        "¿Hubo salidas de la bodega?",
-        key="hubo_salidas"
-    )
+    hubo_salidas = st.checkbox("¿Hubo salidas de la bodega?", key="hubo_salidas")
 
     salidas = None
     if hubo_salidas:
-        salidas = st.file_uploader(
-            "📦 Archivo de salidas de bodega",
-            type=["xlsx", "xls"],
-            key="salidas_bodega"
+        salidas = uploader_con_estado(
+            "Salidas de bodega", "🚚", "salidas", obligatorio=False
         )
 
-    st.markdown("---")
+    return inicial, traslados, recepciones, salidas, final
 
-    # =========================
-    # ESTADO DE CARGA
-    # =========================
-    st.markdown("### 🧾 Estado de carga")
-
-    c1, c2, c3, c4, c5 = st.columns(5)
-
-    with c1:
-        st.success("✔ Inicial") if inicial else st.warning("❌ Inicial")
-    with c2:
-        st.success("✔ Traslados") if traslados else st.warning("❌ Traslados")
-    with c3:
-        st.success("✔ Recepciones") if recepciones else st.warning("❌ Recepciones")
-    with c4:
-        st.success("✔ Final") if final else st.warning("❌ Final")
-    with c5:
-        if hubo_salidas:
-            st.success("✔ Salidas") if salidas else st.warning("❌ Salidas")
-        else:
-            st.info("➖ No aplica")
 
-    return inicial, traslados, recepciones, salidas, final
+# ======================
+# UI – CARGA MASIVA
+# ======================
+class ArchivoReconocido:
+    """Archivo (o miembro de un ZIP) de la carga masiva.
+
+    Los bytes se leen del archivo subido recién al conciliar; la sesión
+    guarda solo nombres y tipos.
+    """
+
+    def __init__(self, subido, miembro=None):
+        self.subido = subido
+        self.miembro = miembro
+
+    @property
+    def name(self):
+        return self.miembro or self.subido.name
+
+    def getvalue(self):
+        return extraer(self.subido.getvalue(), self.miembro)
+
+
+def carga_masiva():
+    """Varios Excel o un ZIP; el tipo de cada archivo se reconoce solo.
+
+    Devuelve un dict tipo -> archivo, como upload_section; vacío mientras
+    haya un tipo repetido.
+    """
+    subidos = st.file_uploader(
+        "📂 Archivos del período (varios Excel o un ZIP)",
+        type=["xlsx", "xls", "zip"],
+        accept_multiple_files=True,
+        key="masivo"
+    )
+    if not subidos:
+        return {}
+
+    # Se clasifica una vez por conjunto de archivos, no en cada rerun
+    clave = tuple((archivo.name, archivo.file_id) for archivo in subidos)
+    guardada = st.session_state.get("clasificacion")
+    if guardada is None or guardada[0] != clave:
+        with st.spinner("Reconociendo archivos..."):
+            clasificados, problemas = clasificar_archivos(
+                [(archivo.name, archivo.getvalue()) for archivo in subidos]
+            )
+        st.session_state["clasificacion"] = (clave, clasificados, problemas)
+    _, clasificados, problemas = st.session_state["clasificacion"]
+
+    st.dataframe(
+        pd.DataFrame(
+            [
+                (tipo, nombre_de(origen))
+                for tipo in ORDEN_ARCHIVOS
+                for origen in clasificados.get(tipo, [])
+            ],
+            columns=["Tipo", "Archivo"]
+        ),
+        use_container_width=True,
+        hide_index=True
+    )
+    for problema in problemas:
+        st.warning(f"⚠️ {problema}")
+
+    dobles = repetidos(clasificados)
+    if dobles:
+        st.error(
+            "❌ Hay más de un archivo de " + ", ".join(dobles)
+            + ": quite los que sobran para conciliar"
+        )
+        return {}
+
+    por_nombre = {archivo.name: archivo for archivo in subidos}
+    if len(por_nombre) < len(subidos):
+        st.error("❌ Hay dos archivos subidos con el mismo nombre: quite uno para conciliar")
+        return {}
+    return {
+        tipo: ArchivoReconocido(por_nombre[nombre], miembro)
+        for tipo, [(nombre, miembro)] in clasificados.items()
+    }
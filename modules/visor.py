@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+# =========================
+# Configuración
+# =========================
+COLUMNAS_BUSQUEDA = ["Codigo_Articulo", "Nombre_Producto", "Lote"]
+TIPO = "Tipo_Inconsistencia"
+FILAS_POR_PAGINA = 100
+MAX_BUSQUEDAS_CACHE = 32
+
+# Etiqueta -> (columna, descendente, valor absoluto). None = orden original
+ORDENES = {
+    "Código y lote": None,
+    "Mayor diferencia (absoluta)": ("Diferencia", True, True),
+    "Diferencia (de menor a mayor)": ("Diferencia", False, False),
+    "Diferencia (de mayor a menor)": ("Diferencia", True, False),
+    "Nombre del producto": ("Nombre_Producto", False, False),
+}
+
+
+class Visor:
+    """Páginas de una tabla grande sin enviarla completa al navegador.
+
+    Los órdenes y el índice de búsqueda se arman una vez (los órdenes al
+    pedirse por primera vez); cada página solo cruza arreglos de posiciones.
+    """
+
+    def __init__(self, df, posiciones_por_tipo=None):
+        self.df = df
+        self._ordenes = {}
+        self._busquedas = {}
+        self._filtradas = {}
+
+        # Búsqueda sobre los valores distintos de cada columna: un código
+        # por fila y el texto en mayúsculas de cada valor
+        self._indices = {}
+        for columna in COLUMNAS_BUSQUEDA:
+            codigos, unicos = self._codigos(self.df[columna])
+            texto = pd.Index(unicos).astype(str).str.upper()
+            self._indices[columna] = (codigos, texto)
+
+        # Posiciones de cada tipo (ResultadoConciliacion ya las trae)
+        if posiciones_por_tipo is None and TIPO in self.df.columns:
+            codigos, tipos = self._codigos(self.df[TIPO])
+            posiciones_por_tipo = {
+                tipo: np.flatnonzero(codigos == i) for i, tipo in enumerate(tipos)
+            }
+        self._por_tipo = posiciones_por_tipo or {}
+
+    def __len__(self):
+        return len(self.df)
+
+    @staticmethod
+    def _codigos(serie):
+        # Categóricos: los códigos ya existen; el resto se factoriza
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            return serie.cat.codes.to_numpy(), serie.cat.categories
+        return pd.factorize(serie)
+
+    # ===============================
+    # Órdenes
+    # ===============================
+    def orden(self, nombre):
+        # Posiciones de las filas en el orden pedido (se calcula una vez)
+        if nombre not in self._ordenes:
+            criterio = ORDENES[nombre]
+            if criterio is None:
+                posiciones = np.arange(len(self.df))
+            else:
+                columna, descendente, absoluto = criterio
+                serie = self.df[columna]
+                if pd.api.types.is_numeric_dtype(serie):
+                    valores = serie.to_numpy()
+                elif isinstance(serie.dtype, pd.CategoricalDtype):
+                    # Las categorías del resultado están en orden alfabético;
+                    # los vacíos (-1) van al final
+                    valores = serie.cat.codes.to_numpy().astype(np.int64)
+                    valores[valores < 0] = len(serie.cat.categories)
+                else:
+                    valores = pd.factorize(serie, sort=True)[0]
+                if absoluto:
+                    valores = np.abs(valores)
+                if descendente:
+                    valores = -valores
+                # Estable: a igual valor se mantiene el orden por código y lote
+                posiciones = np.argsort(valores, kind="stable")
+            self._ordenes[nombre] = posiciones
+        return self._ordenes[nombre]
+
+    # ===============================
+    # Filtros
+    # ===============================
+    def buscar(self, texto):
+        # Máscara de filas con `texto` en código, nombre o lote
+        texto = (texto or "").strip().upper()
+        if not texto:
+            return None
+
+        if texto not in self._busquedas:
+            mascara = np.zeros(len(self.df), dtype=bool)
+            for codigos, unicos in self._indices.values():
+                coincide = unicos.str.contains(texto, regex=False)
+                # El código -1 (vacío) cae en el False agregado al final
+                mascara |= np.append(coincide, False)[codigos]
+            if len(self._busquedas) >= MAX_BUSQUEDAS_CACHE:
+                self._busquedas.pop(next(iter(self._busquedas)))
+            self._busquedas[texto] = mascara
+        return self._busquedas[texto]
+
+    def del_tipo(self, tipo):
+        if tipo is None or tipo == "Todas":
+            return None
+        return self._por_tipo.get(tipo, np.array([], dtype=np.intp))
+
+    def posiciones(self, orden=None, texto=None, tipo=None):
+        orden = orden or next(iter(ORDENES))
+
+        # Orden y tipo: se cruzan una vez por combinación
+        clave = (orden, tipo)
+        if clave not in self._filtradas:
+            posiciones = self.orden(orden)
+            del_tipo = self.del_tipo(tipo)
+            if del_tipo is not None and ORDENES[orden] is None:
+                posiciones = del_tipo
+            elif del_tipo is not None:
+                mascara = np.zeros(len(self.df), dtype=bool)
+                mascara[del_tipo] = True
+                posiciones = posiciones[mascara[posiciones]]
+            self._filtradas[clave] = posiciones
+        posiciones = self._filtradas[clave]
+
+        mascara = self.buscar(texto)
+        if mascara is not None:
+            posiciones = posiciones[mascara[posiciones]]
+        return posiciones
+
+    # ===============================
+    # Consulta
+    # ===============================
+    def filtrar(self, orden=None, texto=None, tipo=None):
+        return self.df.iloc[self.posiciones(orden, texto, tipo)]
+
+    def pagina(self, numero=0, tamano=FILAS_POR_PAGINA, orden=None, texto=None, tipo=None):
+        """Devuelve (filas de la página, total de filas que cumplen el filtro)."""
+        posiciones = self.posiciones(orden, texto, tipo)
+        inicio = max(numero, 0) * tamano
+        pagina = self.df.iloc[posiciones[inicio:inicio + tamano]]
+        # Arrow envía todas las categorías de cada columna: con las del
+        # resultado completo, una página de 100 filas pesaba megabytes
+        categoricas = {
+            columna: pagina[columna].cat.remove_unused_categories()
+            for columna in pagina.select_dtypes("category").columns
+        }
+        if categoricas:
+            pagina = pagina.assign(**categoricas)
+        return pagina, len(posiciones)
+
+
+def paginas(total, tamano=FILAS_POR_PAGINA):
+    return max(1, -(-total // tamano))
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+import pytest
+
+# Antes de importar los módulos: cachés, tablas e historial de las pruebas
+# van a un directorio temporal, no a .cache/ del repositorio
+_TEMPORAL = tempfile.mkdtemp(prefix="inventario-pruebas-")
+for variable, nombre in [
+    ("INVENTARIO_CACHE_DIR", "lecturas"),
+    ("INVENTARIO_CANONICOS_DIR", "canonicos"),
+    ("INVENTARIO_INSTANTANEAS_DIR", "instantaneas"),
+    ("INVENTARIO_DESBORDE_DIR", "desborde"),
+    ("INVENTARIO_HISTORIAL_DB", "historial.sqlite"),
+    ("INVENTARIO_PERIODOS_DIR", "periodos"),
+]:
+    os.environ[variable] = os.path.join(_TEMPORAL, nombre)
+
+from benchmarks.generador import escribir_periodo, generar_periodo  # noqa: E402
+from modules.ingesta import ORDEN_ARCHIVOS  # noqa: E402
+from modules.loader import load_excel  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def carpeta_periodo(tmp_path_factory):
+    """Un período sintético chico escrito como exports del ERP (xlsx y HTML)."""
+    carpeta = tmp_path_factory.mktemp("periodo")
+    escribir_periodo(generar_periodo(filas=3_000, semilla=3), carpeta)
+    return carpeta
+
+
+@pytest.fixture(scope="session")
+def dfs(carpeta_periodo):
+    """Los cinco archivos leídos con load_excel, en ORDEN_ARCHIVOS."""
+    rutas = {ruta.stem: ruta for ruta in carpeta_periodo.iterdir()}
+    leidos = []
+    for tipo in ORDEN_ARCHIVOS:
+        with open(rutas[tipo], "rb") as f:
+            leidos.append(load_excel(f, tipo))
+    return leidos
@@ -0,0 +1,45 @@
+import pandas as pd
+import pytest
+
+from modules.bloques import BYTES_POR_CLAVE, conciliar_por_bloques
+from modules.conciliacion import conciliar
+from modules.metricas import registrar
+
+
+@pytest.fixture(scope="module")
+def rutas(carpeta_periodo):
+    return {ruta.stem: ruta for ruta in carpeta_periodo.iterdir()}
+
+
+@pytest.fixture(scope="module")
+def completo(dfs):
+    return conciliar(*dfs, lotes_similares=True)
+
+
+def comparar(resultado, completo):
+    pd.testing.assert_frame_equal(resultado.df, completo.df)
+    pd.testing.assert_frame_equal(resultado.similares, completo.similares)
+    pd.testing.assert_frame_equal(resultado.resumen, completo.resumen)
+
+
+def test_por_bloques_es_conciliar(rutas, completo, tmp_path):
+    resultado = conciliar_por_bloques(
+        rutas, filas_por_bloque=500, directorio=tmp_path, lotes_similares=True
+    )
+    comparar(resultado, completo)
+    assert resultado.procedencia is None
+
+
+def test_con_desborde_es_conciliar(rutas, completo, tmp_path):
+    # Tope para unas 200 claves: las sumas se reparten en disco
+    with registrar() as registro:
+        resultado = conciliar_por_bloques(
+            rutas, memoria_max=2 * 200 * BYTES_POR_CLAVE, filas_por_bloque=500,
+            directorio=tmp_path, lotes_similares=True
+        )
+    comparar(resultado, completo)
+
+    etapas = registro.a_dataframe().set_index("etapa")
+    assert etapas.loc["agrupar", "detalle"] != "0 desbordes"
+    # Las particiones se borran al terminar
+    assert list(tmp_path.rglob("*.*")) == []
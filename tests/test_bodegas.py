@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from modules.bodegas import BODEGA, conciliar_por_bodega
+from modules.conciliacion import conciliar
+from modules.loader import BODEGA_PRINCIPAL, filas_validas, limpiar_bodega
+
+
+def inventario(filas, con_bodega=True):
+    df = pd.DataFrame(filas, columns=["BODEGA", "CODIGO PRODUCTO", "LOTE", "CANTIDAD"])
+    df["NOMBRE PRODUCTO"] = "PRODUCTO " + df["CODIGO PRODUCTO"]
+    return df if con_bodega else df.drop(columns="BODEGA")
+
+
+def movimientos(filas):
+    df = pd.DataFrame(filas, columns=["BODEGA ORIGEN", "CODIGO PRODUCTO", "LOTE", "CANTIDAD"])
+    df["NOMBRE PRODUCTO"] = "PRODUCTO " + df["CODIGO PRODUCTO"]
+    return df
+
+
+def recepciones(filas):
+    df = pd.DataFrame(filas, columns=["CODIGO PRODUCTO", "LOTE", "CANTIDAD"])
+    df["PROVEEDOR"] = "DISTRIBUIDORA"
+    return df
+
+
+SOTANO, CIRUGIA = BODEGA_PRINCIPAL, "CIRUGIA"
+
+
+def test_el_resultado_de_la_principal_es_el_de_conciliar(dfs):
+    resultado, resumen, _ = conciliar_por_bodega(*dfs)
+    principal = resultado.de_bodega(SOTANO).df.drop(columns=BODEGA).reset_index(drop=True)
+    esperado = conciliar(*dfs).df.reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(principal, esperado, check_categorical=False)
+    assert list(principal.dtypes) == list(esperado.dtypes)
+
+
+def test_bodegas_sin_inventario_quedan_fuera():
+    # Inventarios sin columna BODEGA: son de la principal
+    inicial = inventario([(None, "1", "A", 10)], con_bodega=False)
+    final = inventario([(None, "1", "A", 7)], con_bodega=False)
+    traslados = movimientos([(SOTANO, "1", "A", 3), (CIRUGIA, "2", "B", 4)])
+
+    resultado, resumen, sin_inventario = conciliar_por_bodega(
+        inicial, traslados, recepciones([]), None, final
+    )
+    assert sin_inventario == [CIRUGIA]
+    assert resumen[BODEGA].tolist() == [SOTANO]
+    assert resultado.total_inconsistencias == 0
+
+
+def test_nombres_de_bodega_limpios_y_sin_nan():
+    inicial = inventario([
+        ("  servicio  farmaceutico sotano ", "1", "A", 10),
+        (CIRUGIA, "1", "A", 5),
+        (np.nan, "9", "Z", 99),
+    ])
+    final = inventario([(SOTANO, "1", "A", 8), ("cirugia", "1", "A", 5)])
+    traslados = movimientos([(" Servicio Farmaceutico Sotano", "1", "A", 2), (np.nan, "1", "A", 50)])
+
+    resultado, resumen, _ = conciliar_por_bodega(inicial, traslados, recepciones([]), None, final)
+    assert sorted(resumen[BODEGA]) == [CIRUGIA, SOTANO]
+    assert "NAN" not in set(resultado.df[BODEGA].astype(str))
+    assert resultado.total_inconsistencias == 0
+
+    # La conciliación de una bodega toma el mismo traslado
+    assert filas_validas(traslados, "traslados").tolist() == [0]
+    assert limpiar_bodega(traslados["BODEGA ORIGEN"]).isna().tolist() == [False, True]
+
+
+def test_en_procesos_mismos_tipos(dfs):
+    inicial = inventario([(SOTANO, "1", "A", 10), (CIRUGIA, "2", "B", 5), ("URGENCIAS", "3", "C", 1)])
+    final = inventario([(SOTANO, "1", "A", 9), (CIRUGIA, "2", "B", 5), ("URGENCIAS", "3", "C", 2)])
+    archivos = (inicial, movimientos([(SOTANO, "1", "A", 1)]), recepciones([]), None, final)
+
+    uno, _, _ = conciliar_por_bodega(*archivos)
+    varios, _, _ = conciliar_por_bodega(*archivos, procesos=2)
+    pd.testing.assert_frame_equal(uno.df, varios.df, check_categorical=False)
+    for columna in ["Bodega", "Codigo_Articulo", "Nombre_Producto", "Lote", "Tipo_Inconsistencia"]:
+        assert isinstance(varios.df[columna].dtype, pd.CategoricalDtype), columna
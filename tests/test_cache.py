@@ -0,0 +1,85 @@
+import os
+import time
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+from modules.cache import CacheLecturas, load_excel_cached
+from modules.metricas import registrar
+
+
+@pytest.fixture(scope="module")
+def contenido(carpeta_periodo):
+    return (carpeta_periodo / "inicial.xlsx").read_bytes()
+
+
+def leer(cache, contenido, tipo="inicial"):
+    return load_excel_cached(BytesIO(contenido), tipo, cache)
+
+
+def test_aciertos_en_memoria_y_disco(tmp_path, contenido):
+    cache = CacheLecturas(directorio=tmp_path)
+    with registrar() as metricas:
+        primero = leer(cache, contenido)
+        segundo = leer(cache, contenido)
+    assert cache.resumen() == {"memoria": 1, "disco": 0, "fallos": 1, "en_memoria": 1, "aciertos": 1}
+    assert metricas.a_dataframe()["detalle"].tolist().count("acierto") == 1
+    pd.testing.assert_frame_equal(primero, segundo)
+    assert primero.attrs == segundo.attrs
+    # Cada lectura es una copia: modificarla no toca la caché
+    segundo["CANTIDAD"] = 0
+    pd.testing.assert_frame_equal(leer(cache, contenido), primero)
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    assert list(tmp_path.glob("*.tmp")) == []
+
+    # Otro proceso: solo el disco, con los mismos tipos
+    otra = CacheLecturas(directorio=tmp_path)
+    desde_disco = leer(otra, contenido)
+    pd.testing.assert_frame_equal(desde_disco, primero)
+    assert otra.resumen()["disco"] == 1 and otra.resumen()["fallos"] == 0
+    # El mismo archivo como otro tipo es otra entrada
+    leer(otra, contenido, tipo="final")
+    assert otra.resumen()["fallos"] == 1
+
+
+def test_memoria_lru(contenido):
+    cache = CacheLecturas(directorio=None, max_entradas=2)
+    for tipo in ["inicial", "final", "inicial", "traslados"]:
+        cache.guardar(cache.clave(contenido, tipo), pd.DataFrame({"tipo": [tipo]}))
+    # "final" era el menos usado
+    assert cache.obtener(cache.clave(contenido, "final")) is None
+    assert cache.obtener(cache.clave(contenido, "inicial")) is not None
+    assert cache.resumen()["en_memoria"] == 2
+
+
+def test_desalojo_por_edad_y_tamano(tmp_path):
+    cache = CacheLecturas(directorio=tmp_path, max_edad=3600)
+    df = pd.DataFrame({"CANTIDAD": range(1000)})
+    for nombre in ["vieja", "usada", "nueva"]:
+        cache.guardar(nombre, df)
+    ahora = time.time()
+    os.utime(tmp_path / "vieja.parquet", (ahora - 7200, ahora - 7200))
+    os.utime(tmp_path / "usada.parquet", (ahora - 60, ahora - 60))
+
+    # Por edad: sale la que pasó max_edad sin uso
+    cache.desalojar()
+    assert sorted(r.stem for r in tmp_path.glob("*.parquet")) == ["nueva", "usada"]
+
+    # Por tamaño: salen primero las menos usadas
+    cache.max_bytes = (tmp_path / "nueva.parquet").stat().st_size
+    cache.desalojar()
+    assert [r.stem for r in tmp_path.glob("*.parquet")] == ["nueva"]
+
+    # Leer una entrada renueva su fecha
+    os.utime(tmp_path / "nueva.parquet", (ahora - 60, ahora - 60))
+    CacheLecturas(directorio=tmp_path).obtener("nueva")
+    assert (tmp_path / "nueva.parquet").stat().st_mtime > ahora - 1
+
+
+def test_archivo_corrupto_se_descarta(tmp_path):
+    (tmp_path / "rota.parquet").write_bytes(b"no es parquet")
+    cache = CacheLecturas(directorio=tmp_path)
+    assert cache.obtener("rota") is None
+    assert not (tmp_path / "rota.parquet").exists()
+    assert cache.resumen()["fallos"] == 1
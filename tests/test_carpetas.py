@@ -0,0 +1,67 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from modules.carpetas import conciliar_carpeta, detectar_archivos
+from modules.conciliacion import conciliar
+from modules.historial import Historial
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+
+
+def test_detectar_archivos(carpeta_periodo, tmp_path):
+    archivos, problemas = detectar_archivos(carpeta_periodo)
+    assert problemas == []
+    assert {tipo: ruta.name for tipo, ruta in archivos.items()} == {
+        ruta.stem: ruta.name for ruta in carpeta_periodo.iterdir()
+    }
+
+    shutil.copy(carpeta_periodo / "inicial.xlsx", tmp_path / "inventario inicial.xlsx")
+    _, problemas = detectar_archivos(tmp_path)
+    assert problemas == ["Faltan archivos: traslados, recepciones, final"]
+
+
+def test_conciliar_carpeta(carpeta_periodo, dfs, tmp_path):
+    fila = conciliar_carpeta(carpeta_periodo, tmp_path, formato="parquet", lotes_similares=True)
+    esperado = conciliar(*dfs, lotes_similares=True)
+
+    assert fila["Estado"] == "ok", fila["Error"]
+    assert fila["Lotes"] == len(esperado.df)
+    assert fila["Inconsistencias"] == esperado.total_inconsistencias
+    escrito = pd.read_parquet(tmp_path / "conciliacion.parquet")
+    assert escrito["Diferencia"].tolist() == esperado.df["Diferencia"].tolist()
+    assert (tmp_path / "metricas.json").exists()
+    assert (tmp_path / "lotes_similares.csv").exists()
+
+
+def test_cli(carpeta_periodo, dfs, tmp_path):
+    raiz = tmp_path / "historico"
+    shutil.copytree(carpeta_periodo, raiz / "2024-03" / "norte")
+    shutil.copytree(carpeta_periodo, raiz / "2024-04" / "norte")
+    (raiz / "2024-04" / "sur").mkdir()
+    shutil.copy(carpeta_periodo / "inicial.xlsx", raiz / "2024-04" / "sur")
+    base = tmp_path / "historial.sqlite"
+
+    proceso = subprocess.run(
+        [
+            sys.executable, "conciliar_carpetas.py", str(raiz),
+            "--salida", str(tmp_path / "salida"), "--formato", "csv",
+            "--historial", str(base), "--procesos", "2",
+        ],
+        cwd=RAIZ_REPO, capture_output=True, text=True, timeout=300
+    )
+    # Una carpeta con error: el código de salida lo avisa
+    assert proceso.returncode == 1, proceso.stderr
+    assert "2024-04/sur: ERROR Faltan archivos" in proceso.stderr
+
+    resumen = pd.read_csv(tmp_path / "salida" / "resumen.csv").set_index("Carpeta")
+    esperado = conciliar(*dfs)
+    assert resumen["Estado"].to_dict() == {"2024-03/norte": "ok", "2024-04/norte": "ok", "2024-04/sur": "error"}
+    assert resumen.loc["2024-03/norte", "Inconsistencias"] == esperado.total_inconsistencias
+    assert (tmp_path / "salida" / "2024-04" / "norte" / "conciliacion.csv").exists()
+
+    cargas = Historial(base).cargas()
+    assert cargas[["Periodo", "Sede"]].values.tolist() == [["2024-03", "norte"], ["2024-04", "norte"]]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.claves import DiccionarioClaves
+from modules.conciliacion import (
+    calcular,
+    clasificar,
+    clasificar_inconsistencia,
+    nombres_por_codigo,
+)
+
+
+def cuadro(filas):
+    df = pd.DataFrame(filas, columns=["Inicial", "Recepciones", "Salidas", "Final_Sistema"], dtype=float)
+    df["Final_Calculado"] = df["Inicial"] + df["Recepciones"] - df["Salidas"]
+    df["Diferencia"] = df["Final_Sistema"] - df["Final_Calculado"]
+    return df
+
+
+def comparar(df):
+    esperado = df.apply(clasificar_inconsistencia, axis=1)
+    obtenido = clasificar(df)
+    assert obtenido.astype(str).tolist() == esperado.tolist()
+    return obtenido
+
+
+# Una fila por rama de clasificar_inconsistencia
+@pytest.mark.parametrize("fila, etiqueta", [
+    ((10, 5, 5, 10), "Sin Inconsistencia"),
+    ((10, 0, 0, 15), "Inconsistencia de Recepción"),
+    ((10, 0, 0, 5), "Inconsistencia de Traslado"),
+    ((10, 5, 3, 20), "Inconsistencia en Salidas"),
+    ((10, 5, 0, 12), "Inconsistencia de Inventario"),
+])
+def test_cada_regla(fila, etiqueta):
+    assert comparar(cuadro([fila])).iloc[0] == etiqueta
+
+
+def test_cuadro_aleatorio():
+    rng = np.random.default_rng(1234)
+    # Valores chicos: muchos empates y ceros, que es donde las reglas se cruzan
+    df = cuadro(rng.integers(0, 6, size=(20_000, 4)))
+    obtenido = comparar(df)
+    assert set(obtenido.astype(str)) == {
+        "Sin Inconsistencia",
+        "Inconsistencia de Recepción",
+        "Inconsistencia de Traslado",
+        "Inconsistencia en Salidas",
+        "Inconsistencia de Inventario",
+    }
+
+
+def test_calcular_clasifica_igual_que_apply():
+    rng = np.random.default_rng(7)
+    df = calcular(pd.DataFrame(
+        rng.integers(0, 30, size=(1_000, 4)).astype(float),
+        columns=["Inicial", "Recepciones", "Salidas", "Final_Sistema"]
+    ))
+    comparar(df)
+
+
+def test_un_nombre_por_codigo():
+    # Un código con dos nombres no duplica sus lotes: gana el primero
+    inicial = pd.DataFrame({
+        "CODIGO PRODUCTO": ["001", "1", "2"],
+        "NOMBRE PRODUCTO": ["ACETAMINOFEN", "ACETAMINOFEN 500", "IBUPROFENO"],
+    })
+    nombres = nombres_por_codigo(inicial, DiccionarioClaves())
+    assert len(nombres) == 2
+    assert list(nombres.astype(str)) == ["ACETAMINOFEN", "IBUPROFENO"]
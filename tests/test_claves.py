@@ -0,0 +1,105 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.claves import TablaCanonica, clave_codigo, limpiar_texto
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("A.0B", "A.0B"),
+    ("L.05", "L.05"),
+    ("12.50", "12.50"),
+    ("1234.0", "1234"),
+    ("1234.000", "1234"),
+    ("-12.0", "-12"),
+    ("\xa0ab\xa0 12\xa0", "AB 12"),  # NBSP
+    ("ab\u2003\u200a12", "AB 12"),     # em space y hair space
+    ("ab\u3000\t12\n", "AB 12"),      # espacio ideográfico y tabulación
+    (" ", ""),
+    ("0045", "0045"),
+    (None, ""),
+    (float("nan"), ""),
+    (np.nan, ""),
+    (pd.NA, ""),
+    (1234.0, "1234"),
+    (np.float64(1234.0), "1234"),
+    (12.5, "12.5"),
+    (1234, "1234"),
+])
+def test_limpiar_texto(valor, esperado):
+    assert limpiar_texto(valor) == esperado
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("000123", "123"),
+    ("123", "123"),
+    ("0000", "0"),
+    ("0", "0"),
+    ("00A1", "00A1"),
+    ("-0012", "-0012"),
+    # Solo dígitos ASCII cuentan como numérico
+    ("\u0660\u0661", "\u0660\u0661"),
+])
+def test_clave_codigo(texto, esperado):
+    assert clave_codigo(texto) == esperado
+
+
+def test_codigos_float_y_texto_coinciden():
+    tabla = TablaCanonica("codigos", clave=clave_codigo, directorio=None)
+    claves, textos = tabla.traducir(["000123", "123.0", 123.0, np.float64(123.0), " 123 ", None])
+    assert claves == ["123", "123", "123", "123", "123", ""]
+    assert textos == ["000123", "123", "123", "123", "123", ""]
+    # Solo los textos quedan en la tabla; NaN y floats se limpian cada vez
+    assert len(tabla) == 3
+
+
+def test_tabla_se_recarga_de_disco(tmp_path):
+    tabla = TablaCanonica("lotes", directorio=tmp_path)
+    assert tabla.traducir(["l2301", "2301.0"]) == (["L2301", "2301"], ["L2301", "2301"])
+    tabla.guardar()
+    assert list(tmp_path.glob("*.tmp")) == []
+
+    otra = TablaCanonica("lotes", directorio=tmp_path)
+    assert len(otra) == 0
+    assert otra.traducir(["l2301"]) == (["L2301"], ["L2301"])
+    # Se cargó "2301.0" del archivo aunque esta instancia no lo tradujo
+    assert len(otra) == 2
+    assert otra._nuevos == 0
+
+
+def test_tabla_desalojo_lru():
+    tabla = TablaCanonica("lotes", directorio=None, max_entradas=2)
+    tabla.traducir(["a", "b"])
+    tabla.traducir(["a"])          # "a" pasa a ser el más reciente
+    tabla.traducir(["c"])          # sale "b", no toda la tabla
+    assert list(tabla._tabla) == ["a", "c"]
+    assert tabla.traducir(["b", "c"]) == (["B", "C"], ["B", "C"])
+    assert list(tabla._tabla) == ["b", "c"]
+
+
+def test_tabla_recarga_respeta_max_entradas(tmp_path):
+    tabla = TablaCanonica("lotes", directorio=tmp_path)
+    tabla.traducir(["a", "b", "c"])
+    tabla.guardar()
+    otra = TablaCanonica("lotes", directorio=tmp_path, max_entradas=2)
+    otra.traducir([])
+    assert list(otra._tabla) == ["b", "c"]
+
+
+def test_guardar_desde_varios_hilos(tmp_path):
+    tablas = [TablaCanonica("lotes", directorio=tmp_path) for _ in range(8)]
+    for i, tabla in enumerate(tablas):
+        tabla.traducir([f"l{i}", "comun"])
+    hilos = [threading.Thread(target=tabla.guardar) for tabla in tablas]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert list(tmp_path.glob("*.tmp")) == []
+    leida = TablaCanonica("lotes", directorio=tmp_path)
+    leida.traducir([])
+    # Gana una de las escrituras, completa
+    assert len(leida) == 2 and "comun" in leida._tabla
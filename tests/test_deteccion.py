@@ -0,0 +1,55 @@
+import zipfile
+from io import BytesIO
+
+from modules.deteccion import clasificar_archivos, expandir, extraer, repetidos
+
+
+def comprimir(miembros):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_:
+        for nombre, contenido in miembros:
+            zip_.writestr(nombre, contenido)
+    return buffer.getvalue()
+
+
+def test_zip_se_reconoce_por_encabezado(carpeta_periodo):
+    # Nombres que no dicen el tipo: decide el encabezado (o el título)
+    rutas = {
+        f"periodo/archivo{i}{ruta.suffix}": ruta
+        for i, ruta in enumerate(sorted(carpeta_periodo.iterdir()))
+    }
+    zip_ = comprimir(
+        [(miembro, ruta.read_bytes()) for miembro, ruta in rutas.items()]
+        + [("__MACOSX/._archivo0.xlsx", b"basura")]
+    )
+
+    clasificados, problemas = clasificar_archivos([("periodo.zip", zip_)])
+    assert problemas == []
+    assert repetidos(clasificados) == []
+    for tipo, [(nombre, miembro)] in clasificados.items():
+        assert nombre == "periodo.zip"
+        assert rutas[miembro].stem == tipo
+        # Solo nombres en el resultado; los bytes se vuelven a extraer
+        assert extraer(zip_, miembro) == rutas[miembro].read_bytes()
+
+
+def test_repetido_bloquea(carpeta_periodo):
+    subidos = [(ruta.name, ruta.read_bytes()) for ruta in sorted(carpeta_periodo.iterdir())]
+    inicial = (carpeta_periodo / "inicial.xlsx").read_bytes()
+    subidos.append(("inventario inicial sede 2.xlsx", inicial))
+
+    clasificados, problemas = clasificar_archivos(subidos)
+    assert repetidos(clasificados) == ["inicial"]
+    assert [o for o, _ in clasificados["inicial"]] == ["inicial.xlsx", "inventario inicial sede 2.xlsx"]
+    assert any("inicial repetido" in p for p in problemas)
+
+
+def test_faltantes_y_archivos_sueltos(carpeta_periodo):
+    ruta = carpeta_periodo / "inicial.xlsx"
+    assert expandir(ruta.name, b"x") == [((ruta.name, None), b"x")]
+    assert expandir("~$inicial.xlsx", b"x") == []
+    assert extraer(b"x") == b"x"
+
+    clasificados, problemas = clasificar_archivos([(ruta.name, ruta.read_bytes())])
+    assert clasificados == {"inicial": [("inicial.xlsx", None)]}
+    assert problemas == ["Faltan archivos: traslados, recepciones, final"]
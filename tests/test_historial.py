@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.historial import Historial
+from modules.loader import BODEGA_PRINCIPAL
+
+
+def periodo(diferencias):
+    """Conciliación de lotes de 10 unidades con la diferencia pedida por lote."""
+    lotes = list(diferencias)
+    inicial = pd.DataFrame({
+        "CODIGO PRODUCTO": "000123",
+        "NOMBRE PRODUCTO": "ACETAMINOFEN",
+        "LOTE": lotes,
+        "CANTIDAD": 10,
+    })
+    final = inicial.assign(CANTIDAD=[10 + d for d in diferencias.values()])
+    traslados = pd.DataFrame(
+        columns=["BODEGA ORIGEN", "CODIGO PRODUCTO", "NOMBRE PRODUCTO", "LOTE", "CANTIDAD"]
+    )
+    recepciones = pd.DataFrame(columns=["CODIGO PRODUCTO", "LOTE", "CANTIDAD", "PROVEEDOR"])
+    return conciliar(inicial, traslados, recepciones, None, final)
+
+
+@pytest.fixture
+def historial(tmp_path):
+    return Historial(tmp_path / "historial.sqlite")
+
+
+def test_guardar_y_tendencia(historial, dfs):
+    resultado = conciliar(*dfs)
+    assert historial.guardar("2024-01", resultado) == resultado.total_inconsistencias
+
+    tendencia = historial.tendencia()
+    esperado = resultado.resumen.set_index("Tipo_Inconsistencia")["Cantidad"]
+    assert tendencia.index.tolist() == ["2024-01"]
+    assert tendencia.loc["2024-01", esperado.index].tolist() == esperado.tolist()
+    assert tendencia.loc["2024-01", "Total"] == resultado.total_inconsistencias
+
+    # Guardar de nuevo el mismo período lo reemplaza
+    historial.guardar("2024-01", resultado)
+    pd.testing.assert_frame_equal(historial.tendencia(), tendencia)
+    cargas = historial.cargas()
+    assert cargas[["Periodo", "Bodega", "Lotes", "Inconsistencias"]].values.tolist() == [
+        ["2024-01", BODEGA_PRINCIPAL, len(resultado.df), resultado.total_inconsistencias]
+    ]
+
+
+def test_rachas_y_recurrentes(historial):
+    historial.guardar("2024-01", periodo({"L1": -2, "L2": 0}))
+    historial.guardar("2024-02", periodo({"L1": -1, "L2": 3}))
+    historial.guardar("2024-03", periodo({"L1": -4, "L2": 0}))
+
+    rachas = historial.recurrentes(minimo=2)
+    assert rachas[["Lote", "Periodos", "Desde", "Hasta", "Diferencia_Acumulada"]].values.tolist() == [
+        ["L1", 3, "2024-01", "2024-03", -7.0]
+    ]
+    # Sin exigir períodos seguidos, L2 cuenta una vez
+    sueltos = historial.recurrentes(minimo=1, consecutivos=False)
+    assert dict(zip(sueltos["Lote"], sueltos["Periodos"])) == {"L1": 3, "L2": 1}
+
+    # Las rachas cuentan cargas: sin la del medio, quedan dos seguidas
+    historial.eliminar("2024-02")
+    assert historial.recurrentes(minimo=3).empty
+    assert historial.recurrentes(minimo=2)["Periodos"].tolist() == [2]
+
+    # Se busca por la misma clave de la conciliación
+    lote = historial.del_lote("123.0", "l1")
+    assert lote[["Periodo", "Diferencia"]].values.tolist() == [["2024-01", -2.0], ["2024-03", -4.0]]
+
+
+def test_periodo_vacio(historial):
+    with pytest.raises(ValueError):
+        historial.guardar(" ", periodo({"L1": 1}))
+
+
+@pytest.mark.parametrize("texto", ["2024-3", "marzo", "2024-13", "2024/03", "24-03"])
+def test_periodo_invalido(historial, texto):
+    with pytest.raises(ValueError, match="Período inválido"):
+        historial.guardar(texto, periodo({"L1": 1}))
+    assert historial.cargas().empty
@@ -0,0 +1,80 @@
+from io import BytesIO
+
+import pandas as pd
+
+from benchmarks.generador import generar_periodo
+from modules.claves import clave_codigo
+from modules.html_erp import iterar_filas_html
+from modules.loader import load_excel
+
+COLUMNAS = ["BODEGA ORIGEN", "CODIGO ARTICULO", "NOMBRE ARTICULO", "LOTE", "CANTIDAD"]
+
+
+def export_combinado(df, max_rowspan=7):
+    """Traslados como HTML del ERP con celdas combinadas.
+
+    La bodega va combinada con rowspan en tramos de hasta `max_rowspan`
+    filas, el nombre partido con <br>, el título en <thead> con colspan y
+    una fila final con nombre y lote en una sola celda (colspan).
+    """
+    filas = [
+        f"<thead><tr><th colspan={len(COLUMNAS)}>REPORTE DE TRASLADOS</th></tr>",
+        "<tr>" + "".join(f"<th>{c}</th>" for c in COLUMNAS) + "</tr></thead><tbody>",
+    ]
+    bodegas = df["BODEGA ORIGEN"].tolist()
+    for i, (bodega, codigo, nombre, lote, cantidad) in enumerate(df[COLUMNAS].itertuples(index=False)):
+        celdas = []
+        if i % max_rowspan == 0 or bodegas[i - 1] != bodega:
+            tramo = 1
+            while (
+                i + tramo < len(bodegas) and bodegas[i + tramo] == bodega
+                and (i + tramo) % max_rowspan != 0
+            ):
+                tramo += 1
+            celdas.append(f"<td rowspan={tramo}>{bodega}</td>" if tramo > 1 else f"<td>{bodega}</td>")
+        palabra, numero = nombre.split(" ")
+        celdas += [f"<td>{codigo}</td>", f"<td>{palabra}<br>{numero}</td>", f"<td>{lote}</td>", f"<td>{cantidad}</td>"]
+        filas.append("<tr>" + "".join(celdas) + "</tr>")
+    filas.append(f"<tr><td>{bodegas[-1]}</td><td>000999</td><td colspan=2>L9999Z</td><td>4</td></tr>")
+    texto = "<html><body><table>" + "\n".join(filas) + "</tbody></table></body></html>"
+    return BytesIO(texto.encode("latin-1"))
+
+
+def test_celdas_combinadas():
+    html = b"""<table>
+        <tr><td rowspan=3>A</td><td>x<br>y</td><td rowspan=2>z</td></tr>
+        <tr><td colspan=2>B</td></tr>
+        <tr><td>C</td></tr>
+    </table>"""
+    assert list(iterar_filas_html(BytesIO(html))) == [
+        ["A", "x y", "z"],
+        ["A", "B", "B", "z"],
+        ["A", "C"],
+    ]
+
+    # Un rowspan que pasa de la última fila agrega filas, como pd.read_html
+    html = b"<table><tr><td>1</td><td rowspan=3>D</td></tr></table>"
+    assert list(iterar_filas_html(BytesIO(html))) == [["1", "D"], ["D"], ["D"]]
+
+
+def test_streaming_igual_a_completo():
+    traslados = generar_periodo(filas=400, semilla=5)["traslados"]
+    traslados = traslados.sort_values("BODEGA ORIGEN", kind="stable", ignore_index=True)
+    archivo = export_combinado(traslados)
+
+    streaming = load_excel(archivo, "traslados", modo="streaming")
+    completo = load_excel(archivo, "traslados", modo="completo")
+    # read_html lee los códigos como números, sin ceros a la izquierda: la
+    # clave canónica es la misma (modules/claves.py)
+    for df in (streaming, completo):
+        df["CODIGO PRODUCTO"] = df["CODIGO PRODUCTO"].astype(str).map(clave_codigo)
+
+    # El modo completo deja la fila de encabezado como nombre de las columnas
+    pd.testing.assert_frame_equal(streaming, completo, check_dtype=False, check_names=False)
+    assert streaming.attrs == completo.attrs == {"fila_encabezado": 2}
+
+    # La bodega combinada llega a cada fila y el nombre conserva su espacio
+    assert len(streaming) == len(traslados) + 1
+    assert streaming["BODEGA ORIGEN"].iloc[:-1].tolist() == traslados["BODEGA ORIGEN"].tolist()
+    assert streaming["NOMBRE PRODUCTO"].iloc[:-1].tolist() == traslados["NOMBRE ARTICULO"].tolist()
+    assert streaming.iloc[-1][["NOMBRE PRODUCTO", "LOTE"]].tolist() == ["L9999Z", "L9999Z"]
@@ -0,0 +1,77 @@
+import gc
+
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.instantaneas import Instantaneas
+from modules.metricas import registrar
+
+
+@pytest.fixture(scope="module")
+def resultado(dfs):
+    return conciliar(*dfs, lotes_similares=True)
+
+
+def test_misma_conciliacion_comparte_archivo(tmp_path, resultado):
+    registro = Instantaneas(directorio=tmp_path)
+    una = registro.publicar(resultado)
+    otra = registro.publicar(resultado)
+
+    assert una.clave == otra.clave
+    assert una.resultado.df is otra.resultado.df
+    assert len(registro) == 1
+    assert len(list(tmp_path.glob("*.arrow"))) == 2     # resultado y similares
+    assert list(tmp_path.glob("*.tmp")) == []
+    pd.testing.assert_frame_equal(una.resultado.df, resultado.df)
+    pd.testing.assert_frame_equal(una.resultado.similares, resultado.similares)
+
+    # Sin referencias sale de memoria; el archivo queda para reutilizarse
+    del una
+    gc.collect()
+    assert len(registro) == 1
+    del otra
+    gc.collect()
+    assert len(registro) == 0
+    assert len(list(tmp_path.glob("*.arrow"))) == 2
+
+
+def test_sin_disco_queda_en_memoria(tmp_path, resultado):
+    # El directorio es un archivo: no se puede escribir
+    ocupado = tmp_path / "ocupado"
+    ocupado.write_text("")
+    registro = Instantaneas(directorio=ocupado)
+
+    with registrar() as metricas:
+        instantanea = registro.publicar(resultado)
+
+    pd.testing.assert_frame_equal(instantanea.resultado.df, resultado.df)
+    etapas = metricas.a_dataframe().set_index("etapa")
+    assert etapas.loc["escribir instantánea", "detalle"].startswith("en memoria:")
+
+
+def test_otros_errores_no_se_ocultan(tmp_path, resultado, monkeypatch):
+    def falla(*args, **kwargs):
+        raise TypeError("tipo de columna no soportado")
+
+    monkeypatch.setattr("modules.instantaneas.feather.write_feather", falla)
+    with pytest.raises(TypeError):
+        Instantaneas(directorio=tmp_path).publicar(resultado)
+
+
+def test_procedencia_compartida(tmp_path, resultado):
+    registro = Instantaneas(directorio=tmp_path)
+    # Publicado primero sin procedencia (como la lectura por bloques)
+    sin_detalle = registro.publicar(resultado.con_procedencia(None))
+    assert sin_detalle.resultado.procedencia is None
+
+    una = registro.publicar(resultado)
+    otra = registro.publicar(resultado.con_procedencia(object()))
+    # Una sola procedencia por resultado, no una por sesión
+    assert una.resultado.procedencia is resultado.procedencia
+    assert otra.resultado.procedencia is resultado.procedencia
+    assert sin_detalle.resultado.procedencia is resultado.procedencia
+    assert not hasattr(una, "_procedencia")
+
+    etiqueta = resultado.inconsistencias.index[0]
+    pd.testing.assert_frame_equal(otra.resultado.movimientos(etiqueta), resultado.movimientos(etiqueta))
@@ -0,0 +1,80 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.metricas import Cancelado, etapa, registrar, reporte_memoria
+
+
+def convertido(df):
+    # Lo que hacía el reporte antes: convertir el frame completo
+    tipos = {
+        c: np.float64 if pd.api.types.is_numeric_dtype(t) else object
+        for c, t in df.dtypes.items()
+    }
+    return df.astype(tipos).memory_usage(deep=True).sum() / 1e6
+
+
+def test_sin_compactar_sin_convertir(dfs):
+    rng = np.random.default_rng(5)
+    filas = 10_000
+    mezcla = pd.DataFrame({
+        "codigo": pd.Categorical(rng.choice(["000123", "ÑANDÚ", None], filas)),
+        "lote": pd.array(rng.choice(["L1", "Lote largo 2", "ñ"], filas), dtype="string[pyarrow]"),
+        "texto": rng.choice(["a", "bb", "ccc"], filas).astype(object),
+        "cantidad": rng.integers(0, 100, filas, dtype=np.int32),
+        "valor": rng.random(filas),
+    })
+    frames = {**{str(i): df for i, df in enumerate(dfs) if df is not None}, "mezcla": mezcla}
+
+    reporte = reporte_memoria(frames)
+    esperado = [round(convertido(df), 2) for df in frames.values()]
+    assert reporte["MB sin compactar"].iloc[:-1].tolist() == esperado
+    assert reporte["Objeto"].iloc[-1] == "Total"
+    assert reporte["Filas"].iloc[-1] == sum(len(df) for df in frames.values())
+
+
+def test_etapas_de_conciliar(dfs):
+    with registrar() as registro:
+        conciliar(*dfs)
+    df = registro.a_dataframe()
+    assert {"normalizar", "agrupar", "unir", "clasificar", "resumen"} <= set(df["etapa"])
+    assert (df["segundos"] >= 0).all() and df["inicio"].is_monotonic_increasing
+    assert registro.progreso()[1] == []
+
+    datos = json.loads(registro.a_json())
+    assert len(datos["etapas"]) == len(df)
+    assert datos["total_segundos"] == pytest.approx(registro.total())
+
+
+def test_sin_registro_no_mide():
+    with etapa("suelta", filas=3) as datos:
+        datos["detalle"] = "nada"
+    assert "segundos" not in datos
+
+
+def test_hilos_heredan_el_registro():
+    def medir(numero):
+        with etapa("hilo", filas=numero):
+            pass
+
+    # Como en la ingesta: el contexto se copia en el hilo que envía
+    with registrar() as registro, ThreadPoolExecutor(4) as executor:
+        futuros = [executor.submit(contextvars.copy_context().run, medir, n) for n in range(8)]
+    for futuro in futuros:
+        futuro.result()
+    assert sorted(e["filas"] for e in registro.etapas) == list(range(8))
+
+
+def test_cancelar_corta_en_la_siguiente_etapa():
+    with registrar() as registro:
+        with etapa("primera"):
+            registro.cancelar()
+        with pytest.raises(Cancelado):
+            with etapa("segunda"):
+                pass
+    assert [e["etapa"] for e in registro.etapas] == ["primera"]
@@ -0,0 +1,140 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.periodos import (
+    AlmacenPeriodos,
+    conciliar_periodo,
+    corregir_archivo,
+    inventario_final,
+    resultado_periodo
+)
+
+RAIZ_REPO = Path(__file__).resolve().parent.parent
+
+
+def comparable(df):
+    # Las categorías dependen del diccionario de cada corrida
+    return df.astype({columna: object for columna in df.select_dtypes("category").columns})
+
+
+def iguales(resultado, esperado):
+    pd.testing.assert_frame_equal(comparable(resultado.df), comparable(esperado.df))
+    assert resultado.total_inconsistencias == esperado.total_inconsistencias
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenPeriodos(tmp_path / "periodos")
+
+
+def test_periodo_igual_a_conciliar(almacen, dfs):
+    resultado = conciliar_periodo(almacen, "2024-01", *dfs)
+    esperado = conciliar(*dfs)
+    iguales(resultado, esperado)
+    iguales(resultado_periodo(almacen, "2024-01"), esperado)
+    assert almacen.periodos() == ["2024-01"]
+    assert list(almacen.directorio.glob("*.tmp")) == []
+
+    etiqueta = esperado.inconsistencias.index[0]
+    pd.testing.assert_frame_equal(resultado.movimientos(etiqueta), esperado.movimientos(etiqueta))
+
+
+def test_siguiente_periodo_toma_el_final_anterior(almacen, dfs):
+    inicial, traslados, recepciones, salidas, final = dfs
+    conciliar_periodo(almacen, "2024-01", *dfs)
+    estado, _ = almacen.cargar("2024-01")
+
+    # Sin archivo inicial: solo se leen los movimientos y el nuevo final
+    resultado = conciliar_periodo(almacen, "2024-02", None, traslados, recepciones, salidas, final)
+    iguales(resultado, conciliar(inventario_final(estado), traslados, recepciones, salidas, final))
+    assert almacen.cargar("2024-02")[1] == {"inicial_desde": "2024-01"}
+    assert almacen.anterior("2024-02") == "2024-01"
+    assert almacen.siguiente("2024-01") == "2024-02"
+
+    etiqueta = resultado.df.index[resultado.df["Inicial"].to_numpy() != 0][0]
+    assert "final de 2024-01" in set(resultado.movimientos(etiqueta)["Archivo"])
+
+
+@pytest.mark.parametrize("tipo", ["inicial", "recepciones", "traslados", "salidas", "final"])
+def test_corregir_archivo_igual_a_reconciliar(almacen, dfs, tipo):
+    entradas = dict(zip(["inicial", "traslados", "recepciones", "salidas", "final"], dfs))
+    conciliar_periodo(almacen, "2024-01", *dfs)
+
+    # Corrección: cambian cantidades, sale la mitad y entra un lote nuevo
+    original = entradas[tipo]
+    corregido = original.iloc[: len(original) // 2].copy()
+    corregido["CANTIDAD"] = pd.to_numeric(corregido["CANTIDAD"], errors="coerce") + 1
+    nuevo = original.iloc[:1].assign(LOTE="LNUEVO", CANTIDAD=7)
+    corregido = pd.concat([corregido, nuevo], ignore_index=True)
+    entradas[tipo] = corregido
+
+    resultado = corregir_archivo(almacen, "2024-01", tipo, corregido)
+    esperado = conciliar(*entradas.values())
+    iguales(resultado, esperado)
+    iguales(resultado_periodo(almacen, "2024-01"), esperado)
+    assert resultado.procedencia is None
+
+
+def test_correccion_del_final_se_propaga(almacen, dfs):
+    inicial, traslados, recepciones, salidas, final = dfs
+    conciliar_periodo(almacen, "2024-01", *dfs)
+    conciliar_periodo(almacen, "2024-02", None, traslados, recepciones, salidas, final)
+    # Un período con inicial propio no se toca
+    conciliar_periodo(almacen, "2024-03", *dfs)
+
+    corregido = final.assign(CANTIDAD=pd.to_numeric(final["CANTIDAD"], errors="coerce") * 2)
+    corregir_archivo(almacen, "2024-01", "final", corregido)
+
+    estado, _ = almacen.cargar("2024-01")
+    iguales(
+        resultado_periodo(almacen, "2024-02"),
+        conciliar(inventario_final(estado), traslados, recepciones, salidas, final)
+    )
+    iguales(resultado_periodo(almacen, "2024-03"), conciliar(*dfs))
+
+
+def test_errores(almacen, dfs):
+    with pytest.raises(ValueError, match="Período inválido"):
+        conciliar_periodo(almacen, "enero", *dfs)
+    with pytest.raises(ValueError, match="período anterior"):
+        conciliar_periodo(almacen, "2024-01", None, *dfs[1:])
+    with pytest.raises(ValueError, match="No hay estado"):
+        corregir_archivo(almacen, "2024-01", "final", dfs[-1])
+
+    conciliar_periodo(almacen, "2024-01", *dfs)
+    with pytest.raises(ValueError, match="Tipo de archivo"):
+        corregir_archivo(almacen, "2024-01", "ventas", dfs[-1])
+
+
+def test_cli_periodos_en_orden(carpeta_periodo, dfs, tmp_path):
+    inicial, traslados, recepciones, salidas, final = dfs
+    raiz = tmp_path / "historico"
+    shutil.copytree(carpeta_periodo, raiz / "2024-03" / "norte")
+    shutil.copytree(carpeta_periodo, raiz / "2024-04" / "norte")
+    # Sin inventario inicial: sale del estado de 2024-03
+    (raiz / "2024-04" / "norte" / "inicial.xlsx").unlink()
+    directorio = tmp_path / "periodos"
+
+    proceso = subprocess.run(
+        [
+            sys.executable, "conciliar_carpetas.py", str(raiz),
+            "--salida", str(tmp_path / "salida"), "--formato", "csv",
+            "--periodos", str(directorio), "--procesos", "2",
+        ],
+        cwd=RAIZ_REPO, capture_output=True, text=True, timeout=300
+    )
+    assert proceso.returncode == 0, proceso.stderr
+
+    almacen = AlmacenPeriodos(directorio).de_sede("norte")
+    assert almacen.periodos() == ["2024-03", "2024-04"]
+    estado, _ = almacen.cargar("2024-03")
+    esperado = conciliar(inventario_final(estado), traslados, recepciones, salidas, final)
+    resumen = pd.read_csv(tmp_path / "salida" / "resumen.csv").set_index("Carpeta")
+    assert resumen.loc["2024-04/norte", "Inconsistencias"] == esperado.total_inconsistencias
+    iguales(resultado_periodo(almacen, "2024-04"), esperado)
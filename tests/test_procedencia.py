@@ -0,0 +1,60 @@
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from modules.conciliacion import conciliar
+from modules.html_erp import iterar_filas_html
+from modules.loader import load_excel
+from modules.procedencia import ARCHIVO, FILA
+
+
+def filas_del_archivo(ruta):
+    """Filas tal como se ven al abrir el archivo (la 1 es la primera)."""
+    if ruta.suffix == ".xlsx":
+        hoja = load_workbook(ruta, read_only=True).worksheets[0]
+        return [None] + [list(fila) for fila in hoja.iter_rows(values_only=True)]
+    with open(ruta, "rb") as f:
+        return [None] + list(iterar_filas_html(f))
+
+
+def test_filas_de_un_lote_estan_en_los_archivos(carpeta_periodo, dfs):
+    resultado = conciliar(*dfs)
+    rutas = {ruta.stem: ruta for ruta in carpeta_periodo.iterdir()}
+    archivos = {tipo: filas_del_archivo(ruta) for tipo, ruta in rutas.items()}
+
+    # Lotes con movimientos en varios archivos
+    revisados = 0
+    for etiqueta in resultado.inconsistencias.index[:20]:
+        lote = resultado.df.loc[etiqueta]
+        movimientos = resultado.movimientos(etiqueta)
+        assert len(movimientos) > 0
+        for tipo, fila, lote_leido, cantidad in movimientos[[ARCHIVO, FILA, "LOTE", "CANTIDAD"]].itertuples(index=False):
+            celdas = [str(c) for c in archivos[tipo][fila] if c is not None]
+            assert lote_leido == lote["Lote"]
+            assert lote["Lote"] in celdas
+            assert str(cantidad) in celdas
+            revisados += 1
+    assert revisados > 20
+
+
+def test_fila_con_titulo_y_filas_vacias():
+    texto = (
+        "<table><tr><td>REPORTE</td></tr><tr><td></td></tr>"
+        "<tr><td>CODIGO PRODUCTO</td><td>LOTE</td><td>CANTIDAD</td></tr>"
+        "<tr><td>1</td><td>L1</td><td>5</td></tr>"
+        "<tr><td></td><td></td><td></td></tr>"
+        "<tr><td>1</td><td>L1</td><td>2</td></tr></table>"
+    )
+    for modo in ("streaming", "completo"):
+        inicial = load_excel(BytesIO(texto.encode("latin-1")), "inicial", modo=modo)
+        vacio = pd.DataFrame(columns=["CODIGO PRODUCTO", "LOTE", "CANTIDAD"])
+        resultado = conciliar(
+            inicial.assign(**{"NOMBRE PRODUCTO": "X"}),
+            vacio.assign(**{"BODEGA ORIGEN": None}),
+            vacio.assign(PROVEEDOR=None),
+            None,
+            vacio
+        )
+        # Encabezado en la fila 3: los movimientos están en la 4 y la 6
+        assert resultado.movimientos(0)[FILA].tolist() == [4, 6], modo
@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.similares import LOTE_SIMILAR, distancia
+
+
+def similares(diferencias, codigo="000123"):
+    """Parejas marcadas en una conciliación con la diferencia pedida por lote."""
+    lotes = list(diferencias)
+    inicial = pd.DataFrame({
+        "CODIGO PRODUCTO": codigo,
+        "NOMBRE PRODUCTO": "ACETAMINOFEN",
+        "LOTE": lotes,
+        "CANTIDAD": 10,
+    })
+    final = inicial.assign(CANTIDAD=[10 + d for d in diferencias.values()])
+    traslados = pd.DataFrame(
+        columns=["BODEGA ORIGEN", "CODIGO PRODUCTO", "NOMBRE PRODUCTO", "LOTE", "CANTIDAD"]
+    )
+    recepciones = pd.DataFrame(columns=["CODIGO PRODUCTO", "LOTE", "CANTIDAD", "PROVEEDOR"])
+    resultado = conciliar(inicial, traslados, recepciones, None, final, lotes_similares=True)
+    return resultado.df.set_index("Lote"), resultado.similares
+
+
+@pytest.mark.parametrize("sobrante, faltante", [
+    ("L2304A", "L23O4A"),   # OCR: cero por letra O
+    ("L2304", "L2340"),     # transposición de dígitos vecinos
+    ("LÑ2304", "LN2304"),   # tilde perdida al digitar
+])
+def test_pareja_a_una_edicion(sobrante, faltante):
+    df, pares = similares({sobrante: 5, faltante: -5})
+    assert pares[["Lote_Sobrante", "Lote_Faltante", "Distancia", "Diferencia_Neta"]].values.tolist() == [
+        [sobrante, faltante, 1, 0.0]
+    ]
+    assert df.loc[[sobrante, faltante], "Tipo_Inconsistencia"].tolist() == [LOTE_SIMILAR] * 2
+    assert df.loc[sobrante, "Lote_Similar"] == faltante
+    assert df.loc[faltante, "Lote_Similar"] == sobrante
+
+
+def test_mismo_signo_no_es_pareja():
+    df, pares = similares({"L5501": 4, "L5502": 4, "L6601": -3, "L6602": -3})
+    assert pares.empty
+    assert LOTE_SIMILAR not in df["Tipo_Inconsistencia"].tolist()
+    assert df["Lote_Similar"].isna().all()
+
+
+def test_asignacion_voraz_uno_a_uno():
+    # L7003 es la mejor pareja de L7001 y de L7004 (compensa la diferencia
+    # completa): queda con una sola, y la otra toma L7002
+    df, pares = similares({"L7001": 5, "L7004": 5, "L7002": -2, "L7003": -5})
+    assert pares[["Lote_Sobrante", "Lote_Faltante", "Diferencia_Neta"]].values.tolist() == [
+        ["L7001", "L7003", 0.0],
+        ["L7004", "L7002", 3.0],
+    ]
+    assert (df["Tipo_Inconsistencia"] == LOTE_SIMILAR).all()
+
+
+def test_distancia():
+    assert distancia("L2304A", "L23O4A") == 1
+    assert distancia("L2304", "L2340") == 1
+    assert distancia("LÑ2304", "LN2304") == 1
+    # Dos ediciones: se corta en maximo + 1
+    assert distancia("L2304", "L2043") == 2
+    assert distancia("L2304", "X9", maximo=2) == 3
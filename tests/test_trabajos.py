@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from modules.ingesta import ORDEN_ARCHIVOS
+from modules.metricas import etapa
+from modules.trabajos import (
+    CANCELADO,
+    CORRIENDO,
+    EN_COLA,
+    ERROR,
+    LISTO,
+    ColaLlena,
+    PoolTrabajos,
+    conciliar_archivos,
+)
+
+
+def esperar(condicion, segundos=10):
+    limite = time.monotonic() + segundos
+    while not condicion():
+        assert time.monotonic() < limite, "el trabajo no terminó a tiempo"
+        time.sleep(0.01)
+
+
+def bloqueado(evento, llamadas):
+    llamadas.append(1)
+    evento.wait(10)
+    return "hecho"
+
+
+def test_cola_llena_y_liberacion():
+    pool = PoolTrabajos(trabajadores=1, max_en_cola=1)
+    evento, llamadas = threading.Event(), []
+    primero = pool.enviar(bloqueado, evento, llamadas)
+    segundo = pool.enviar(bloqueado, evento, llamadas)
+    esperar(lambda: primero.estado == CORRIENDO)
+    assert segundo.estado == EN_COLA
+
+    with pytest.raises(ColaLlena):
+        pool.enviar(bloqueado, evento, llamadas)
+    assert pool.pendientes() == 2
+
+    evento.set()
+    esperar(lambda: segundo.terminado and pool.pendientes() == 0)
+    assert (primero.estado, primero.resultado) == (LISTO, "hecho")
+    assert (segundo.estado, segundo.resultado) == (LISTO, "hecho")
+    assert len(llamadas) == 2
+    # Con lugar otra vez, se acepta
+    tercero = pool.enviar(bloqueado, evento, llamadas)
+    esperar(lambda: tercero.terminado)
+
+
+def test_cancelar_en_cola_no_lo_corre():
+    pool = PoolTrabajos(trabajadores=1, max_en_cola=1)
+    evento, llamadas = threading.Event(), []
+    primero = pool.enviar(bloqueado, evento, llamadas)
+    segundo = pool.enviar(bloqueado, evento, llamadas)
+    segundo.cancelar()
+    evento.set()
+
+    esperar(lambda: primero.terminado and segundo.terminado)
+    assert segundo.estado == CANCELADO
+    assert len(llamadas) == 1
+
+
+def test_cancelar_en_curso_corta_en_la_siguiente_etapa():
+    def etapas(empezado):
+        for numero in range(1000):
+            with etapa("paso", filas=numero):
+                empezado.set()
+                time.sleep(0.005)
+
+    pool = PoolTrabajos(trabajadores=1, max_en_cola=0)
+    empezado = threading.Event()
+    trabajo = pool.enviar(etapas, empezado)
+    assert empezado.wait(10)
+    trabajo.cancelar()
+
+    esperar(lambda: trabajo.terminado)
+    assert trabajo.estado == CANCELADO
+    terminadas, en_curso, _ = trabajo.progreso()
+    assert 0 < len(terminadas) < 1000 and en_curso == []
+
+
+def test_error_queda_en_el_trabajo():
+    def falla():
+        raise ValueError("archivo sin columnas")
+
+    trabajo = PoolTrabajos().enviar(falla)
+    esperar(lambda: trabajo.terminado)
+    assert (trabajo.estado, trabajo.error) == (ERROR, "archivo sin columnas")
+
+
+def test_conciliar_archivos(carpeta_periodo):
+    rutas = {ruta.stem: ruta for ruta in carpeta_periodo.iterdir()}
+    contenidos = {tipo: rutas[tipo].read_bytes() for tipo in ORDEN_ARCHIVOS}
+
+    trabajo = PoolTrabajos().enviar(conciliar_archivos, contenidos, lotes_similares=True)
+    esperar(lambda: trabajo.terminado, segundos=60)
+    assert trabajo.estado == LISTO, trabajo.error
+
+    salida = trabajo.resultado
+    assert salida["errores"] == {} and salida["avisos"] == []
+    assert salida["resumen_bodegas"] is None
+    assert salida["instantanea"].resultado.similares is not None
+    assert salida["memoria"]["Objeto"].iloc[-1] == "Total"
+    etapas = {e["etapa"] for e in trabajo.registro.etapas}
+    assert {"lectura", "conciliar", "memoria", "instantánea"} <= etapas
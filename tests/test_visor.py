@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules.conciliacion import conciliar
+from modules.visor import ORDENES, TIPO, Visor, paginas
+
+
+@pytest.fixture(scope="module")
+def resultado(dfs):
+    return conciliar(*dfs)
+
+
+@pytest.fixture(scope="module")
+def visor(resultado):
+    return Visor(resultado.inconsistencias, resultado.posiciones_por_tipo)
+
+
+def ordenado(df, nombre):
+    """El mismo orden armado con sort_values, fila por fila."""
+    criterio = ORDENES[nombre]
+    if criterio is None:
+        return df
+    columna, descendente, absoluto = criterio
+    clave = (lambda s: s.abs()) if absoluto else (lambda s: s.astype(str) if s.dtype == "category" else s)
+    return df.sort_values(columna, ascending=not descendente, kind="stable", key=clave)
+
+
+@pytest.mark.parametrize("nombre", list(ORDENES))
+def test_ordenes(visor, resultado, nombre):
+    esperado = ordenado(resultado.inconsistencias, nombre)
+    assert visor.filtrar(nombre).index.tolist() == esperado.index.tolist()
+    # El orden se calcula una vez
+    assert visor.orden(nombre) is visor.orden(nombre)
+
+
+def test_busqueda_por_valores_distintos(visor, resultado):
+    df = resultado.inconsistencias
+    lote = str(df["Lote"].iloc[0])
+    for texto in [lote.lower(), lote[1:4], str(df["Codigo_Articulo"].iloc[-1]), "medicamento 00"]:
+        esperado = np.zeros(len(df), dtype=bool)
+        for columna in ["Codigo_Articulo", "Nombre_Producto", "Lote"]:
+            esperado |= df[columna].astype(str).str.upper().str.contains(texto.strip().upper(), regex=False).to_numpy()
+        assert visor.buscar(f"  {texto} ").tolist() == esperado.tolist(), texto
+        assert visor.filtrar(texto=texto).index.tolist() == df.index[esperado].tolist()
+
+    assert visor.buscar("") is None and visor.buscar(None) is None
+    assert visor.filtrar(texto="NO EXISTE").empty
+
+
+def test_filtro_por_tipo(visor, resultado):
+    df = resultado.inconsistencias
+    # Sin las posiciones de ResultadoConciliacion, se arman desde la columna
+    sin_indice = Visor(df)
+    for tipo in resultado.tipos():
+        esperado = df[df[TIPO] == tipo]
+        assert visor.filtrar(tipo=tipo).index.tolist() == esperado.index.tolist()
+        assert sin_indice.filtrar(tipo=tipo).index.tolist() == esperado.index.tolist()
+
+        # Tipo, orden y búsqueda combinados
+        nombre = "Mayor diferencia (absoluta)"
+        texto = str(esperado["Lote"].iloc[0])[:3]
+        filtrado = ordenado(esperado, nombre)
+        filtrado = filtrado[filtrado["Lote"].astype(str).str.upper().str.contains(texto)
+                            | filtrado["Codigo_Articulo"].astype(str).str.contains(texto)
+                            | filtrado["Nombre_Producto"].astype(str).str.upper().str.contains(texto)]
+        assert visor.filtrar(nombre, texto, tipo).index.tolist() == filtrado.index.tolist()
+
+    assert visor.filtrar(tipo="Todas").index.tolist() == df.index.tolist()
+    assert visor.filtrar(tipo="No existe").empty
+
+
+@pytest.mark.parametrize("tamano", [7, 50, 100])
+def test_paginas(visor, resultado, tamano):
+    nombre = "Diferencia (de mayor a menor)"
+    tipo = resultado.tipos()[0]
+    filtrado = visor.filtrar(nombre, tipo=tipo)
+    total = len(filtrado)
+    cantidad = paginas(total, tamano)
+    assert cantidad == -(-total // tamano)
+
+    leidas = []
+    for numero in range(cantidad):
+        pagina, total_pagina = visor.pagina(numero, tamano, nombre, tipo=tipo)
+        assert total_pagina == total
+        # Todas llenas salvo la última
+        assert len(pagina) == (tamano if numero < cantidad - 1 else total - tamano * (cantidad - 1))
+        leidas.append(pagina)
+    pd.testing.assert_frame_equal(
+        pd.concat(leidas).astype(filtrado.dtypes.to_dict()), filtrado
+    )
+
+    # Fuera de rango: vacía, con el mismo total
+    pagina, total_pagina = visor.pagina(cantidad, tamano, nombre, tipo=tipo)
+    assert pagina.empty and total_pagina == total
+    # Las categorías de una página son solo las que aparecen en ella
+    pagina, _ = visor.pagina(0, tamano, nombre, tipo=tipo)
+    assert len(pagina["Lote"].cat.categories) == pagina["Lote"].nunique()
+
+
+def test_total_sin_filas():
+    assert paginas(0) == 1
+    assert paginas(100, 100) == 1
+    assert paginas(101, 100) == 2